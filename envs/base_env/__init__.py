@@ -1,62 +1,72 @@
-ENV_REGISTRY = {}
-
-try:
-    from envs.base_env.mpe import RllibMPE
-    ENV_REGISTRY["mpe"] = RllibMPE
-except Exception as e:
-    ENV_REGISTRY["mpe"] = str(e)
-
-try:
-    from envs.base_env.mamujoco import RllibMAMujoco
-    ENV_REGISTRY["mamujoco"] = RllibMAMujoco
-except Exception as e:
-    ENV_REGISTRY["mamujoco"] = str(e)
-
-try:
-    from envs.base_env.smac import RLlibSMAC
-    ENV_REGISTRY["smac"] = RLlibSMAC
-except Exception as e:
-    ENV_REGISTRY["smac"] = str(e)
-
-try:
-    from envs.base_env.football import RllibGFootball
-    ENV_REGISTRY["football"] = RllibGFootball
-except Exception as e:
-    ENV_REGISTRY["football"] = str(e)
-
-try:
-    from envs.base_env.magent import RllibMAgent
-    ENV_REGISTRY["magent"] = RllibMAgent
-except Exception as e:
-    ENV_REGISTRY["magent"] = str(e)
-
-try:
-    from envs.base_env.rware import RllibRWARE
-    ENV_REGISTRY["rware"] = RllibRWARE
-except Exception as e:
-    ENV_REGISTRY["rware"] = str(e)
-
-try:
-    from envs.base_env.lbf import RllibLBF
-    ENV_REGISTRY["lbf"] = RllibLBF
-except Exception as e:
-    ENV_REGISTRY["lbf"] = str(e)
-
-try:
-    from envs.base_env.pommerman import RllibPommerman
-    ENV_REGISTRY["pommerman"] = RllibPommerman
-except Exception as e:
-    ENV_REGISTRY["pommerman"] = str(e)
-
-try:
-    from envs.base_env.hanabi import RLlibHanabi
-    ENV_REGISTRY["hanabi"] = RLlibHanabi
-except Exception as e:
-    ENV_REGISTRY["hanabi"] = str(e)
-
-try:
-    from envs.base_env.metadrive import RllibMetaDrive
-    ENV_REGISTRY["metadrive"] = RllibMetaDrive
-except Exception as e:
-    ENV_REGISTRY["metadrive"] = str(e)
+import importlib
 
+
+class LazyEnvRegistry:
+    """Env name -> env class, imported only when the env is first looked up.
+
+    Importing every simulator wrapper up front makes every process (including
+    each ray rollout worker) pay the import cost of all ten simulators. Here
+    only the module path is recorded, and the module is imported on
+    ``registry[env_name]``. As before, a failed import is stored and returned
+    as the error string instead of the env class.
+    """
+
+    def __init__(self, env_module_dict):
+        self._env_module_dict = dict(env_module_dict)
+        self._loaded = {}
+
+    def register(self, env_name, module_path, class_name):
+        self._env_module_dict[env_name] = (module_path, class_name)
+        self._loaded.pop(env_name, None)
+
+    def module_path(self, env_name):
+        return self._env_module_dict[env_name][0]
+
+    def keys(self):
+        return self._env_module_dict.keys()
+
+    def __iter__(self):
+        return iter(self._env_module_dict)
+
+    def __contains__(self, env_name):
+        return env_name in self._env_module_dict
+
+    def __len__(self):
+        return len(self._env_module_dict)
+
+    def __getitem__(self, env_name):
+        if env_name not in self._loaded:
+            module_path, class_name = self._env_module_dict[env_name]
+            try:
+                self._loaded[env_name] = getattr(importlib.import_module(module_path), class_name)
+            except Exception as e:
+                self._loaded[env_name] = str(e)
+        return self._loaded[env_name]
+
+    def is_ready(self, env_name):
+        return env_name in self and not isinstance(self[env_name], str)
+
+    def check_all(self):
+        """Import every registered env and return [env_name, status, error_log, module_path] rows."""
+        status_ls = []
+        for env_name in self.keys():
+            if self.is_ready(env_name):
+                status_ls.append([env_name, "Ready", "Null", self.module_path(env_name)])
+            else:
+                status_ls.append([env_name, "Error", self[env_name], self.module_path(env_name)])
+        return status_ls
+
+
+ENV_REGISTRY = LazyEnvRegistry({
+    "mpe": ("envs.base_env.mpe", "RllibMPE"),
+    "mamujoco": ("envs.base_env.mamujoco", "RllibMAMujoco"),
+    "smac": ("envs.base_env.smac", "RLlibSMAC"),
+    "football": ("envs.base_env.football", "RllibGFootball"),
+    "magent": ("envs.base_env.magent", "RllibMAgent"),
+    "rware": ("envs.base_env.rware", "RllibRWARE"),
+    "lbf": ("envs.base_env.lbf", "RllibLBF"),
+    "pommerman": ("envs.base_env.pommerman", "RllibPommerman"),
+    "hanabi": ("envs.base_env.hanabi", "RLlibHanabi"),
+    "metadrive": ("envs.base_env.metadrive", "RllibMetaDrive"),
+    "synthetic": ("envs.base_env.synthetic", "RllibSynthetic"),
+})
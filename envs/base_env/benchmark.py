@@ -0,0 +1,258 @@
+"""Raw step/reset throughput of the env wrappers, separate from learning.
+
+Every env (and map) runs random valid actions, with the env_args of
+envs/base_env/config/<env>.yaml. Every public method of the simulator object a wrapper keeps
+in ``self.env`` is timed on its own during the steps (step, but also get_obs, get_state,
+get_avail_actions and the like), so the wrapper overhead (obs dict building, per-agent
+loops, recasts) shows up next to the simulator cost, split per simulator call.
+
+    python -m envs.base_env.benchmark --envs mpe,smac --maps smac=3m,8m_vs_9m --steps 1000 --output env_benchmark.json
+
+Results are printed as a table and written as json records to --output.
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import time
+import traceback
+from copy import deepcopy
+
+import numpy as np
+import yaml
+from gym.spaces import Discrete
+from tabulate import tabulate
+
+from envs.base_env import ENV_REGISTRY
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "config")
+
+
+class SimulatorTimer:
+    """Wall time of the calls into the public methods of a simulator object, per method.
+
+    Only the outermost call is booked, a simulator method calling another public one of
+    its own counts once, under the one the wrapper called. Nothing is booked while disabled.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.enabled = False
+        self._depth = 0
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            if not self.enabled or self._depth:
+                self._depth += 1
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self._depth -= 1
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+                self._depth -= 1
+
+        return timed
+
+    def total(self):
+        return sum(self.seconds.values())
+
+
+def load_env_args(env_name):
+    with open(os.path.join(CONFIG_DIR, "{}.yaml".format(env_name)), "r") as f:
+        env_args = yaml.load(f, Loader=yaml.FullLoader)["env_args"]
+    # handled by the launchers, not by the env wrappers
+    env_args.pop("num_envs_per_worker", None)
+    return env_args
+
+
+def time_simulator(env):
+    """Time the public methods of the simulator inside the wrapper, None if there is none to hook."""
+    inner = getattr(env, "env", None)
+    if inner is None:
+        return None
+    timer = SimulatorTimer()
+    wrapped = set()
+    for name in dir(inner):
+        if name.startswith("_"):
+            continue
+        try:
+            # static lookup first, so that properties are not evaluated
+            if isinstance(inspect.getattr_static(inner, name), (property, type)):
+                continue
+            method = getattr(inner, name)
+        except Exception:
+            continue
+        if not callable(method):
+            continue
+        try:
+            setattr(inner, name, timer.wrap(name, method))
+        except (AttributeError, TypeError):
+            continue
+        wrapped.add(name)
+    if "step" not in wrapped:
+        return None
+    return timer
+
+
+def random_actions(obs, action_space, rng):
+    # one action per agent that got an observation, within its action mask if it has one
+    actions = {}
+    for agent_id, agent_obs in obs.items():
+        action_mask = agent_obs.get("action_mask") if isinstance(agent_obs, dict) else None
+        if action_mask is not None and isinstance(action_space, Discrete):
+            actions[agent_id] = int(rng.choice(np.flatnonzero(action_mask)))
+        else:
+            actions[agent_id] = action_space.sample()
+    return actions
+
+
+def obs_bytes(agent_obs):
+    if isinstance(agent_obs, dict):
+        return sum(np.asarray(value).nbytes for value in agent_obs.values())
+    return np.asarray(agent_obs).nbytes
+
+
+def benchmark_env(env_class, env_args, steps, resets, seed=0):
+    if resets < 1:
+        raise ValueError("resets must be >= 1, the steps start from the obs of a reset")
+    rng = np.random.RandomState(seed)
+
+    start = time.perf_counter()
+    env = env_class(deepcopy(env_args))
+    construct_sec = time.perf_counter() - start
+    env.action_space.seed(seed)
+
+    reset_sec = 0.0
+    for _ in range(resets):
+        start = time.perf_counter()
+        obs = env.reset()
+        reset_sec += time.perf_counter() - start
+    obs_bytes_per_agent = float(np.mean([obs_bytes(agent_obs) for agent_obs in obs.values()]))
+
+    simulator = time_simulator(env)
+    step_sec = 0.0
+    agent_steps = 0
+    episodes = 0
+    for _ in range(steps):
+        actions = random_actions(obs, env.action_space, rng)
+        agent_steps += len(actions)
+        if simulator is not None:
+            simulator.enabled = True
+        start = time.perf_counter()
+        obs, _, dones, _ = env.step(actions)
+        step_sec += time.perf_counter() - start
+        if simulator is not None:
+            simulator.enabled = False
+        if dones["__all__"]:
+            episodes += 1
+            obs = env.reset()
+    # the resets after a done are in neither step_sec nor the simulator step time
+    simulator_sec = simulator.total() if simulator is not None else None
+    env.close()
+
+    record = {
+        "status": "ok",
+        "num_agents": len(env.agents),
+        "construct_sec": construct_sec,
+        "resets_per_sec": resets / reset_sec,
+        "steps_per_sec": steps / step_sec,
+        "agent_steps_per_sec": agent_steps / step_sec,
+        "episodes": episodes,
+        "obs_bytes_per_agent": obs_bytes_per_agent,
+        "obs_bytes_per_step": obs_bytes_per_agent * agent_steps / steps,
+        "simulator_step_us": None,
+        "wrapper_overhead_us": None,
+        "wrapper_overhead_fraction": None,
+        "simulator_calls_us": None,
+    }
+    if simulator_sec is not None:
+        record["simulator_step_us"] = simulator_sec / steps * 1e6
+        # per env step, by the simulator method the wrapper called
+        record["simulator_calls_us"] = {name: seconds / steps * 1e6 for name, seconds in
+                                        sorted(simulator.seconds.items(), key=lambda item: -item[1])}
+        record["wrapper_overhead_us"] = (step_sec - simulator_sec) / steps * 1e6
+        record["wrapper_overhead_fraction"] = (step_sec - simulator_sec) / step_sec
+    return record
+
+
+def parse_maps(maps_arg):
+    # "smac=3m,8m_vs_9m;mpe=simple_spread" -> {"smac": ["3m", "8m_vs_9m"], "mpe": ["simple_spread"]}
+    maps = {}
+    for item in filter(None, maps_arg.split(";")):
+        env_name, map_names = item.split("=")
+        maps[env_name] = map_names.split(",")
+    return maps
+
+
+def run(env_names, maps, steps, resets, seed=0):
+    if resets < 1:
+        raise ValueError("resets must be >= 1, the steps start from the obs of a reset")
+    records = []
+    for env_name in env_names:
+        env_class = ENV_REGISTRY[env_name]
+        env_args = load_env_args(env_name)
+        for map_name in maps.get(env_name, [env_args.get("map_name")]):
+            record = {"env": env_name, "map_name": map_name}
+            if isinstance(env_class, str):  # import error
+                record.update({"status": "error", "error": env_class})
+            else:
+                env_args["map_name"] = map_name
+                try:
+                    record.update(benchmark_env(env_class, env_args, steps, resets, seed))
+                except Exception:
+                    record.update({"status": "error", "error": traceback.format_exc()})
+            records.append(record)
+            print("{} {}: {}".format(env_name, map_name, record["status"]))
+    return records
+
+
+def format_calls(calls):
+    if not calls:
+        return None
+    return "\n".join("{}: {:.4g}".format(name, us) for name, us in calls.items())
+
+
+def print_table(records):
+    columns = ["env", "map_name", "status", "steps_per_sec", "agent_steps_per_sec", "resets_per_sec",
+               "simulator_step_us", "wrapper_overhead_us", "wrapper_overhead_fraction", "obs_bytes_per_step"]
+    rows = [[record.get(column) for column in columns] + [format_calls(record.get("simulator_calls_us"))]
+            for record in records]
+    columns = columns + ["simulator_calls_us"]
+    print(tabulate(rows, headers=columns, tablefmt="grid", floatfmt=".4g"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--envs", type=str, default="", help="comma separated, all registered envs by default")
+    parser.add_argument("--maps", type=str, default="",
+                        help="maps per env, e.g. \"smac=3m,8m_vs_9m;mpe=simple_spread\", the yaml map by default")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--resets", type=int, default=20, help=">= 1, the steps start from the obs of a reset")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="env_benchmark.json")
+    args = parser.parse_args()
+    if args.resets < 1:
+        parser.error("--resets must be >= 1")
+
+    env_names = args.envs.split(",") if args.envs else list(ENV_REGISTRY.keys())
+    records = run(env_names, parse_maps(args.maps), args.steps, args.resets, args.seed)
+    print_table(records)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "steps": args.steps,
+            "resets": args.resets,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "results": records,
+        }, f, indent=2)
+    print("results written to {}".format(args.output))
@@ -0,0 +1,98 @@
+import numpy as np
+from gym.spaces import Dict as GymDict
+from ray.rllib.env.multi_agent_env import MultiAgentEnv
+
+
+class ColumnarObs:
+    """Preallocated array-of-agents observation of a multi-agent env.
+
+    obs:         [n_agents, *obs_shape]
+    action_mask: [n_agents, n_actions], None if the env has no action mask
+    state:       [*state_shape], one global state shared by all agents, None if the env has no state
+
+    The columns are overwritten in place on every reset/step. ``to_obs_dict`` builds the RLlib
+    per-agent dict out of views into the columns, which is safe as RLlib's preprocessors
+    copy the observation into a new flat array.
+
+    With share_state=True the global state is emitted once per step, on the first agent only
+    (the state carrier), instead of being copied into every agent's observation.
+    """
+
+    def __init__(self, agents, obs_shape, obs_dtype=np.float32, state_shape=None, n_actions=None,
+                 share_state=False):
+        self.agents = list(agents)
+        self.share_state = share_state
+        self.obs = np.zeros((len(self.agents),) + tuple(obs_shape), dtype=obs_dtype)
+        self.state = None if state_shape is None else np.zeros(tuple(state_shape), dtype=np.float32)
+        self.action_mask = None if n_actions is None else np.zeros((len(self.agents), n_actions), dtype=np.float32)
+
+    @classmethod
+    def from_arrays(cls, agents, obs, state=None, action_mask=None, share_state=False):
+        # columns backed by existing arrays, e.g. the shared memory of envs.base_env.env_pool
+        columns = cls.__new__(cls)
+        columns.agents = list(agents)
+        columns.share_state = share_state
+        columns.obs = obs
+        columns.state = state
+        columns.action_mask = action_mask
+        return columns
+
+    def to_obs_dict(self):
+        obs_dict = {}
+        for i, agent in enumerate(self.agents):
+            agent_obs = {"obs": self.obs[i]}
+            if self.state is not None and (i == 0 or not self.share_state):
+                agent_obs["state"] = self.state
+            if self.action_mask is not None:
+                agent_obs["action_mask"] = self.action_mask[i]
+            obs_dict[agent] = agent_obs
+        return obs_dict
+
+
+def drop_state(space):
+    # obs space of the agents that are not the state carrier in share_state mode
+    return GymDict({k: v for k, v in space.spaces.items() if k != "state"})
+
+
+def actions_to_list(action_dict, agents):
+    # env side agent order, not the order of action_dict keys
+    return [action_dict[agent] for agent in agents]
+
+
+class StateInInfos(MultiAgentEnv):
+    """share_global_state for per agent policies (run_cc), around an env with share_state columns.
+
+    Per agent policies need the same obs space for all agents, so the state is taken out of
+    the state carrier's observation and goes into its info of the next step instead, as the
+    state the actions of that step were computed on. The info rows of the carrier's batch are
+    then the states of its obs rows, read once per step by the centralized critic
+    postprocessing (marl.algos.utils.postprocessing.episode_shared_state).
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.agents = env.agents
+        self.carrier = env.agents[0]
+        self.observation_space = drop_state(env.observation_space)
+        self.action_space = env.action_space
+        self.state = None
+
+    def _take_state(self, obs):
+        # a copy, the carrier's state is a view into columns the env overwrites in place
+        if self.carrier in obs:
+            self.state = np.array(obs[self.carrier].pop("state"))
+        return obs
+
+    def reset(self):
+        return self._take_state(self.env.reset())
+
+    def step(self, action_dict):
+        state = self.state
+        obs, rewards, dones, infos = self.env.step(action_dict)
+        if self.carrier in obs:
+            infos = dict(infos)
+            infos[self.carrier] = dict(infos.get(self.carrier, {}), state=state)
+        return self._take_state(obs), rewards, dones, infos
+
+    def close(self):
+        self.env.close()
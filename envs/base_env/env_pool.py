@@ -0,0 +1,225 @@
+import multiprocessing as mp
+import os
+import time
+import traceback
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from ray import cloudpickle
+from ray.rllib.env.base_env import BaseEnv, ASYNC_RESET_RETURN
+from envs.base_env.columnar import ColumnarObs
+
+COLUMNS = ("obs", "state", "action_mask")
+
+
+def _pool_worker(conn, env_fn_bytes, cpu):
+    """Subprocess side of SubprocEnvPool: owns one env and steps it on request.
+
+    The columns of a ColumnarObs env are moved into shared memory, so the env writes its
+    observations straight into the buffers the pool reads, and only rewards, dones and
+    infos go through the pipe. Other envs send their observation dicts through the pipe.
+    """
+    shms = []
+    try:
+        if cpu is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {cpu})
+        env = cloudpickle.loads(env_fn_bytes)()
+
+        columns = getattr(env, "columns", None)
+        columnar = isinstance(columns, ColumnarObs)
+        column_specs = {}
+        if columnar:
+            for name in COLUMNS:
+                array = getattr(columns, name)
+                if array is None:
+                    continue
+                shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+                shms.append(shm)
+                shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+                shared[...] = array
+                setattr(columns, name, shared)
+                column_specs[name] = (shm.name, array.shape, array.dtype.str)
+
+        conn.send(("ok", {
+            "agents": list(env.agents),
+            "observation_space": env.observation_space,
+            "action_space": env.action_space,
+            "columns": column_specs,
+            "share_state": columns.share_state if columnar else False,
+        }))
+
+        while True:
+            cmd, data = conn.recv()
+            if cmd == "step":
+                obs, rewards, dones, infos = env.step(data)
+            elif cmd == "reset":
+                # same as rllib's remote multi agent env
+                obs = env.reset()
+                rewards = {agent_id: 0 for agent_id in obs.keys()}
+                dones = {"__all__": False}
+                infos = {agent_id: {} for agent_id in obs.keys()}
+            elif cmd == "close":
+                env.close()
+                break
+            else:
+                raise ValueError("unknown env pool command {}".format(cmd))
+            # the observations of a columnar env are already in shared memory
+            conn.send(("ok", (None if columnar else obs, rewards, dones, infos)))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        try:
+            conn.send(("error", traceback.format_exc()))
+        except (BrokenPipeError, EOFError):
+            pass
+    finally:
+        for shm in shms:
+            shm.close()
+        conn.close()
+
+
+class SubprocEnvPool(BaseEnv):
+    """num_envs copies of a MultiAgentEnv, each stepped in its own subprocess.
+
+    The pool is an rllib BaseEnv with the semantics of rllib's remote envs: poll() returns
+    the envs whose step/reset result is ready, and try_reset() is asynchronous. So while
+    the policies compute actions for the ready envs, the other simulators keep stepping.
+
+    Envs with the ColumnarObs API (SMAC, MaMujoco, GFootball, RWARE, LBF) write their
+    observations into shared memory, and the returned observation dicts are views into it.
+    This is safe as rllib's preprocessors copy them before the next step of that env is
+    sent.
+
+    Args:
+        make_env: picklable (by cloudpickle) function returning the MultiAgentEnv
+        num_envs: number of subprocesses / env copies
+        cpus: cpu ids the subprocesses are pinned to, round robin, empty for no pinning
+        wait_ms: after the first env is ready, wait up to this long for more envs so
+            that the policies compute actions for larger batches
+    """
+
+    def __init__(self, make_env, num_envs, cpus=(), wait_ms=0):
+        self.num_envs = num_envs
+        self.wait_ms = wait_ms
+        ctx = mp.get_context("spawn")
+        env_fn_bytes = cloudpickle.dumps(make_env)
+
+        self.conns = []
+        self.procs = []
+        for i in range(num_envs):
+            cpu = cpus[i % len(cpus)] if cpus else None
+            conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(target=_pool_worker, args=(child_conn, env_fn_bytes, cpu), daemon=True)
+            proc.start()
+            child_conn.close()
+            self.conns.append(conn)
+            self.procs.append(proc)
+        self.env_ids = {conn: env_id for env_id, conn in enumerate(self.conns)}
+
+        self.shms = []
+        self.columns = []
+        for conn in self.conns:
+            info = self._recv(conn)
+            self.columns.append(self._attach_columns(info) if info["columns"] else None)
+        self.agents = info["agents"]
+        self.observation_space = info["observation_space"]
+        self.action_space = info["action_space"]
+
+        # the first poll() returns the reset of every env
+        for conn in self.conns:
+            conn.send(("reset", None))
+        self.pending = set(self.conns)
+
+    def _attach_columns(self, info):
+        arrays = {}
+        for name, (shm_name, shape, dtype) in info["columns"].items():
+            shm = SharedMemory(name=shm_name)
+            self.shms.append(shm)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        return ColumnarObs.from_arrays(info["agents"], share_state=info["share_state"], **arrays)
+
+    def _recv(self, conn):
+        try:
+            status, data = conn.recv()
+        except EOFError:
+            raise RuntimeError("env {} of the env pool exited".format(self.env_ids[conn]))
+        if status == "error":
+            raise RuntimeError("env {} of the env pool failed:\n{}".format(self.env_ids[conn], data))
+        return data
+
+    def poll(self):
+        if not self.pending:
+            return {}, {}, {}, {}, {}
+        ready = set(wait(self.pending))
+        if self.wait_ms > 0:
+            deadline = time.time() + self.wait_ms / 1000.0
+            while len(ready) < len(self.pending):
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                ready.update(wait(self.pending - ready, timeout))
+
+        obs, rewards, dones, infos = {}, {}, {}, {}
+        for conn in ready:
+            self.pending.remove(conn)
+            env_id = self.env_ids[conn]
+            env_obs, rewards[env_id], dones[env_id], infos[env_id] = self._recv(conn)
+            obs[env_id] = self.columns[env_id].to_obs_dict() if env_obs is None else env_obs
+        return obs, rewards, dones, infos, {}
+
+    def send_actions(self, action_dict):
+        for env_id, actions in action_dict.items():
+            conn = self.conns[env_id]
+            conn.send(("step", actions))
+            self.pending.add(conn)
+
+    def try_reset(self, env_id=None):
+        conn = self.conns[env_id]
+        conn.send(("reset", None))
+        self.pending.add(conn)
+        return ASYNC_RESET_RETURN
+
+    def get_unwrapped(self):
+        # the envs live in the subprocesses
+        return []
+
+    def stop(self):
+        for conn in self.conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for shm in self.shms:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.shms = []
+
+
+def env_pool_creator(make_env, config_dict):
+    """register_env creator of the launchers.
+
+    With config_dict["env_pool_size"] > 0 (ray.yaml) each rollout worker runs that many
+    copies of make_env() in a SubprocEnvPool, otherwise it builds make_env() itself.
+    """
+    pool_size = config_dict.get("env_pool_size", 0)
+    if not pool_size:
+        return lambda _: make_env()
+
+    cpus = list(config_dict.get("env_pool_cpus", []))
+    wait_ms = config_dict.get("env_pool_wait_ms", 0)
+
+    def creator(env_context):
+        # rollout workers take consecutive slices of the cpu list
+        offset = getattr(env_context, "worker_index", 0) * pool_size
+        worker_cpus = [cpus[(offset + i) % len(cpus)] for i in range(pool_size)] if cpus else []
+        return SubprocEnvPool(make_env, pool_size, worker_cpus, wait_ms)
+
+    return creator
@@ -3,6 +3,7 @@ import gym
 from gym.spaces import Dict as GymDict, Box
 from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from ray.tune.utils import merge_dicts
+from envs.base_env.columnar import ColumnarObs, actions_to_list
 
 SMM_WIDTH = 42
 SMM_HEIGHT = 42
@@ -31,6 +32,8 @@ class RllibGFootball(MultiAgentEnv):
 
     def __init__(self, env_config):
         env_config["env_name"] = env_config.pop("map_name")
+        # [C, H, W] minimaps, conv encoders take them without a permute
+        self.channels_first = env_config.pop("channels_first", False)
         self.env_config = env_config
         self.num_agents = ally_num_dict[self.env_config["env_name"]]
 
@@ -41,38 +44,42 @@ class RllibGFootball(MultiAgentEnv):
 
         self.env = football_env.create_environment(**merge_dicts(self.env_config, extra_setting))
         self.action_space = gym.spaces.Discrete(self.env.action_space.nvec[1])
+        low, high = self.env.observation_space.low[0], self.env.observation_space.high[0]
+        if self.channels_first:
+            low, high = low.transpose(2, 0, 1), high.transpose(2, 0, 1)
         self.observation_space = GymDict({"obs": Box(
-            low=self.env.observation_space.low[0],
-            high=self.env.observation_space.high[0],
+            low=low,
+            high=high,
             dtype=self.env.observation_space.dtype)})
         self.agents = ["agent_{}".format(i) for i in range(self.num_agents)]
+        self.columns = ColumnarObs(self.agents, self.observation_space["obs"].shape,
+                                   obs_dtype=self.observation_space["obs"].dtype)
 
         # back to be compatible in run script
         env_config["map_name"] = env_config.pop("env_name")
+        env_config["channels_first"] = self.channels_first
+
+    def _write_obs(self, o):
+        # [n_agents, H, W, C] from gfootball
+        self.columns.obs[:] = o.transpose(0, 3, 1, 2) if self.channels_first else o
+
+    def reset_columnar(self):
+        self._write_obs(self.env.reset())
+        return self.columns
+
+    def step_columnar(self, actions):
+        o, r, d, i = self.env.step(actions)
+        self._write_obs(o)
+        return self.columns, r, d, i
 
     def reset(self):
-        original_obs = self.env.reset()
-        obs = {}
-        for x in range(self.num_agents):
-            obs["agent_%d" % x] = {
-                "obs": original_obs[x]
-            }
-        return obs
+        return self.reset_columnar().to_obs_dict()
 
     def step(self, action_dict):
-        actions = []
-        for key, value in sorted(action_dict.items()):
-            actions.append(value)
-        o, r, d, i = self.env.step(actions)
-        rewards = {}
-        obs = {}
-        infos = {}
-        for pos, key in enumerate(sorted(action_dict.keys())):
-            infos[key] = i
-            rewards[key] = r[pos]
-            obs[key] = {
-                "obs": o[pos]
-            }
+        columns, r, d, i = self.step_columnar(actions_to_list(action_dict, self.agents))
+        obs = columns.to_obs_dict()
+        rewards = {key: r[pos] for pos, key in enumerate(self.agents)}
+        infos = {key: i for key in self.agents}
         dones = {"__all__": d}
         return obs, rewards, dones, infos
 
@@ -85,6 +92,7 @@ class RllibGFootball(MultiAgentEnv):
             "space_act": self.action_space,
             "num_agents": self.num_agents,
             "episode_limit": 200,
-            "policy_mapping_info": policy_mapping_dict
+            "policy_mapping_info": policy_mapping_dict,
+            "channels_first": self.channels_first,
         }
         return env_info
@@ -1,5 +1,6 @@
+import numpy as np
 from ray.rllib.env.multi_agent_env import MultiAgentEnv
-from gym.spaces import Dict as GymDict, Box
+from gym.spaces import Dict as GymDict, Box, MultiDiscrete
 import supersuit as ss
 from ray.rllib.env import PettingZooEnv, ParallelPettingZooEnv
 from pettingzoo.magent import adversarial_pursuit_v3, battle_v3, battlefield_v3, combined_arms_v5, gather_v3, \
@@ -13,6 +14,14 @@ REGISTRY["combined_arms"] = combined_arms_v5.env
 REGISTRY["gather"] = gather_v3.env
 REGISTRY["tiger_deer"] = tiger_deer_v3.env
 
+PARALLEL_REGISTRY = {}
+PARALLEL_REGISTRY["adversarial_pursuit"] = adversarial_pursuit_v3.parallel_env
+PARALLEL_REGISTRY["battle"] = battle_v3.parallel_env
+PARALLEL_REGISTRY["battlefield"] = battlefield_v3.parallel_env
+PARALLEL_REGISTRY["combined_arms"] = combined_arms_v5.parallel_env
+PARALLEL_REGISTRY["gather"] = gather_v3.parallel_env
+PARALLEL_REGISTRY["tiger_deer"] = tiger_deer_v3.parallel_env
+
 mini_channel_dim_dict = {
     "adversarial_pursuit": 4,
     "battle": 4,
@@ -22,6 +31,16 @@ mini_channel_dim_dict = {
     "tiger_deer": 6,
 }
 
+
+def split_channels(low, high, mini_channel_dim, channels_first):
+    # (obs, state) bounds, channels on the last or (channels_first) the first axis
+    if channels_first:
+        low, high = np.moveaxis(low, -1, -3), np.moveaxis(high, -1, -3)
+        return (low[..., :-mini_channel_dim, :, :], high[..., :-mini_channel_dim, :, :]), \
+               (low[..., -mini_channel_dim:, :, :], high[..., -mini_channel_dim:, :, :])
+    return (low[..., :-mini_channel_dim], high[..., :-mini_channel_dim]), \
+           (low[..., -mini_channel_dim:], high[..., -mini_channel_dim:])
+
 # magent agent number is large, one_agent_one_policy is set to be False on all scenarios
 policy_mapping_dict = {
     "adversarial_pursuit": {
@@ -65,8 +84,20 @@ policy_mapping_dict = {
 
 class RllibMAgent(MultiAgentEnv):
 
+    def __new__(cls, env_config):
+        # env_args.team_batch switches to one agent per team, see RllibMAgentTeam
+        if cls is RllibMAgent and env_config.get("team_batch", False):
+            return RllibMAgentTeam(env_config)
+        return super().__new__(cls)
+
     def __init__(self, env_config):
         map = env_config.pop("map_name", None)
+        env_config.pop("team_batch", None)
+        self.channels_first = env_config.pop("channels_first", False)
+        # opt-in float16 observations: half the rollout, transport and replay memory, but lossy
+        # as the MAgent features are fractions (hp, minimap densities), not integer grids
+        self.compact_obs = env_config.pop("compact_obs", False)
+        self.obs_dtype = np.float16 if self.compact_obs else None
 
         env = REGISTRY[map](**env_config)
 
@@ -78,29 +109,46 @@ class RllibMAgent(MultiAgentEnv):
         self.env = PettingZooEnv(env)
         self.mini_channel_dim = mini_channel_dim_dict[map]
         self.action_space = self.env.action_space
+        space = self.env.observation_space
+        (obs_low, obs_high), (state_low, state_high) = split_channels(
+            space.low, space.high, self.mini_channel_dim, self.channels_first)
+        self.obs_dtype = self.obs_dtype or space.dtype
         self.observation_space = GymDict({
-            "obs": Box(
-                low=self.env.observation_space.low[:, :, :-self.mini_channel_dim],
-                high=self.env.observation_space.high[:, :, :-self.mini_channel_dim],
-                dtype=self.env.observation_space.dtype),
-            "state": Box(
-                low=self.env.observation_space.low[:, :, -self.mini_channel_dim:],
-                high=self.env.observation_space.high[:, :, -self.mini_channel_dim:],
-                dtype=self.env.observation_space.dtype),
+            "obs": Box(low=obs_low, high=obs_high, dtype=self.obs_dtype),
+            "state": Box(low=state_low, high=state_high, dtype=self.obs_dtype),
         })
         self.agents = self.env.agents
         self.num_agents = len(self.agents)
+        if self.channels_first:
+            # [C, H, W] buffer per agent, obs and state are two contiguous views of it
+            self.agent_obs = {
+                agent: np.zeros(np.moveaxis(space.low, -1, 0).shape, dtype=self.obs_dtype)
+                for agent in self.agents}
         env_config["map_name"] = map
+        env_config["team_batch"] = False
+        env_config["channels_first"] = self.channels_first
+        env_config["compact_obs"] = self.compact_obs
         self.env_config = env_config
 
+    def _split(self, agent, agent_obs):
+        if self.channels_first:
+            buffer = self.agent_obs[agent]
+            np.copyto(buffer, agent_obs.transpose(2, 0, 1))
+            return {
+                "obs": buffer[:-self.mini_channel_dim],
+                "state": buffer[-self.mini_channel_dim:]
+            }
+        agent_obs = agent_obs.astype(self.obs_dtype, copy=False)
+        return {
+            "obs": agent_obs[:, :, :-self.mini_channel_dim],
+            "state": agent_obs[:, :, -self.mini_channel_dim:]
+        }
+
     def reset(self):
         original_obs = self.env.reset()
         obs = {}
         for key in original_obs.keys():
-            obs[key] = {
-                "obs": original_obs[key][:, :, :-self.mini_channel_dim],
-                "state": original_obs[key][:, :, -self.mini_channel_dim:]
-            }
+            obs[key] = self._split(key, original_obs[key])
         return obs
 
     def step(self, action_dict):
@@ -109,10 +157,7 @@ class RllibMAgent(MultiAgentEnv):
         obs = {}
         for key in o.keys():
             rewards[key] = r[key]
-            obs[key] = {
-                "obs": o[key][:, :, :-self.mini_channel_dim],
-                "state": o[key][:, :, -self.mini_channel_dim:]
-            }
+            obs[key] = self._split(key, o[key])
         dones = {"__all__": d["__all__"]}
         return obs, rewards, dones, info
 
@@ -125,6 +170,142 @@ class RllibMAgent(MultiAgentEnv):
             "space_act": self.action_space,
             "num_agents": self.num_agents,
             "episode_limit": 200,
-            "policy_mapping_info": policy_mapping_dict
+            "policy_mapping_info": policy_mapping_dict,
+            "team_batch": False,
+            "channels_first": self.channels_first,
+        }
+        return env_info
+
+
+class RllibMAgentTeam(MultiAgentEnv):
+    """Team level MAgent: one RLlib agent per team instead of one per unit.
+
+    Agent "<team_prefix>team" observes
+      obs:   [n_team_agents, H, W, C - mini_channel_dim]
+      state: [n_team_agents, H, W, mini_channel_dim]
+      alive: [n_team_agents], 1 for units that are alive and act this step
+    (obs/state are [n_team_agents, C, H, W] with env_args.channels_first)
+    and acts with one MultiDiscrete action holding an action per unit. All teams are
+    padded to the largest team size so that group policies share one space. The team
+    reward is the sum of its units' rewards, as in rllib agent grouping.
+
+    Built on the parallel pettingzoo env, the team tensors are preallocated and
+    filled in place on every reset/step.
+    """
+
+    def __init__(self, env_config):
+        map = env_config.pop("map_name", None)
+        env_config.pop("team_batch", None)
+        self.channels_first = env_config.pop("channels_first", False)
+        # opt-in float16 observations: half the rollout, transport and replay memory, but lossy
+        # as the MAgent features are fractions (hp, minimap densities), not integer grids
+        self.compact_obs = env_config.pop("compact_obs", False)
+        self.obs_dtype = np.float16 if self.compact_obs else None
+
+        env = PARALLEL_REGISTRY[map](**env_config)
+        env = ss.pad_observations_v0(env)
+        env = ss.pad_action_space_v0(env)
+        self.env = env
+
+        self.mini_channel_dim = mini_channel_dim_dict[map]
+        agent_obs_space = env.observation_spaces[env.possible_agents[0]]
+        agent_action_space = env.action_spaces[env.possible_agents[0]]
+
+        self.teams = {}
+        for prefix in policy_mapping_dict[map]["team_prefix"]:
+            members = [agent for agent in env.possible_agents if agent.startswith(prefix)]
+            self.teams[prefix + "team"] = members
+        self.unit_index = {
+            agent: (team, i) for team, members in self.teams.items() for i, agent in enumerate(members)}
+        self.team_size = max(len(members) for members in self.teams.values())
+
+        self.obs_dtype = self.obs_dtype or agent_obs_space.dtype
+
+        def team_box(low, high):
+            return Box(low=np.broadcast_to(low, (self.team_size,) + low.shape),
+                       high=np.broadcast_to(high, (self.team_size,) + high.shape),
+                       dtype=self.obs_dtype)
+
+        (obs_low, obs_high), (state_low, state_high) = split_channels(
+            agent_obs_space.low, agent_obs_space.high, self.mini_channel_dim, self.channels_first)
+        self.action_space = MultiDiscrete([agent_action_space.n] * self.team_size)
+        self.observation_space = GymDict({
+            "obs": team_box(obs_low, obs_high),
+            "state": team_box(state_low, state_high),
+            # same dtype as obs/state, the flat team obs keeps the compact dtype
+            "alive": Box(low=0.0, high=1.0, shape=(self.team_size,), dtype=self.obs_dtype),
+        })
+        unit_shape = agent_obs_space.shape
+        if self.channels_first:
+            unit_shape = unit_shape[-1:] + unit_shape[:-1]
+        self.team_obs = {
+            team: np.zeros((self.team_size,) + unit_shape, dtype=self.obs_dtype)
+            for team in self.teams}
+        self.team_alive = {team: np.zeros(self.team_size, dtype=self.obs_dtype) for team in self.teams}
+
+        self.agents = list(self.teams.keys())
+        self.num_agents = len(self.agents)
+        env_config["map_name"] = map
+        env_config["team_batch"] = True
+        env_config["channels_first"] = self.channels_first
+        env_config["compact_obs"] = self.compact_obs
+        self.env_config = env_config
+
+    def _team_obs_dict(self, original_obs, dones):
+        for team in self.teams:
+            self.team_obs[team].fill(0)
+            self.team_alive[team].fill(0)
+        for agent, agent_obs in original_obs.items():
+            team, i = self.unit_index[agent]
+            if self.channels_first:
+                np.copyto(self.team_obs[team][i], agent_obs.transpose(2, 0, 1))
+            else:
+                self.team_obs[team][i] = agent_obs
+            if not dones.get(agent, False):
+                self.team_alive[team][i] = 1
+        # views into the team buffers, rllib's preprocessors copy them
+        if self.channels_first:
+            return {
+                team: {
+                    "obs": self.team_obs[team][:, :-self.mini_channel_dim],
+                    "state": self.team_obs[team][:, -self.mini_channel_dim:],
+                    "alive": self.team_alive[team],
+                } for team in self.teams}
+        return {
+            team: {
+                "obs": self.team_obs[team][..., :-self.mini_channel_dim],
+                "state": self.team_obs[team][..., -self.mini_channel_dim:],
+                "alive": self.team_alive[team],
+            } for team in self.teams}
+
+    def reset(self):
+        original_obs = self.env.reset()
+        return self._team_obs_dict(original_obs, {})
+
+    def step(self, action_dict):
+        actions = {}
+        for agent in self.env.agents:
+            team, i = self.unit_index[agent]
+            actions[agent] = action_dict[team][i]
+        o, r, d, info = self.env.step(actions)
+        rewards = {team: 0.0 for team in self.teams}
+        for agent, reward in r.items():
+            rewards[self.unit_index[agent][0]] += reward
+        obs = self._team_obs_dict(o, d)
+        dones = {"__all__": not self.env.agents}
+        return obs, rewards, dones, {}
+
+    def close(self):
+        self.env.close()
+
+    def get_env_info(self):
+        env_info = {
+            "space_obs": self.observation_space,
+            "space_act": self.action_space,
+            "num_agents": self.num_agents,
+            "episode_limit": 200,
+            "policy_mapping_info": policy_mapping_dict,
+            "team_batch": True,
+            "channels_first": self.channels_first,
         }
         return env_info
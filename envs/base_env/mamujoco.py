@@ -5,6 +5,7 @@ except ModuleNotFoundError:
     from MaMujocoEnv.src.multiagent_mujoco.mujoco_multi import MujocoMulti
 from gym.spaces import Dict as GymDict, Discrete, Box
 import numpy as np
+from envs.base_env.columnar import ColumnarObs, actions_to_list
 
 env_args_dict = {
     "2AgentAnt": {"scenario": "Ant-v2",
@@ -74,6 +75,7 @@ policy_mapping_dict = {
 class RllibMAMujoco(MultiAgentEnv):
 
     def __init__(self, env_config):
+        self.share_global_state = env_config.get("share_global_state", False)
         self.env_config = env_args_dict[env_config["map_name"]]
         self.env = MujocoMulti(env_args=self.env_config)
         self.action_space = self.env.action_space[0]
@@ -89,44 +91,32 @@ class RllibMAMujoco(MultiAgentEnv):
             self.num_agents = int(self.env_config["agent_conf"].split("x")[0])
 
         self.agents = ["agent_{}".format(i) for i in range(self.num_agents)]
+        self.columns = ColumnarObs(self.agents, (self.env.obs_size,), state_shape=(self.state_dim,),
+                                   share_state=self.share_global_state)
 
+    def _update_columns(self):
+        # the float32 cast for RLLIB check happens once in the column assignment
+        self.columns.obs[:] = self.env.get_obs()  # obs
+        self.columns.state[:] = self.env.get_state()  # g state
+        return self.columns
 
-    def reset(self):
+    def reset_columnar(self):
         self.env.reset()
-        o = self.env.get_obs()  # obs
-        s = self.env.get_state()  # g state
-        # to float32 for RLLIB check
-        obs = {}
-        for x in range(self.num_agents):
-            obs["agent_%d" % x] = {
-                "obs": np.float32(o[x]),
-                "state": np.float32(s),
-            }
-        return obs
-
-    def step(self, action_dict):
-        # print(f"Running Env ID: {id(self)}")
-        actions = []
-        for key, value in sorted(action_dict.items()):
-            actions.append(value)
-
-        actions = normalize_action(np.array(actions), self.action_space)
+        return self._update_columns()
 
+    def step_columnar(self, actions):
+        actions = normalize_action(np.asarray(actions), self.action_space)
         r, d, _ = self.env.step(actions)
+        return self._update_columns(), r, d, {}
 
-        o = self.env.get_obs()  # obs
-        s = self.env.get_state()  # g state
-        rewards = {}
-        obs = {}
-        infos = {}
-        # to float32 for RLLIB check
-        for pos, key in enumerate(sorted(action_dict.keys())):
-            rewards[key] = r
-            obs[key] = o[pos]
-            obs[key] = {
-                "obs": np.float32(o[pos]),
-                "state": np.float32(s),
-            }
+    def reset(self):
+        return self.reset_columnar().to_obs_dict()
+
+    def step(self, action_dict):
+        # print(f"Running Env ID: {id(self)}")
+        columns, r, d, infos = self.step_columnar(actions_to_list(action_dict, self.agents))
+        obs = columns.to_obs_dict()
+        rewards = {key: r for key in self.agents}
         dones = {"__all__": d}
         return obs, rewards, dones, infos
 
@@ -139,7 +129,8 @@ class RllibMAMujoco(MultiAgentEnv):
             "space_act": self.action_space,
             "num_agents": self.num_agents,
             "episode_limit": 200,
-            "policy_mapping_info": policy_mapping_dict
+            "policy_mapping_info": policy_mapping_dict,
+            "share_global_state": self.share_global_state,
         }
         return env_info
 
@@ -2,8 +2,6 @@ from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from gym.spaces import Dict as GymDict, Discrete, Box
 from metadrive.envs.marl_envs import MultiAgentBottleneckEnv, MultiAgentParkingLotEnv, MultiAgentRoundaboutEnv, \
     MultiAgentIntersectionEnv, MultiAgentTollgateEnv
-from collections import defaultdict
-from metadrive.utils import norm
 import numpy as np
 
 SUPER_REGISTRY = {}
@@ -34,11 +32,10 @@ def dynamic_inheritance(super_class):
             self.__name__ = map
             self.__qualname__ = map
             self.neighbours_distance = NE_distance
-            self.distance_map = defaultdict(lambda: defaultdict(lambda: float("inf")))
 
         def step(self, actions):
             obs, reward, done, info = super(super_class, self).step(actions)
-            update_neighbours_map(self.distance_map, self.vehicles, reward, info, self.config)
+            update_neighbours_map(self.vehicles, reward, info, self.config)
             return obs, reward, done, info
 
     return RllibMetaDrive_Scenario
@@ -104,44 +101,67 @@ class RllibMetaDrive(MultiAgentEnv):
         return env_info
 
 
-def update_neighbours_map(distance_map, vehicles, reward, info, config):
-    distance_map.clear()
+def update_neighbours_map(vehicles, reward, info, config):
     keys = list(vehicles.keys())
-    for c1 in range(0, len(keys) - 1):
-        for c2 in range(c1 + 1, len(keys)):
-            k1 = keys[c1]
-            k2 = keys[c2]
-            p1 = vehicles[k1].position
-            p2 = vehicles[k2].position
-            distance = norm(p1[0] - p2[0], p1[1] - p2[1])
-            distance_map[k1][k2] = distance
-            distance_map[k2][k1] = distance
-
+    neighbours = {k: [] for k in keys}
+    nei_distances = {k: [] for k in keys}
+    if len(keys) > 1 and config["neighbours_distance"] > 0:
+        positions = np.array([vehicles[k].position[:2] for k in keys], dtype=np.float64)
+        i, j, distance = find_in_range(positions, config["neighbours_distance"])
+        # i is sorted, split the pairs into one run per vehicle
+        starts = np.searchsorted(i, np.arange(len(keys) + 1))
+        j, distance = j.tolist(), distance.tolist()
+        for c, k in enumerate(keys):
+            neighbours[k] = [keys[n] for n in j[starts[c]:starts[c + 1]]]
+            nei_distances[k] = distance[starts[c]:starts[c + 1]]
+
+    global_rewards = sum(reward.values()) / len(reward.values())
     for kkk in info.keys():
-        neighbours, nei_distances = find_in_range(kkk, config["neighbours_distance"], distance_map)
-        info[kkk]["neighbours"] = neighbours
-        info[kkk]["neighbours_distance"] = nei_distances
-        nei_rewards = [reward[kkkkk] for kkkkk in neighbours]
+        info[kkk]["neighbours"] = neighbours.get(kkk, [])
+        info[kkk]["neighbours_distance"] = nei_distances.get(kkk, [])
+        nei_rewards = [reward[kkkkk] for kkkkk in info[kkk]["neighbours"]]
         if nei_rewards:
             info[kkk]["nei_rewards"] = sum(nei_rewards) / len(nei_rewards)
         else:
             # i[kkk]["nei_rewards"] = r[kkk]
             info[kkk]["nei_rewards"] = 0.0  # Do not provides neighbour rewards
-        info[kkk]["global_rewards"] = sum(reward.values()) / len(reward.values())
-
-
-def find_in_range(v_id, distance, distance_map):
-    if distance <= 0:
-        return []
-    max_distance = distance
-    dist_to_others = distance_map[v_id]
-    dist_to_others_list = sorted(dist_to_others, key=lambda k: dist_to_others[k])
-    ret = [
-        dist_to_others_list[i] for i in range(len(dist_to_others_list))
-        if dist_to_others[dist_to_others_list[i]] < max_distance
-    ]
-    ret2 = [
-        dist_to_others[dist_to_others_list[i]] for i in range(len(dist_to_others_list))
-        if dist_to_others[dist_to_others_list[i]] < max_distance
-    ]
-    return ret, ret2
+        info[kkk]["global_rewards"] = global_rewards
+
+
+def find_in_range(positions, distance):
+    """All ordered pairs (i, j), i != j, of positions closer than distance.
+
+    The positions are bucketed into a grid of distance sized cells, so only
+    pairs in the same or adjacent cells are measured instead of all n^2.
+
+    Returns:
+        i, j, pair_distance: sorted by i, then by distance, ties by j, i.e. for
+        each vehicle its neighbours from nearest to farthest.
+    """
+    n = len(positions)
+    cells = np.floor(positions / distance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = cells[:, 1].max() + 2
+    cell_ids = cells[:, 0] * width + cells[:, 1]
+    order = np.argsort(cell_ids, kind="stable")
+    sorted_ids = cell_ids[order]
+
+    i_ls, j_ls = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            query = cell_ids + dx * width + dy
+            lo = np.searchsorted(sorted_ids, query, side="left")
+            counts = np.searchsorted(sorted_ids, query, side="right") - lo
+            i = np.repeat(np.arange(n), counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            i_ls.append(i)
+            j_ls.append(order[np.repeat(lo, counts) + offsets])
+    i = np.concatenate(i_ls)
+    j = np.concatenate(j_ls)
+
+    delta = positions[i] - positions[j]
+    pair_distance = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+    keep = (i != j) & (pair_distance < distance)
+    i, j, pair_distance = i[keep], j[keep], pair_distance[keep]
+    sort = np.lexsort((j, pair_distance, i))
+    return i[sort], j[sort], pair_distance[sort]
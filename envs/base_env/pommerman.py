@@ -2,12 +2,14 @@ import numpy as np
 from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from gym.spaces import Dict as GymDict, Discrete, Box
 import pommerman
-from collections import defaultdict
-import queue
+from collections import defaultdict, deque
+import functools
+import heapq
 import random
 from pommerman.characters import Bomber
 from pommerman import constants
 from pommerman import utility
+from envs.base_env.reset_pool import ResetSnapshotPool
 
 
 """
@@ -16,6 +18,13 @@ from pommerman import utility
 "PommeTeamCompetition-v0",
 """
 
+# value -> constants.Item, building the Enum member is slow in the per square loops
+ITEM_BY_VALUE = {item.value: item for item in constants.Item}
+AGENT_VALUES = [constants.Item.Agent0.value, constants.Item.Agent1.value,
+                constants.Item.Agent2.value, constants.Item.Agent3.value]
+POWERUP_VALUES = [constants.Item.ExtraBomb.value, constants.Item.IncrRange.value,
+                  constants.Item.Kick.value]
+
 policy_mapping_dict = {
     "all_scenario": {
         "description": "pommerman all scenarios",
@@ -70,14 +79,22 @@ class RllibPommerman(MultiAgentEnv):
                 self.env.set_training_agent(agent.agent_id)
                 agent_num += 1
 
+        # boards and items of new games made ahead of time by a background thread
+        self.reset_pool = None
+        self.reset_pool_stats = env_config.get("reset_pool_stats", False)
+        if env_config.get("reset_pool_size", 0):
+            self.reset_pool = ResetSnapshotPool(self.env.make_initial_state, env_config["reset_pool_size"])
+            self.env.set_reset_pool(self.reset_pool)
+
         if "One" in map:  # for Map OneVsOne-v0
             map_size = 8
         else:
             map_size = 11
 
         self.action_space = self.env.action_space
+        # every entry is a small non negative integer (item ids, timers, positions)
         self.observation_space = GymDict({
-            "obs": Box(-100.0, 100.0, shape=(map_size * map_size * 5 + 4,)),
+            "obs": Box(0, 255, shape=(map_size * map_size * 5 + 4,), dtype=np.uint8),
         })
 
         self.num_agents = agent_num
@@ -137,7 +154,7 @@ class RllibPommerman(MultiAgentEnv):
                 obs_status = get_obs_dict(s_c_a)
                 states["agent_%d" % x] = obs_status
                 rewards["agent_%d" % x] = all_reward[self.neural_agent[x]]
-                infos["agent_%d" % x] = {}
+                infos["agent_%d" % x] = self.episode_info(done)
 
             else:
                 print("agent number must > 1")
@@ -146,7 +163,15 @@ class RllibPommerman(MultiAgentEnv):
         dones = {"__all__": done}
         return states, rewards, dones, infos
 
+    def episode_info(self, done):
+        # reset pool hit/miss counts in the infos of the last step of an episode
+        if done and self.reset_pool is not None and self.reset_pool_stats:
+            return self.reset_pool.stats()
+        return {}
+
     def close(self):
+        if self.reset_pool is not None:
+            self.reset_pool.close()
         self.env.close()
 
     def get_env_info(self):
@@ -359,45 +384,38 @@ class SimpleAgent(Bomber):
                 constants.Item.Fog, constants.Item.Rigid, constants.Item.Flames
             ]
 
-        def out_of_range(p_1, p_2):
-            '''Determines if two points are out of rang of each other'''
-            x_1, y_1 = p_1
-            x_2, y_2 = p_2
-            return abs(y_2 - y_1) + abs(x_2 - x_1) > depth
-
         items = defaultdict(list)
         dist = {}
         prev = {}
-        Q = queue.Queue()
+        Q = deque()
 
+        # squares within depth steps that are not excluded, in row major order
         my_x, my_y = my_position
-        for r in range(max(0, my_x - depth), min(len(board), my_x + depth)):
-            for c in range(max(0, my_y - depth), min(len(board), my_y + depth)):
-                position = (r, c)
-                if any([
-                    out_of_range(my_position, position),
-                    utility.position_in_items(board, position, exclude),
-                ]):
-                    continue
-
-                prev[position] = None
-                item = constants.Item(board[position])
-                items[item].append(position)
-
-                if position == my_position:
-                    Q.put(position)
-                    dist[position] = 0
-                else:
-                    dist[position] = np.inf
+        rows = np.arange(len(board))[:, None]
+        cols = np.arange(len(board))[None, :]
+        in_range = (rows >= my_x - depth) & (rows < my_x + depth) & \
+                   (cols >= my_y - depth) & (cols < my_y + depth) & \
+                   (np.abs(rows - my_x) + np.abs(cols - my_y) <= depth) & \
+                   ~np.isin(board, [item.value for item in exclude])
+        for position in map(tuple, np.argwhere(in_range).tolist()):
+            prev[position] = None
+            items[ITEM_BY_VALUE[board[position]]].append(position)
+
+            if position == my_position:
+                Q.append(position)
+                dist[position] = 0
+            else:
+                dist[position] = np.inf
 
         for bomb in bombs:
             if bomb['position'] == my_position:
                 items[constants.Item.Bomb].append(my_position)
 
-        while not Q.empty():
-            position = Q.get()
+        passable = passable_squares(board, enemies)
+        while Q:
+            position = Q.popleft()
 
-            if utility.position_is_passable(board, position, enemies):
+            if passable[position]:
                 x, y = position
                 val = dist[(x, y)] + 1
                 for row, col in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
@@ -408,7 +426,7 @@ class SimpleAgent(Bomber):
                     if val < dist[new_position]:
                         dist[new_position] = val
                         prev[new_position] = position
-                        Q.put(new_position)
+                        Q.append(new_position)
                     elif (val == dist[new_position] and random.random() < .5):
                         dist[new_position] = val
                         prev[new_position] = position
@@ -461,16 +479,15 @@ class SimpleAgent(Bomber):
     def _find_safe_directions(self, board, my_position, unsafe_directions,
                               bombs, enemies):
 
-        def is_stuck_direction(next_position, bomb_range, next_board, enemies):
+        def is_stuck_direction(next_position, bomb_range, next_passable):
             '''Helper function to do determine if the agents next move is possible.'''
-            Q = queue.PriorityQueue()
-            Q.put((0, next_position))
+            Q = [(0, next_position)]
             seen = set()
 
             next_x, next_y = next_position
             is_stuck = True
-            while not Q.empty():
-                dist, position = Q.get()
+            while Q:
+                dist, position = heapq.heappop(Q)
                 seen.add(position)
 
                 position_x, position_y = position
@@ -487,15 +504,14 @@ class SimpleAgent(Bomber):
                     if new_position in seen:
                         continue
 
-                    if not utility.position_on_board(next_board, new_position):
+                    if not utility.position_on_board(next_passable, new_position):
                         continue
 
-                    if not utility.position_is_passable(next_board,
-                                                        new_position, enemies):
+                    if not next_passable[new_position]:
                         continue
 
                     dist = abs(row + position_x - next_x) + abs(col + position_y - next_y)
-                    Q.put((dist, new_position))
+                    heapq.heappush(Q, (dist, new_position))
             return is_stuck
 
         # All directions are unsafe. Return a position that won't leave us locked.
@@ -504,6 +520,7 @@ class SimpleAgent(Bomber):
         if len(unsafe_directions) == 4:
             next_board = board.copy()
             next_board[my_position] = constants.Item.Bomb.value
+            next_passable = passable_squares(next_board, enemies)
 
             for direction, bomb_range in unsafe_directions.items():
                 next_position = utility.get_next_position(
@@ -513,8 +530,7 @@ class SimpleAgent(Bomber):
                         not utility.position_is_passable(next_board, next_position, enemies):
                     continue
 
-                if not is_stuck_direction(next_position, bomb_range, next_board,
-                                          enemies):
+                if not is_stuck_direction(next_position, bomb_range, next_passable):
                     # We found a direction that works. The .items provided
                     # a small bit of randomness. So let's go with this one.
                     return [direction]
@@ -685,17 +701,39 @@ class SimpleAgent(Bomber):
         return ret
 
 
+@functools.lru_cache(maxsize=32)
+def _passable_squares(board_bytes, shape, dtype, enemy_values):
+    board = np.frombuffer(board_bytes, dtype=dtype).reshape(shape)
+    passable = np.isin(board, AGENT_VALUES + POWERUP_VALUES + [constants.Item.Passage.value])
+    passable &= ~np.isin(board, enemy_values)
+    passable.flags.writeable = False
+    return passable
+
+
+def passable_squares(board, enemies):
+    """Boolean map of utility.position_is_passable over the whole board.
+
+    Cached per board and enemy set: in a step, the rule agents of a team and
+    their safety checks look at the same board and share one map.
+    """
+    board = np.ascontiguousarray(board)
+    return _passable_squares(board.tobytes(), board.shape, board.dtype.str,
+                             tuple(sorted(enemy.value for enemy in enemies)))
+
+
 def get_obs_dict(state_current_agent):
-    obs = np.stack((state_current_agent["board"],
-                    state_current_agent["bomb_blast_strength"],
-                    state_current_agent["bomb_life"],
-                    state_current_agent["bomb_moving_direction"],
-                    state_current_agent["flame_life"]),
-                   axis=2)
-    position = np.array(state_current_agent["position"])
-    blast_strength = np.array([state_current_agent["blast_strength"]])
-    can_kick = np.array([1]) if state_current_agent["can_kick"] else np.array([0])
-    status = np.concatenate([position, blast_strength, can_kick])
-
-    obs = np.concatenate((obs.flatten(), status), axis=0)
-    return {"obs": obs.astype(np.float32)}
+    # the five board maps are written channel last into the final uint8 vector,
+    # followed by position, blast strength and can kick
+    board = state_current_agent["board"]
+    map_size = board.shape[0] * board.shape[1]
+    obs = np.empty(map_size * 5 + 4, dtype=np.uint8)
+    maps = obs[:map_size * 5].reshape(board.shape + (5,))
+    maps[..., 0] = board
+    maps[..., 1] = state_current_agent["bomb_blast_strength"]
+    maps[..., 2] = state_current_agent["bomb_life"]
+    maps[..., 3] = state_current_agent["bomb_moving_direction"]
+    maps[..., 4] = state_current_agent["flame_life"]
+    obs[-4:-2] = state_current_agent["position"]
+    obs[-2] = state_current_agent["blast_strength"]
+    obs[-1] = 1 if state_current_agent["can_kick"] else 0
+    return {"obs": obs}
@@ -0,0 +1,55 @@
+import queue
+import threading
+
+
+class ResetSnapshotPool:
+    """Initial states of new episodes, made ahead of time by a background thread.
+
+    make_snapshot() is called on a daemon thread until `size` snapshots are waiting.
+    get() pops one (a hit), or makes one right away when the pool has run dry (a miss),
+    so a reset only pays for the generation when rollouts outpace the thread.
+
+    The snapshots come from the same global random generators as before, so with a pool
+    the sequence of initial states of a seeded run depends on the thread scheduling.
+    """
+
+    def __init__(self, make_snapshot, size):
+        self.make_snapshot = make_snapshot
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = queue.Queue(maxsize=size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        while not self._stopped.is_set():
+            snapshot = self.make_snapshot()
+            while not self._stopped.is_set():
+                try:
+                    self._snapshots.put(snapshot, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def get(self):
+        try:
+            snapshot = self._snapshots.get_nowait()
+            self.hits += 1
+        except queue.Empty:
+            snapshot = self.make_snapshot()
+            self.misses += 1
+        return snapshot
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "reset_pool_hits": self.hits,
+            "reset_pool_misses": self.misses,
+            "reset_pool_hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join(timeout=1)
@@ -1,6 +1,7 @@
 from rware import Warehouse, RewardType
 from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from gym.spaces import Dict as GymDict, Discrete, Box
+from envs.base_env.columnar import ColumnarObs, actions_to_list
 
 _sizes = {
     "tiny": (1, 3),
@@ -47,38 +48,31 @@ class RllibRWARE(MultiAgentEnv):
             dtype=self.env.observation_space[0].dtype)})
         self.num_agents = self.env.n_agents
         self.agents = ["agent_{}".format(i) for i in range(self.num_agents)]
+        self.columns = ColumnarObs(self.agents, self.observation_space["obs"].shape,
+                                   obs_dtype=self.observation_space["obs"].dtype)
         env_config["map_name"] = map_name
         env_config["map_size"] = map_size
         env_config["difficulty"] = difficulty
 
         self.env_config = env_config
 
-    def reset(self):
-        original_obs = self.env.reset()
-        obs = {}
-        for x in range(self.num_agents):
-            obs["agent_%d" % x] = {
-                "obs": original_obs[x]
-            }
+    def reset_columnar(self):
+        self.columns.obs[:] = self.env.reset()
+        return self.columns
 
-        return obs
+    def step_columnar(self, actions):
+        o, r, d, i = self.env.step(actions)
+        self.columns.obs[:] = o
+        return self.columns, r, any(d), i
+
+    def reset(self):
+        return self.reset_columnar().to_obs_dict()
 
     def step(self, action_dict):
-        actions = []
-        for key, value in sorted(action_dict.items()):
-            actions.append(value)
-        o, r, d, i = self.env.step(actions)
-        rewards = {}
-        obs = {}
-        infos = {}
-        done_flag = False
-        for pos, key in enumerate(sorted(action_dict.keys())):
-            infos[key] = i
-            rewards[key] = r[pos]
-            obs[key] = {
-                "obs": o[pos]
-            }
-            done_flag = d[pos] or done_flag
+        columns, r, done_flag, i = self.step_columnar(actions_to_list(action_dict, self.agents))
+        obs = columns.to_obs_dict()
+        rewards = {key: r[pos] for pos, key in enumerate(self.agents)}
+        infos = {key: i for key in self.agents}
         dones = {"__all__": done_flag}
         return obs, rewards, dones, infos
 
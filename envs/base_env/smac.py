@@ -2,6 +2,7 @@ from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from smac.env.starcraft2.starcraft2 import StarCraft2Env
 import numpy as np
 from gym.spaces import Dict as GymDict, Discrete, Box
+from envs.base_env.columnar import ColumnarObs, actions_to_list
 
 policy_mapping_dict = {
     "all_scenario": {
@@ -18,6 +19,8 @@ policy_mapping_dict = {
 class RLlibSMAC(MultiAgentEnv):
 
     def __init__(self, map_name):
+        # emit the global state once per step on agent_0 only, for grouped joint Q learning
+        self.share_global_state = False if isinstance(map_name, str) else map_name.get("share_global_state", False)
         map_name = map_name if isinstance(map_name, str) else map_name["map_name"]
         self.env = StarCraft2Env(map_name)
 
@@ -33,48 +36,33 @@ class RLlibSMAC(MultiAgentEnv):
             "action_mask": Box(-2.0, 2.0, shape=(n_actions,))
         })
         self.action_space = Discrete(n_actions)
+        self.columns = ColumnarObs(self.agents, (obs_shape,), state_shape=(state_shape,), n_actions=n_actions,
+                                    share_state=self.share_global_state)
 
-    def reset(self):
-        self.env.reset()
-        obs_smac = self.env.get_obs()
-        state_smac = self.env.get_state()
-        obs_dict = {}
-        for agent_index in range(self.num_agents):
-            obs_one_agent = obs_smac[agent_index]
-            state_one_agent = state_smac
-            action_mask_one_agent = np.array(self.env.get_avail_agent_actions(agent_index)).astype(np.float32)
-            agent_index = "agent_{}".format(agent_index)
-            obs_dict[agent_index] = {
-                "obs": obs_one_agent,
-                "state": state_one_agent,
-                "action_mask": action_mask_one_agent,
-            }
+    def _update_columns(self):
+        self.columns.obs[:] = self.env.get_obs()
+        self.columns.state[:] = self.env.get_state()
+        self.columns.action_mask[:] = self.env.get_avail_actions()
+        return self.columns
 
-        return obs_dict
-
-    def step(self, actions):
+    def reset_columnar(self):
+        self.env.reset()
+        return self._update_columns()
 
-        actions_ls = [int(actions[agent_id]) for agent_id in actions.keys()]
+    def step_columnar(self, actions):
+        reward, terminated, info = self.env.step(actions)
+        return self._update_columns(), reward, terminated, info
 
-        reward, terminated, info = self.env.step(actions_ls)
+    def reset(self):
+        return self.reset_columnar().to_obs_dict()
 
-        obs_smac = self.env.get_obs()
-        state_smac = self.env.get_state()
+    def step(self, actions):
+        actions_ls = [int(a) for a in actions_to_list(actions, self.agents)]
 
-        obs_dict = {}
-        reward_dict = {}
-        for agent_index in range(self.num_agents):
-            obs_one_agent = obs_smac[agent_index]
-            state_one_agent = state_smac
-            action_mask_one_agent = np.array(self.env.get_avail_agent_actions(agent_index)).astype(np.float32)
-            agent_index = "agent_{}".format(agent_index)
-            obs_dict[agent_index] = {
-                "obs": obs_one_agent,
-                "state": state_one_agent,
-                "action_mask": action_mask_one_agent
-            }
-            reward_dict[agent_index] = reward
+        columns, reward, terminated, info = self.step_columnar(actions_ls)
 
+        obs_dict = columns.to_obs_dict()
+        reward_dict = {agent_id: reward for agent_id in self.agents}
         dones = {"__all__": terminated}
 
         return obs_dict, reward_dict, dones, {}
@@ -85,7 +73,8 @@ class RLlibSMAC(MultiAgentEnv):
             "space_act": self.action_space,
             "num_agents": self.num_agents,
             "episode_limit": self.env.episode_limit,
-            "policy_mapping_info": policy_mapping_dict
+            "policy_mapping_info": policy_mapping_dict,
+            "share_global_state": self.share_global_state,
         }
         return env_info
 
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+from ray.rllib.env.multi_agent_env import MultiAgentEnv
+from gym.spaces import Dict as GymDict, Discrete, Box
+from envs.base_env.columnar import ColumnarObs, actions_to_list
+
+policy_mapping_dict = {
+    "all_scenario": {
+        "description": "synthetic benchmark env",
+        "team_prefix": ("agent_",),
+        "all_agents_one_policy": True,
+        "one_agent_one_policy": True,
+    },
+}
+
+
+class RllibSynthetic(MultiAgentEnv):
+    """Dependency free multi-agent env with configurable sizes, to load test the training stack.
+
+    Every step each agent observes random values plus a one-hot target action written into
+    the first action_dim entries of its obs, and gets reward 1 for picking the target
+    (minus the distance to the target for continuous actions), so learning can be checked too.
+    compute_cost_ms busy-waits in every step, standing in for the simulator.
+    """
+
+    def __init__(self, env_config):
+        self.env_config = env_config
+        self.num_agents = env_config["num_agents"]
+        self.agents = ["agent_{}".format(i) for i in range(self.num_agents)]
+        self.episode_limit = env_config["episode_limit"]
+        self.action_dim = env_config["action_dim"]
+        self.continuous_actions = env_config["continuous_actions"]
+        # no action mask for continuous actions
+        self.has_action_mask = env_config["action_mask"] and not self.continuous_actions
+        self.compute_cost = env_config["compute_cost_ms"] / 1000.0
+        self.rng = np.random.RandomState(env_config.get("seed"))
+
+        image_size = env_config["image_size"]
+        state_dim = env_config["state_dim"]
+        if image_size:
+            obs_shape = (image_size, image_size, env_config["obs_dim"])
+            state_shape = (image_size, image_size, state_dim) if state_dim else None
+        else:
+            obs_shape = (env_config["obs_dim"],)
+            state_shape = (state_dim,) if state_dim else None
+        if int(np.prod(obs_shape)) < self.action_dim:
+            raise ValueError("synthetic obs of size {} can not hold the one-hot target of {} actions".format(
+                int(np.prod(obs_shape)), self.action_dim))
+
+        if self.continuous_actions:
+            self.action_space = Box(low=-1.0, high=1.0, shape=(self.action_dim,), dtype=np.float32)
+        else:
+            self.action_space = Discrete(self.action_dim)
+        spaces = {"obs": Box(-1.0, 1.0, shape=obs_shape, dtype=np.float32)}
+        if state_shape is not None:
+            spaces["state"] = Box(-1.0, 1.0, shape=state_shape, dtype=np.float32)
+        if self.has_action_mask:
+            spaces["action_mask"] = Box(0.0, 1.0, shape=(self.action_dim,), dtype=np.float32)
+        self.observation_space = GymDict(spaces)
+
+        self.columns = ColumnarObs(self.agents, obs_shape, state_shape=state_shape,
+                                   n_actions=self.action_dim if self.has_action_mask else None)
+        self.target = np.zeros(self.num_agents, dtype=np.int64)
+        self.step_count = 0
+
+    def _update_columns(self):
+        columns = self.columns
+        columns.obs[:] = self.rng.uniform(-1.0, 1.0, size=columns.obs.shape)
+        if columns.state is not None:
+            columns.state[:] = self.rng.uniform(-1.0, 1.0, size=columns.state.shape)
+
+        self.target = self.rng.randint(self.action_dim, size=self.num_agents)
+        flat_obs = columns.obs.reshape(self.num_agents, -1)
+        flat_obs[:, :self.action_dim] = 0.0
+        flat_obs[np.arange(self.num_agents), self.target] = 1.0
+
+        if columns.action_mask is not None:
+            # the target is always available
+            columns.action_mask[:] = self.rng.rand(self.num_agents, self.action_dim) < 0.5
+            columns.action_mask[np.arange(self.num_agents), self.target] = 1.0
+        return columns
+
+    def _rewards(self, actions):
+        if self.continuous_actions:
+            target = np.eye(self.action_dim)[self.target] * 2.0 - 1.0
+            return -np.abs(np.asarray(actions) - target).mean(axis=1)
+        return (np.asarray(actions) == self.target).astype(np.float32)
+
+    def _compute(self):
+        deadline = time.perf_counter() + self.compute_cost
+        while time.perf_counter() < deadline:
+            pass
+
+    def reset_columnar(self):
+        self.step_count = 0
+        return self._update_columns()
+
+    def step_columnar(self, actions):
+        self._compute()
+        reward = self._rewards(actions)
+        self.step_count += 1
+        return self._update_columns(), reward, self.step_count >= self.episode_limit, {}
+
+    def reset(self):
+        return self.reset_columnar().to_obs_dict()
+
+    def step(self, action_dict):
+        columns, r, done, i = self.step_columnar(actions_to_list(action_dict, self.agents))
+        obs = columns.to_obs_dict()
+        rewards = {key: r[pos] for pos, key in enumerate(self.agents)}
+        infos = {key: i for key in self.agents}
+        dones = {"__all__": done}
+        return obs, rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def get_env_info(self):
+        env_info = {
+            "space_obs": self.observation_space,
+            "space_act": self.action_space,
+            "num_agents": self.num_agents,
+            "episode_limit": self.episode_limit,
+            "policy_mapping_info": policy_mapping_dict,
+            # the obs keys depend on the env_args, the model flags follow them
+            "mask_flag": self.has_action_mask,
+            "global_state_flag": "state" in self.observation_space.spaces,
+        }
+        return env_info
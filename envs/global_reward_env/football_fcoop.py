@@ -1,22 +1,14 @@
 from envs.base_env.football import RllibGFootball
+from envs.base_env.columnar import actions_to_list
 
 
 class RllibGFootball_FCOOP(RllibGFootball):
 
     def step(self, action_dict):
-        actions = []
-        for key, value in sorted(action_dict.items()):
-            actions.append(value)
-        o, r, d, i = self.env.step(actions)
+        columns, r, d, i = self.step_columnar(actions_to_list(action_dict, self.agents))
         r = sum(r)
-        rewards = {}
-        obs = {}
-        infos = {}
-        for pos, key in enumerate(sorted(action_dict.keys())):
-            infos[key] = i
-            rewards[key] = r
-            obs[key] = {
-                "obs": o[pos]
-            }
+        obs = columns.to_obs_dict()
+        rewards = {key: r for key in self.agents}
+        infos = {key: i for key in self.agents}
         dones = {"__all__": d}
         return obs, rewards, dones, infos
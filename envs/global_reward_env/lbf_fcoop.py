@@ -1,4 +1,5 @@
 from envs.base_env.lbf import RllibLBF
+from envs.base_env.columnar import actions_to_list
 
 
 class RllibLBF_FCOOP(RllibLBF):
@@ -8,21 +9,11 @@ class RllibLBF_FCOOP(RllibLBF):
         super().__init__(env_config)
 
     def step(self, action_dict):
-        actions = []
-        for key, value in sorted(action_dict.items()):
-            actions.append(value)
-        o, r, d, i = self.env.step(tuple(actions))
+        columns, r, done_flag, i = self.step_columnar(actions_to_list(action_dict, self.agents))
+        # cooperative need global reward
         r = sum(r)
-        rewards = {}
-        obs = {}
-        infos = {}
-        done_flag = False
-        for pos, key in enumerate(sorted(action_dict.keys())):
-            infos[key] = i
-            rewards[key] = r
-            obs[key] = {
-                "obs": o[pos]
-            }
-            done_flag = d[pos] or done_flag
+        obs = columns.to_obs_dict()
+        rewards = {key: r for key in self.agents}
+        infos = {key: i for key in self.agents}
         dones = {"__all__": done_flag}
         return obs, rewards, dones, infos
@@ -52,7 +52,7 @@ class RllibPommerman_FCOOP(RllibPommerman):
                 obs_status = get_obs_dict(s_c_a)
                 states["agent_%d" % x] = obs_status
                 rewards["agent_%d" % x] = r
-                infos["agent_%d" % x] = {}
+                infos["agent_%d" % x] = self.episode_info(done)
 
             else:
                 print("agent number must > 1")
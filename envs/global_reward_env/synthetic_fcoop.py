@@ -0,0 +1,15 @@
+from envs.base_env.synthetic import RllibSynthetic
+from envs.base_env.columnar import actions_to_list
+
+
+class RllibSynthetic_FCOOP(RllibSynthetic):
+
+    def step(self, action_dict):
+        columns, r, done, i = self.step_columnar(actions_to_list(action_dict, self.agents))
+        # cooperative need global reward
+        r = sum(r)
+        obs = columns.to_obs_dict()
+        rewards = {key: r for key in self.agents}
+        infos = {key: i for key in self.agents}
+        dones = {"__all__": done}
+        return obs, rewards, dones, infos
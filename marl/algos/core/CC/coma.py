@@ -11,7 +11,8 @@ from ray.rllib.evaluation.postprocessing import compute_advantages, Postprocessi
 from ray.rllib.policy.sample_batch import SampleBatch
 from ray.rllib.utils.torch_ops import convert_to_torch_tensor
 from typing import Dict, Tuple
-from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing
+from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing, \
+    central_critic_state
 
 torch, nn = try_import_torch()
 
@@ -27,7 +28,7 @@ def central_critic_coma_loss(policy: Policy, model: ModelV2,
     logits, _ = model.from_batch(train_batch)
     opp_action_in_cc = policy.config["model"]["custom_model_config"]["opp_action_in_cc"]
     values = model.central_value_function(convert_to_torch_tensor(
-        train_batch["state"], policy.device),
+        central_critic_state(train_batch), policy.device),
         convert_to_torch_tensor(
             train_batch["opponent_actions"], policy.device) if opp_action_in_cc else None)
     pi = torch.nn.functional.softmax(logits, dim=-1)
@@ -21,11 +21,13 @@ from ray.rllib.agents.ppo.ppo_torch_policy import PPOTorchPolicy, ValueNetworkMi
 from ray.rllib.utils.torch_ops import apply_grad_clipping
 from ray.rllib.policy.torch_policy import LearningRateSchedule, EntropyCoeffSchedule
 from marl.algos.utils.setup_utils import setup_torch_mixins, get_agent_num
+from marl.algos.utils.valuenorm import setup_value_normalizer
 from marl.algos.utils.get_hetero_info import (
     get_global_name,
+    get_global_column,
     STATE,
+    central_critic_state,
     add_all_agents_gae,
-    value_normalizer,
 )
 from ray.rllib.examples.centralized_critic import CentralizedValueMixin
 
@@ -93,7 +95,7 @@ def happo_surrogate_loss(
     global_actions = train_batch[get_global_name(SampleBatch.ACTIONS)]
 
     model.value_function = lambda: policy.model.central_value_function(
-        train_batch[STATE],
+        central_critic_state(train_batch, STATE),
         global_actions if opp_action_in_cc else None
     )
 
@@ -122,11 +124,11 @@ def happo_surrogate_loss(
                 old_action_log_dist = train_batch[SampleBatch.ACTION_LOGP]
                 actions = train_batch[SampleBatch.ACTIONS]
             else:
-                current_action_logits = train_batch[get_global_name(SampleBatch.ACTION_DIST_INPUTS, agent_id)]
+                current_action_logits = get_global_column(train_batch, SampleBatch.ACTION_DIST_INPUTS, agent_id)
                 current_action_dist = dist_class(current_action_logits, None)
 
-                old_action_log_dist = train_batch[get_global_name(SampleBatch.ACTION_LOGP, agent_id)]
-                actions = train_batch[get_global_name(SampleBatch.ACTIONS, agent_id)]
+                old_action_log_dist = get_global_column(train_batch, SampleBatch.ACTION_LOGP, agent_id)
+                actions = get_global_column(train_batch, SampleBatch.ACTIONS, agent_id)
 
             importance_sampling = torch.exp(current_action_dist.logp(actions) - old_action_log_dist)
 
@@ -161,6 +163,7 @@ def happo_surrogate_loss(
 
     # Compute a value function loss.
     # if policy.model.model_config['custom_model_config']['normal_value']:
+    value_normalizer = model.value_normalizer
     value_normalizer.update(train_batch[Postprocessing.VALUE_TARGETS])
     train_batch[Postprocessing.VALUE_TARGETS] = value_normalizer.normalize(train_batch[Postprocessing.VALUE_TARGETS])
 
@@ -224,6 +227,7 @@ HAPPOTorchPolicy = PPOTorchPolicy.with_updates(
         postprocess_fn=add_all_agents_gae,
         loss_fn=happo_surrogate_loss,
         before_init=setup_torch_mixins,
+        before_loss_init=setup_value_normalizer,
         extra_grad_process_fn=apply_grad_clipping,
         mixins=[
             LearningRateSchedule, EntropyCoeffSchedule, KLCoeffMixin,
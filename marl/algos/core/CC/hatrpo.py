@@ -5,7 +5,6 @@ __data__: May-15
 """
 
 import logging
-import re
 from typing import Dict, List, Type, Union, Tuple
 from ray.rllib.models.torch.torch_action_dist import TorchDistributionWrapper
 from ray.rllib.policy.policy import Policy
@@ -26,11 +25,12 @@ from marl.algos.utils.setup_utils import setup_torch_mixins, get_agent_num
 from marl.algos.utils.get_hetero_info import (
     get_global_name,
     contain_global_obs,
+    contain_opponent_policies,
     hatrpo_post_process,
-    value_normalizer,
     MODEL,
     global_state_name,
     STATE,
+    central_critic_state,
     TRAINING,
     state_name,
 )
@@ -103,7 +103,7 @@ def hatrpo_loss_fn(
     if contain_global_obs(train_batch):
         opp_action_in_cc = policy.config["model"]["custom_model_config"]["opp_action_in_cc"]
         model.value_function = lambda: policy.model.central_value_function(
-            train_batch[STATE],
+            central_critic_state(train_batch, STATE),
             train_batch[get_global_name(SampleBatch.ACTIONS)]
             if opp_action_in_cc else None
         )
@@ -116,8 +116,8 @@ def hatrpo_loss_fn(
 
     # Compute a value function loss.
     # if policy.model.model_config['custom_model_config']['normal_value']:
-    # value_normalizer.update(train_batch[Postprocessing.VALUE_TARGETS])
-    # train_batch[Postprocessing.VALUE_TARGETS] = value_normalizer.normalize(train_batch[Postprocessing.VALUE_TARGETS])
+    # model.value_normalizer.update(train_batch[Postprocessing.VALUE_TARGETS])
+    # train_batch[Postprocessing.VALUE_TARGETS] = model.value_normalizer.normalize(train_batch[Postprocessing.VALUE_TARGETS])
 
     if policy.config["use_critic"]:
         prev_value_fn_out = train_batch[SampleBatch.VF_PREDS] #
@@ -149,18 +149,9 @@ def hatrpo_loss_fn(
 
     policy.trpo_updator = trust_region_updator
 
-    agent_model_pat = get_global_name(MODEL, '(\d+)')
-    matched_keys = [re.findall(agent_model_pat, key) for key in train_batch]
+    agents_num = get_agent_num(policy)
 
-    collected_agent_ids = [int(m[0]) for m in matched_keys if m]
-
-    contain_opponent_info = all(
-        len(train_batch[get_global_name(MODEL, i)]) > 0 and train_batch[get_global_name(MODEL, i)][0] > 0
-        for i in collected_agent_ids
-    )
-
-    if contain_opponent_info:
-        agents_num = get_agent_num(policy)
+    if contain_opponent_policies(train_batch, agents_num):
 
         policy.group_trpo_updator = HATRPOUpdator(
             agents_num=agents_num, dist_class=dist_class,
@@ -1,7 +1,8 @@
 from ray.rllib.utils.framework import try_import_torch
 from ray.rllib.agents.a3c.a3c_torch_policy import A3CTorchPolicy, actor_critic_loss
 from ray.rllib.agents.a3c.a2c import A2C_DEFAULT_CONFIG as A2C_CONFIG, A2CTrainer
-from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing
+from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing, \
+    central_critic_state
 
 torch, nn = try_import_torch()
 
@@ -17,7 +18,7 @@ def central_critic_a2c_loss(policy, model, dist_class, train_batch):
 
     vf_saved = model.value_function
     opp_action_in_cc = policy.config["model"]["custom_model_config"]["opp_action_in_cc"]
-    model.value_function = lambda: policy.model.central_value_function(train_batch["state"],
+    model.value_function = lambda: policy.model.central_value_function(central_critic_state(train_batch),
                                                                        train_batch[
                                                                            "opponent_actions"] if opp_action_in_cc else None)
 
@@ -2,7 +2,8 @@ from ray.rllib.utils.framework import try_import_torch
 from ray.rllib.agents.ppo.ppo_torch_policy import PPOTorchPolicy, ValueNetworkMixin, KLCoeffMixin, ppo_surrogate_loss
 from ray.rllib.agents.ppo.ppo import PPOTrainer, DEFAULT_CONFIG as PPO_CONFIG
 from ray.rllib.policy.torch_policy import LearningRateSchedule, EntropyCoeffSchedule
-from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing
+from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing, \
+    central_critic_state
 
 torch, nn = try_import_torch()
 
@@ -27,7 +28,7 @@ def central_critic_ppo_loss(policy, model, dist_class, train_batch):
 
     vf_saved = model.value_function
     opp_action_in_cc = policy.config["model"]["custom_model_config"]["opp_action_in_cc"]
-    model.value_function = lambda: policy.model.central_value_function(train_batch["state"],
+    model.value_function = lambda: policy.model.central_value_function(central_critic_state(train_batch),
                                                                        train_batch[
                                                                            "opponent_actions"] if opp_action_in_cc else None)
 
@@ -2,7 +2,8 @@ from ray.rllib.utils.framework import try_import_torch
 from ray.rllib.agents.ppo.ppo_torch_policy import PPOTorchPolicy, ValueNetworkMixin, KLCoeffMixin, ppo_surrogate_loss
 from ray.rllib.agents.ppo.ppo import PPOTrainer, DEFAULT_CONFIG as PPO_CONFIG
 from ray.rllib.policy.torch_policy import LearningRateSchedule, EntropyCoeffSchedule
-from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing
+from marl.algos.utils.postprocessing import CentralizedValueMixin, centralized_critic_postprocessing, \
+    central_critic_state
 from marl.algos.utils.trust_regions import TrustRegionUpdator
 from ray.rllib.policy.policy import Policy
 from ray.rllib.models.modelv2 import ModelV2
@@ -42,7 +43,7 @@ def centre_critic_trpo_loss_fn(
 
     vf_saved = model.value_function
     opp_action_in_cc = policy.config["model"]["custom_model_config"]["opp_action_in_cc"]
-    model.value_function = lambda: policy.model.central_value_function(train_batch["state"],
+    model.value_function = lambda: policy.model.central_value_function(central_critic_state(train_batch),
                                                                        train_batch[
                                                                            "opponent_actions"] if opp_action_in_cc else None)
 
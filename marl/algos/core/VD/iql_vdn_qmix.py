@@ -16,7 +16,7 @@ from ray.rllib.utils.typing import TrainerConfigDict
 from ray.util.iter import LocalIterator
 from ray.rllib.models.catalog import ModelCatalog
 from ray.rllib.policy.sample_batch import SampleBatch
-from ray.rllib.agents.qmix.qmix_policy import _mac, _validate, _unroll_mac
+from ray.rllib.agents.qmix.qmix_policy import _mac, _unroll_mac
 from ray.rllib.agents.dqn.dqn import GenericOffPolicyTrainer
 from ray.rllib.agents.qmix.qmix import DEFAULT_CONFIG
 from ray.rllib.policy.rnn_sequencing import chop_into_sequences
@@ -24,6 +24,39 @@ from ray.rllib.policy.rnn_sequencing import chop_into_sequences
 from marl.models.zoo.jointQ_rnn import JointQ_RNN
 from marl.models.zoo.mixers import QMixer, VDNMixer
 from marl.algos.utils.episode_execution_plan import episode_execution_plan
+from envs.base_env.columnar import drop_state
+
+
+def _validate(obs_space, action_space):
+    # same checks as rllib qmix, except that with share_global_state only the
+    # first group member carries the global state, so "state" is not compared
+    if not hasattr(obs_space, "original_space") or \
+            not isinstance(obs_space.original_space, Gym_Tuple):
+        raise ValueError("Obs space must be a Tuple, got {}. Use ".format(
+            obs_space) + "MultiAgentEnv.with_agent_groups() to group related "
+                         "agents for QMix.")
+    if not isinstance(action_space, Gym_Tuple):
+        raise ValueError(
+            "Action space must be a Tuple, got {}. ".format(action_space) +
+            "Use MultiAgentEnv.with_agent_groups() to group related "
+            "agents for QMix.")
+    if not isinstance(action_space.spaces[0], Discrete):
+        raise ValueError(
+            "QMix requires a discrete action space, got {}".format(
+                action_space.spaces[0]))
+    member_spaces = [
+        drop_state(s) if isinstance(s, Gym_Dict) else s
+        for s in obs_space.original_space.spaces
+    ]
+    if len({str(x) for x in member_spaces}) > 1:
+        raise ValueError(
+            "Implementation limitation: observations of grouped agents "
+            "must be homogeneous, got {}".format(
+                obs_space.original_space.spaces))
+    if len({str(x) for x in action_space.spaces}) > 1:
+        raise ValueError(
+            "Implementation limitation: action space of grouped agents "
+            "must be homogeneous, got {}".format(action_space.spaces))
 
 
 # original _unroll_mac for next observation is different from Pymarl.
@@ -508,6 +541,7 @@ class JointQPolicy(Policy):
                 dtype=np.float32)
 
         if self.has_env_global_state:
+            # the first member always carries the state, also in share_global_state mode
             state = np.concatenate(tree.flatten(unpacked[0]["state"]), 1)
         else:
             state = None
@@ -13,8 +13,9 @@ from marl.models.base.base_rnn import Base_RNN
 from marl.models.zoo.ddpg_rnn import DDPG_RNN
 from envs.base_env import ENV_REGISTRY
 from marl.algos.scripts import POlICY_REGISTRY
-from marl.common import _get_model_config, recursive_dict_update
-from tabulate import tabulate
+from marl.algos.utils.env_info_manifest import get_env_info
+from envs.base_env.env_pool import env_pool_creator
+from marl.common import _get_model_config, recursive_dict_update, get_env_class
 
 tf1, tf, tfv = try_import_tf()
 torch, nn = try_import_torch()
@@ -27,37 +28,29 @@ def run_il(config_dict):
     ### environment ###
     ###################
 
-    env_reg_ls = []
-    check_current_used_env_flag = False
-    for env_n in ENV_REGISTRY.keys():
-        if isinstance(ENV_REGISTRY[env_n], str):  # error
-            info = [env_n, "Error", ENV_REGISTRY[env_n], "envs/base_env/config/{}.yaml".format(env_n),
-                    "envs/base_env/{}.py".format(env_n)]
-            env_reg_ls.append(info)
-        else:
-            info = [env_n, "Ready", "Null", "envs/base_env/config/{}.yaml".format(env_n),
-                    "envs/base_env/{}.py".format(env_n)]
-            env_reg_ls.append(info)
-            if env_n == config_dict["env"]:
-                check_current_used_env_flag = True
-
-    print(tabulate(env_reg_ls,
-                   headers=['Env_Name', 'Check_Status', "Error_Log", "Config_File_Location", "Env_File_Location"],
-                   tablefmt='grid'))
-
-    if not check_current_used_env_flag:
-        raise ValueError(
-            "environment \"{}\" not installed properly or not registered yet, please see the Error_Log below".format(
-                config_dict["env"]))
-
-    register_env(config_dict["env"] + "_" + config_dict["env_args"]["map_name"],
-                 lambda _: ENV_REGISTRY[config_dict["env"]](config_dict["env_args"]))
+    env_class = get_env_class(ENV_REGISTRY, config_dict["env"])
+
+    # K copies of the same map per rollout worker, stepped in lockstep by rllib vector env,
+    # so that one compute_actions call of a policy runs on K * num_agents rows
+    num_envs_per_worker = config_dict["env_args"].pop("num_envs_per_worker", 1)
+    if num_envs_per_worker > 1 and config_dict.get("env_pool_size", 0):
+        # the env pool is already a vector env of env_pool_size copies
+        raise ValueError("set either env_args.num_envs_per_worker or env_pool_size, not both")
 
     map_name = config_dict["env_args"]["map_name"]
-    test_env = ENV_REGISTRY[config_dict["env"]](config_dict["env_args"])
-    env_info_dict = test_env.get_env_info()
-    agent_name_ls = test_env.agents
-    test_env.close()
+    agent_name_ls, env_info_dict = get_env_info(env_class, config_dict)
+    # envs whose obs keys depend on their env_args report the model flags matching them
+    for flag in ("mask_flag", "global_state_flag"):
+        if flag in env_info_dict:
+            config_dict[flag] = env_info_dict[flag]
+    if env_info_dict.get("share_global_state", False):
+        # per agent policies need the state in every agent's observation
+        raise ValueError("share_global_state only works with grouped joint Q learning (qmix, vdn, iql) "
+                         "and the centralized critic algorithms of run_cc except maddpg")
+
+    env_reg_name = config_dict["env"] + "_" + config_dict["env_args"]["map_name"]
+    register_env(env_reg_name,
+                 env_pool_creator(lambda: env_class(config_dict["env_args"]), config_dict))
 
     #############
     ### model ###
@@ -137,10 +130,11 @@ def run_il(config_dict):
 
     common_config = {
         # "seed": config_dict["seed"],
-        "env": config_dict["env"] + "_" + config_dict["env_args"]["map_name"],
+        "env": env_reg_name,
         "num_gpus_per_worker": config_dict["num_gpus_per_worker"],
         "num_gpus": config_dict["num_gpus"],
         "num_workers": config_dict["num_workers"],
+        "num_envs_per_worker": num_envs_per_worker,
         "multiagent": {
             "policies": policies,
             "policy_mapping_fn": policy_mapping_fn
@@ -10,8 +10,10 @@ from marl.models.zoo.vd_rnn import VD_RNN
 from marl.models.zoo.ddpg_rnn import DDPG_RNN
 from marl.algos.scripts import POlICY_REGISTRY
 from envs.global_reward_env import COOP_ENV_REGISTRY as ENV_REGISTRY
-from marl.common import _get_model_config, recursive_dict_update
-from tabulate import tabulate
+from marl.algos.utils.env_info_manifest import get_env_info
+from envs.base_env.env_pool import env_pool_creator
+from envs.base_env.columnar import drop_state
+from marl.common import _get_model_config, recursive_dict_update, get_env_class
 
 tf1, tf, tfv = try_import_tf()
 torch, nn = try_import_torch()
@@ -24,34 +26,24 @@ def run_vd(config_dict):
     ### environment ###
     ###################
 
-    env_reg_ls = []
-    check_current_used_env_flag = False
-    for env_n in ENV_REGISTRY.keys():
-        if isinstance(ENV_REGISTRY[env_n], str):  # error
-            info = [env_n, "Error", ENV_REGISTRY[env_n], "envs/base_env/config/{}.yaml".format(env_n),
-                    "envs/global_reward_env/{}.py".format(env_n)]
-            env_reg_ls.append(info)
-        else:
-            info = [env_n, "Ready", "Null", "envs/base_env/config/{}.yaml".format(env_n),
-                    "envs/global_reward_env/{}.py".format(env_n)]
-            env_reg_ls.append(info)
-            if env_n == config_dict["env"]:
-                check_current_used_env_flag = True
-
-    print(tabulate(env_reg_ls,
-                   headers=['Env_Name', 'Check_Status', "Error_Log", "Config_File_Location", "Env_File_Location"],
-                   tablefmt='grid'))
+    env_class = get_env_class(ENV_REGISTRY, config_dict["env"])
 
-    if not check_current_used_env_flag:
-        raise ValueError(
-            "environment \"{}\" not installed properly or not registered yet, please see the Error_Log below".format(
-                config_dict["env"]))
+    # K copies of the same map per rollout worker, stepped in lockstep by rllib vector env,
+    # so that one compute_actions call of a policy runs on K * num_agents rows
+    num_envs_per_worker = config_dict["env_args"].pop("num_envs_per_worker", 1)
+    if num_envs_per_worker > 1 and config_dict.get("env_pool_size", 0):
+        # the env pool is already a vector env of env_pool_size copies
+        raise ValueError("set either env_args.num_envs_per_worker or env_pool_size, not both")
 
     map_name = config_dict["env_args"]["map_name"]
-    test_env = ENV_REGISTRY[config_dict["env"]](config_dict["env_args"])
-    agent_name_ls = test_env.agents
-    env_info_dict = test_env.get_env_info()
-    test_env.close()
+    agent_name_ls, env_info_dict = get_env_info(env_class, config_dict)
+    # envs whose obs keys depend on their env_args report the model flags matching them
+    for flag in ("mask_flag", "global_state_flag"):
+        if flag in env_info_dict:
+            config_dict[flag] = env_info_dict[flag]
+    if env_info_dict.get("team_batch", False):
+        # a team agent has no per unit batches for a centralized critic / value decomposition
+        raise ValueError("team_batch only works with independent learning (run_il)")
 
     # grab the policy mapping info here to use in grouping environment
     policy_mapping_info = env_info_dict["policy_mapping_info"]
@@ -71,7 +63,11 @@ def run_vd(config_dict):
         n_agents = env_info_dict["num_agents"]
 
         if config_dict["share_policy"] == "all":
-            obs_space = Tuple([GymDict(space_obs)] * n_agents)
+            if env_info_dict.get("share_global_state", False):
+                # only the first member carries the global state, so the replay buffer keeps it once per step
+                obs_space = Tuple([GymDict(space_obs)] + [drop_state(GymDict(space_obs))] * (n_agents - 1))
+            else:
+                obs_space = Tuple([GymDict(space_obs)] * n_agents)
             act_space = Tuple([space_act] * n_agents)
             if not policy_mapping_info["all_agents_one_policy"]:
                 raise ValueError("in {}, policy can not be shared".format(map_name))
@@ -99,12 +95,15 @@ def run_vd(config_dict):
 
         env_reg_name = "grouped_" + config_dict["env"] + "_" + config_dict["env_args"]["map_name"]
         register_env(env_reg_name,
-                     lambda _: ENV_REGISTRY[config_dict["env"]](config_dict["env_args"]).with_agent_groups(
-                         grouping, obs_space=obs_space, act_space=act_space))
+                     env_pool_creator(lambda: env_class(config_dict["env_args"]).with_agent_groups(
+                         grouping, obs_space=obs_space, act_space=act_space), config_dict))
     else:
+        if env_info_dict.get("share_global_state", False):
+            raise ValueError("share_global_state only works with grouped joint Q learning (qmix, vdn, iql) "
+                             "and the centralized critic algorithms of run_cc except maddpg")
         env_reg_name = config_dict["env"] + "_" + config_dict["env_args"]["map_name"]
         register_env(env_reg_name,
-                     lambda _: ENV_REGISTRY[config_dict["env"]](config_dict["env_args"]))
+                     env_pool_creator(lambda: env_class(config_dict["env_args"]), config_dict))
 
     #############
     ### model ###
@@ -193,6 +192,7 @@ def run_vd(config_dict):
         "num_gpus_per_worker": config_dict["num_gpus_per_worker"],
         "num_gpus": config_dict["num_gpus"],
         "num_workers": config_dict["num_workers"],
+        "num_envs_per_worker": num_envs_per_worker,
         "multiagent": {
             "policies": policies,
             "policy_mapping_fn": policy_mapping_fn
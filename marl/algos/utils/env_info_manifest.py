@@ -0,0 +1,132 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+from copy import deepcopy
+
+try:
+    import importlib.metadata as importlib_metadata
+except ImportError:  # python < 3.8
+    importlib_metadata = None
+
+
+def _source_mtime(obj):
+    try:
+        return os.path.getmtime(inspect.getsourcefile(obj))
+    except (TypeError, OSError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _distributions():
+    # top level package -> distributions providing it, on python >= 3.10
+    if not hasattr(importlib_metadata, "packages_distributions"):
+        return {}
+    return importlib_metadata.packages_distributions()
+
+
+def _package_version(package, modules):
+    # installed version of a top level package, the source mtimes of the imported modules
+    # for unversioned ones (e.g. a MaMujoco checkout on the python path)
+    version = getattr(sys.modules.get(package), "__version__", None)
+    if version is None and importlib_metadata is not None:
+        for dist in _distributions().get(package, [package]):
+            try:
+                version = importlib_metadata.version(dist)
+                break
+            except Exception:
+                pass
+    if version is not None:
+        return str(version)
+    return {name: _source_mtime(sys.modules.get(name)) for name in sorted(modules)}
+
+
+def _simulator_modules(env_class, classes):
+    # modules that the modules of the env classes import from, outside the env's own package
+    # and the standard library: smac, pettingzoo, multiagent_mujoco, gfootball, gym, ray, ...
+    skip = {env_class.__module__.split(".")[0], "builtins"}
+    skip.update(sys.builtin_module_names)
+    skip.update(getattr(sys, "stdlib_module_names", ()))
+    packages = {}
+    for cls in classes:
+        module = sys.modules.get(cls.__module__)
+        for value in vars(module).values() if module is not None else ():
+            name = value.__name__ if inspect.ismodule(value) else getattr(value, "__module__", None)
+            if isinstance(name, str) and name.split(".")[0] not in skip:
+                packages.setdefault(name.split(".")[0], set()).add(name)
+    return packages
+
+
+def _manifest_key(env_class, config_dict):
+    # anything that can change the spaces / agents of the env is part of the key: the sources of
+    # the env class and its bases, and the versions of the simulator packages they import
+    classes = [cls for cls in inspect.getmro(env_class) if cls.__module__ != "builtins"]
+
+    key_info = {
+        "env": config_dict["env"],
+        "map_name": config_dict["env_args"]["map_name"],
+        "env_args": config_dict["env_args"],
+        "env_class": "{}.{}".format(env_class.__module__, env_class.__qualname__),
+        "source_mtimes": {"{}.{}".format(cls.__module__, cls.__qualname__): _source_mtime(cls) for cls in classes},
+        "packages": {package: _package_version(package, modules)
+                     for package, modules in _simulator_modules(env_class, classes).items()},
+    }
+    key_str = json.dumps(key_info, sort_keys=True, default=str)
+    return hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+
+
+def _manifest_path(cache_dir, env_class, config_dict):
+    return os.path.join(
+        os.path.expanduser(cache_dir),
+        "{}_{}_{}.pkl".format(config_dict["env"], config_dict["env_args"]["map_name"],
+                              _manifest_key(env_class, config_dict)[:16]))
+
+
+def _build_env_info(env_class, config_dict):
+    # env wrappers pop/restore keys of env_args, do not let them touch the real config
+    test_env = env_class(deepcopy(config_dict["env_args"]))
+    agent_name_ls = test_env.agents
+    env_info_dict = test_env.get_env_info()
+    test_env.close()
+    return agent_name_ls, env_info_dict
+
+
+def get_env_info(env_class, config_dict):
+    """Return (agent_name_ls, env_info_dict) of the env, read from the on-disk manifest if possible.
+
+    Building a throwaway env just to read its spaces costs seconds for SMAC/MaMujoco.
+    The result is stored under config_dict["env_info_cache"] keyed by env, map, env_args,
+    the source files of the env class and its base classes, and the versions of the
+    packages their modules import (the simulators), so a change of these rebuilds the
+    manifest. Changes the key can not see, e.g. a simulator reading map files from disk,
+    need a manual delete of the cache directory.
+    Set env_info_cache to "" to always build the env.
+    """
+    cache_dir = config_dict.get("env_info_cache", "")
+    if not cache_dir:
+        return _build_env_info(env_class, config_dict)
+
+    path = _manifest_path(cache_dir, env_class, config_dict)
+    if os.path.isfile(path):
+        try:
+            with open(path, "rb") as f:
+                manifest = pickle.load(f)
+            return manifest["agents"], manifest["env_info"]
+        except Exception as e:
+            print("env info manifest {} unreadable, rebuild: {}".format(path, e))
+
+    agent_name_ls, env_info_dict = _build_env_info(env_class, config_dict)
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"agents": agent_name_ls, "env_info": env_info_dict}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print("env info manifest {} not saved: {}".format(path, e))
+
+    return agent_name_ls, env_info_dict
@@ -1,16 +1,20 @@
 from ray.rllib.policy.sample_batch import SampleBatch
+from ray.rllib.utils.framework import try_import_torch
 import numpy as np
 from ray.rllib.evaluation.postprocessing import discount_cumsum, Postprocessing, compute_gae_for_sample_batch
-from marl.algos.utils.valuenorm import ValueNorm
-from marl.algos.utils.postprocessing import get_dim, convert_to_torch_tensor
+from marl.algos.utils.postprocessing import get_dim, convert_to_torch_tensor, batched_central_vf, \
+    use_fused_gae, add_fused_gae, critic_state_from_obs, set_critic_state, get_state_space, central_critic_state
 from marl.algos.utils.setup_utils import get_agent_num
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import pickle
+import weakref
 from pathlib import Path
 import os
 import multiprocessing
 mul_manager = multiprocessing.Manager()
 
+torch, nn = try_import_torch()
+
 
 GLOBAL_NEED_COLLECT = [SampleBatch.ACTION_LOGP, SampleBatch.ACTIONS,
                        SampleBatch.ACTION_DIST_INPUTS, SampleBatch.OBS]
@@ -18,15 +22,16 @@ GLOBAL_PREFIX = 'global_'
 GLOBAL_MODEL_LOGITS = f'{GLOBAL_PREFIX}model_logits'
 GLOBAL_IS_TRAINING = f'{GLOBAL_PREFIX}is_trainable'
 GLOBAL_TRAIN_BATCH = f'{GLOBAL_PREFIX}train_batch'
+# OpponentColumns of the agent a row belongs to, and the row in the episode columns
+GLOBAL_COLUMNS = f'{GLOBAL_PREFIX}columns'
+GLOBAL_ROWS = f'{GLOBAL_PREFIX}rows'
+COLUMN_STORE = '_column_store'
 STATE = 'state'
 MODEL = 'model'
 POLICY_ID = 'policy_id'
 TRAINING = 'training'
 
 
-value_normalizer = ValueNorm(1)
-
-
 def get_global_name(key, i=None):
     # converts a key to global format
 
@@ -50,24 +55,26 @@ def extract_other_agents_train_batch(other_agent_batches):
     return _extract_from_all_others(lambda a: a[1])(other_agent_batches)
 
 
-def add_all_agents_gae(policy, sample_batch, other_agent_batches=None, episode=None):
+def add_all_agents_gae(policy, sample_batch, other_agent_batches=None, episode=None, returns_and_deltas=False):
 
     sample_batch = add_opponent_information_and_critical_vf(policy, sample_batch, other_agent_batches, episode=episode)
 
-    global value_normalizer
-
-    if value_normalizer.updated:
+    # the policy's own normalizer (see valuenorm.setup_value_normalizer), if it has one
+    value_normalizer = getattr(policy.model, "value_normalizer", None)
+    if value_normalizer is not None and value_normalizer.updated:
         sample_batch[SampleBatch.VF_PREDS] = value_normalizer.denormalize(sample_batch[SampleBatch.VF_PREDS])
 
+    if use_fused_gae(policy):
+        return add_fused_gae(
+            sample_batch, _get_last_r(policy, sample_batch), policy.config["gamma"], policy.config["lambda"],
+            use_gae=policy.config["use_gae"], use_critic=policy.config.get("use_critic", True),
+            returns_and_deltas=returns_and_deltas)
+
     train_batch = compute_gae_for_sample_batch(policy, sample_batch, other_agent_batches, episode)
 
     return train_batch
 
 
-Postprocessing.DELTAS = 'DELTA'
-Postprocessing.RETURNS = 'RETURNS'
-
-
 def _get_last_r(policy, sample_batch):
     if sample_batch[SampleBatch.DONES][-1]:
         last_r = 0.0
@@ -112,6 +119,10 @@ def _add_returns(sample_batch, last_r, gamma):
 
 
 def trpo_post_process(policy, sample_batch, other_agent_batches=None, episode=None):
+    if use_fused_gae(policy):
+        # returns and deltas come with the advantages
+        return add_all_agents_gae(policy, sample_batch, other_agent_batches, episode, returns_and_deltas=True)
+
     sample_batch = add_all_agents_gae(policy, sample_batch, other_agent_batches, episode)
 
     last_r = _get_last_r(policy, sample_batch)
@@ -124,33 +135,46 @@ def trpo_post_process(policy, sample_batch, other_agent_batches=None, episode=No
 
 
 class ObjHandler:
+    """Registry of the opponent policies and models seen by hatrpo_post_process.
+
+    Objects are saved under a stable key (the policy id) and only weakly referenced, and
+    beyond max_size keys the least recently used one is evicted, so the registry neither
+    grows with the number of trajectories nor keeps replaced policies alive.
+    """
 
     # base_dir = './tmp/obj'
 
     # cache_obj = mul_manager.dict()
-    cache_obj = dict()
+    cache_obj = OrderedDict()
+    max_size = 64
 
     def __init__(self):
         pass
 
     @classmethod
-    def save(cls, obj):
+    def save(cls, obj, key):
         # Path(cls.base_dir).mkdir(parents=True, exist_ok=True)
         # with open(os.path.join(cls.base_dir, f'{int(id(obj))}.obj'), 'wb') as f:
         #     pickle.dump(obj, f)
-        cls.cache_obj[int(id(obj))] = obj
+        cls.cache_obj[key] = weakref.ref(obj)
+        cls.cache_obj.move_to_end(key)
+        while len(cls.cache_obj) > cls.max_size:
+            cls.cache_obj.popitem(last=False)
 
-        return int(id(obj))
+        return key
 
     @classmethod
     def retrieve(cls, _id):
         # with open(os.path.join(cls.base_dir, f'{_id}.obj'), 'rb') as f:
         #     obj = pickle.load(f)
 
-        if _id in cls.cache_obj:
-            return cls.cache_obj[_id]
-        else:
+        obj = cls.cache_obj[_id]() if _id in cls.cache_obj else None
+        if obj is None:
+            cls.cache_obj.pop(_id, None)
             raise ValueError(f'_id: {_id} of object did not exist in memory')
+        cls.cache_obj.move_to_end(_id)
+
+        return obj
 
 
 def hatrpo_post_process(policy, sample_batch, other_agent_batches=None, epsisode=None):
@@ -159,34 +183,32 @@ def hatrpo_post_process(policy, sample_batch, other_agent_batches=None, epsisode
 
     n_agents = get_agent_num(policy)
 
-    for i in range(n_agents - 1):
+    # the opponent policies are metadata of the batch, kept on its OpponentColumns
+    opponent_columns = sample_batch[GLOBAL_COLUMNS][0] if len(sample_batch) else None
 
-        cur_model_id = 0
-        cur_training = 0
-        cur_loss_grad_fn_id = 0
+    for i in range(n_agents - 1):
 
-        if other_agent_batches:
+        if other_agent_batches and opponent_columns is not None:
             name = exist_in_opponent(opponent_index=i, opponent_batches=other_agent_batches)
             if name:
                 _p, _b = other_agent_batches[name]
-                cur_model_id = ObjHandler.save(_p.model)
-                cur_loss_grad_fn_id = ObjHandler.save(_p)
-                cur_training = _b.is_training
+                policy_key = epsisode.policy_for(name) if epsisode is not None else name
+                opponent_columns.policies[i] = {
+                    MODEL: ObjHandler.save(_p.model, f'{policy_key}/{MODEL}'),
+                    POLICY_ID: ObjHandler.save(_p, f'{policy_key}/{POLICY_ID}'),
+                    TRAINING: bool(_b.is_training),
+                }
 
-        # print(cur_model_id, cur_loss_grad_fn_id, cur_training)
-        sample_batch[get_global_name(MODEL, i)] = np.array([
-            int(cur_model_id)
-        ] * len(sample_batch))
+    return sample_batch
 
-        sample_batch[get_global_name(TRAINING, i)] = np.array([
-            int(cur_training)
-        ] * len(sample_batch))
 
-        sample_batch[get_global_name(POLICY_ID, i)] = np.array([
-            int(cur_loss_grad_fn_id)
-        ] * len(sample_batch))
+def contain_opponent_policies(train_batch, agent_num):
+    # whether hatrpo_post_process found the policies of all opponents of the first row's agent
+    opponent_columns = train_batch[GLOBAL_COLUMNS][0] if len(train_batch[GLOBAL_COLUMNS]) else None
+    if not isinstance(opponent_columns, OpponentColumns):
+        return False
 
-    return sample_batch
+    return all(i in opponent_columns.policies for i in range(agent_num - 1))
 
 
 def contain_global_obs(train_batch):
@@ -200,58 +222,150 @@ def get_action_from_batch(train_batch, model, dist_class):
     return curr_action_dist
 
 
-def add_other_agent_mul_info(sample_batch, other_agent_info, agent_num):
-    global GLOBAL_NEED_COLLECT
+class EpisodeColumnStore:
+    """The GLOBAL_NEED_COLLECT and rnn state columns of every agent of an episode, held once.
 
-    for agent_i in range(agent_num - 1):
-        for key in GLOBAL_NEED_COLLECT:
-            if key not in sample_batch: continue
-
-            value_added = False
-
-            if other_agent_info:
-                name = exist_in_opponent(opponent_index=agent_i, opponent_batches=other_agent_info)
-                if name:
-                    _p, _b = other_agent_info[name]
-                    sample_batch[get_global_name(key, agent_i)] = _b[key]
-                    value_added = True
-
-            if not value_added:
-                sample_batch[get_global_name(key, agent_i)] = np.zeros_like(
-                    sample_batch[key],
-                    dtype=sample_batch[key].dtype
-                )
-
-    if SampleBatch.ACTIONS in GLOBAL_NEED_COLLECT:
-        sample_batch[get_global_name(SampleBatch.ACTIONS)] = np.stack([
-            sample_batch[get_global_name(SampleBatch.ACTIONS, a_i)]
-            for a_i in range(agent_num-1)
-        ], axis=1)
+    The batches of all agents share one store and only keep references into it
+    (GLOBAL_COLUMNS, GLOBAL_ROWS), so the opponent information is O(n_agents) per timestep
+    instead of a copy of every opponent in the batch of every agent.
+    The columns are the arrays of the agent batches themselves, not copies.
+    """
+
+    def __init__(self):
+        self.columns = {}
+
+    def add(self, agent_id, batch):
+        if agent_id in self.columns:
+            return
+        keys = list(GLOBAL_NEED_COLLECT)
+        s_i = 0
+        while state_name(s_i) in batch:
+            keys.append(state_name(s_i))
+            s_i += 1
+        self.columns[agent_id] = {key: batch[key] for key in keys if key in batch}
+
+
+class OpponentColumns:
+    """The opponents of one agent in an EpisodeColumnStore, by opponent index as in exist_in_opponent."""
+
+    def __init__(self, store, opponent_ids):
+        self.store = store
+        self.opponent_ids = {opponent_id: None for opponent_id in opponent_ids}
+        # opponent index -> registry keys and training flag of its policy, see hatrpo_post_process
+        self.policies = {}
+
+    def column(self, key, opponent_index):
+        # None if the opponent or its column does not exist, read as zeros
+        name = exist_in_opponent(opponent_index=opponent_index, opponent_batches=self.opponent_ids)
+        if not name:
+            return None
+        return self.store.columns[name].get(key)
+
+
+def add_opponent_column_refs(sample_batch, other_agent_batches):
+    """Reference the opponents' columns of sample_batch in the column store of its episode.
+
+    The first agent of an episode to be postprocessed creates the store and hands it to the
+    batches of the other agents, rllib passes the same batch objects to all their calls.
+    """
+    store = getattr(sample_batch, COLUMN_STORE, None) or EpisodeColumnStore()
+    other_agent_batches = other_agent_batches or {}
+    for agent_id, (_p, _b) in other_agent_batches.items():
+        store.add(agent_id, _b)
+        if getattr(_b, COLUMN_STORE, None) is None:
+            setattr(_b, COLUMN_STORE, store)
+
+    opponent_columns = np.empty(len(sample_batch), dtype=object)
+    opponent_columns[:] = [OpponentColumns(store, other_agent_batches)] * len(sample_batch)
+    sample_batch[GLOBAL_COLUMNS] = opponent_columns
+    sample_batch[GLOBAL_ROWS] = np.arange(len(sample_batch))
 
     return sample_batch
 
 
-def get_vf_pred(policy, algorithm, sample_batch, opp_action_in_cc):
+def get_global_column(train_batch, key, agent_i):
+    """Column key of opponent agent_i for the rows of a (torch) train batch, zeros where it does not exist.
+
+    Resolved from the GLOBAL_COLUMNS references, the former get_global_name(key, agent_i) column.
+    """
+    own = train_batch[key]
+    value = torch.zeros_like(own)
+    rows = train_batch[GLOBAL_ROWS]
+    rows = rows.cpu().numpy() if torch.is_tensor(rows) else np.asarray(rows)
+
+    for opponent_columns, indices in _group_by_opponent_columns(train_batch).items():
+        column = opponent_columns.column(key, agent_i)
+        if column is None:
+            continue
+        value[torch.as_tensor(indices, device=own.device)] = torch.as_tensor(
+            column[rows[indices]], dtype=own.dtype, device=own.device)
+
+    return value
+
+
+def _group_by_opponent_columns(train_batch):
+    # row indices of train_batch per OpponentColumns, rnn padding rows have none
+    refs = train_batch[GLOBAL_COLUMNS]
+    cached = getattr(train_batch, '_opponent_column_groups', None)
+    if cached is not None and cached[0] is refs:
+        return cached[1]
+
+    groups = {}
+    for row, opponent_columns in enumerate(refs):
+        if isinstance(opponent_columns, OpponentColumns):
+            groups.setdefault(opponent_columns, []).append(row)
+    groups = {opponent_columns: np.array(indices) for opponent_columns, indices in groups.items()}
+    try:
+        train_batch._opponent_column_groups = (refs, groups)
+    except AttributeError:
+        pass
+
+    return groups
+
+
+def collect_opponent_actions(sample_batch, other_agent_info, agent_num):
+    # the global actions column, the critic input of all opponent actions
+    actions = []
+    for agent_i in range(agent_num - 1):
+        name = exist_in_opponent(opponent_index=agent_i, opponent_batches=other_agent_info) \
+            if other_agent_info else False
+        if name:
+            _p, _b = other_agent_info[name]
+            actions.append(_b[SampleBatch.ACTIONS])
+        else:
+            actions.append(np.zeros_like(sample_batch[SampleBatch.ACTIONS],
+                                         dtype=sample_batch[SampleBatch.ACTIONS].dtype))
+
+    return np.stack(actions, axis=1)
+
+
+def get_critic_inputs(custom_config, agent_num, sample_batch, other_agent_batches):
+    # (state, global actions) the central critic takes for an agent batch
+    obs_dim = get_dim(custom_config["space_obs"]["obs"].shape)
+    action_mask_dim = custom_config["space_act"].n if custom_config["mask_flag"] else 0
+
+    if custom_config["global_state_flag"]:  # include self obs and global state
+        state = critic_state_from_obs(custom_config, sample_batch, other_agent_batches)
+    else:  # all other agent obs as state
+        opponent_batch = collect_opponent_array(other_agent_batches=other_agent_batches,
+                                                opponent_agents_num=agent_num - 1,
+                                                sample_batch=sample_batch)
+        state = np.stack(
+            [sample_batch[SampleBatch.OBS][:, action_mask_dim:action_mask_dim + obs_dim]] + [
+                opponent_batch[i][SampleBatch.OBS][:, action_mask_dim:action_mask_dim + obs_dim] for i in
+                range(agent_num - 1)], 1)
+
+    return state, collect_opponent_actions(sample_batch, other_agent_batches, agent_num)
+
+
+def get_vf_pred(algorithm, sample_batch, vf_preds):
     if algorithm in ["coma"]:
-        sample_batch[SampleBatch.VF_PREDS] = policy.compute_central_vf(
-            convert_to_torch_tensor(
-                sample_batch[STATE], policy.device),
-            convert_to_torch_tensor(
-                sample_batch[get_global_name(SampleBatch.ACTIONS)], policy.device) if opp_action_in_cc else None,
-        ) \
-            .cpu().detach().numpy()
         sample_batch[SampleBatch.VF_PREDS] = np.take(
-            sample_batch[SampleBatch.VF_PREDS],
+            vf_preds,
             np.expand_dims(sample_batch[SampleBatch.ACTIONS],axis=1)
         ).squeeze(axis=1)
     else:
-        sample_batch[SampleBatch.VF_PREDS] = policy.compute_central_vf(
-            convert_to_torch_tensor(
-                sample_batch[STATE], policy.device),
-            convert_to_torch_tensor(
-                sample_batch[get_global_name(SampleBatch.ACTIONS)], policy.device) if opp_action_in_cc else None,
-        ) \
-            .cpu().detach().numpy()
+        sample_batch[SampleBatch.VF_PREDS] = vf_preds
 
     return sample_batch
 
@@ -297,37 +411,6 @@ def exist_in_opponent(opponent_index, opponent_batches: dict):
         return False
 
 
-def add_state_in_for_opponent(sample_batch, other_agent_batches, agent_num):
-
-    state_in_num = 0
-
-    while state_name(state_in_num) in sample_batch:
-        state_in_num += 1
-
-    # get how many state in layer
-    # agent_indices = [0, 1, 2]
-
-    for a_i in range(agent_num - 1):
-        # name = agent(a_i)
-
-        for s_i in range(state_in_num):
-            opponent_state_exist = False
-            if other_agent_batches:
-                name = exist_in_opponent(opponent_index=a_i, opponent_batches=other_agent_batches)
-                if name and state_name(s_i) in other_agent_batches[name]:
-                    _policy, _batch = other_agent_batches[name]
-                    sample_batch[global_state_name(s_i, a_i)] = _batch[state_name(s_i)]
-                    opponent_state_exist = True
-
-            if not opponent_state_exist:
-                sample_batch[global_state_name(s_i, a_i)] = np.zeros_like(
-                    sample_batch[state_name(s_i)],
-                    dtype=sample_batch[state_name(s_i)].dtype
-                )
-
-    return sample_batch
-
-
 def add_opponent_information_and_critical_vf(policy,
                                              sample_batch,
                                              other_agent_batches=None,
@@ -338,65 +421,74 @@ def add_opponent_information_and_critical_vf(policy,
     algorithm = custom_config["algorithm"]
     opp_action_in_cc = custom_config["opp_action_in_cc"]
     global_state_flag = custom_config["global_state_flag"]
-    mask_flag = custom_config["mask_flag"]
-
-    if mask_flag:
-        action_mask_dim = custom_config["space_act"].n
-    else:
-        action_mask_dim = 0
 
     n_agents = get_agent_num(policy)
-    opponent_agents_num = n_agents - 1
 
     opponent_info_exists = (pytorch and hasattr(policy, "compute_central_vf")) or (not pytorch and policy.loss_initialized())
 
     if opponent_info_exists:
-        if not opp_action_in_cc and global_state_flag:
-            sample_batch[STATE] = sample_batch[SampleBatch.OBS][:, action_mask_dim:]
-            sample_batch[SampleBatch.VF_PREDS] = policy.compute_central_vf(
-                convert_to_torch_tensor(
-                    sample_batch[STATE], policy.device),
-            ).cpu().detach().numpy()
-        else:  # need opponent info
-            opponent_batch = collect_opponent_array(other_agent_batches=other_agent_batches,
-                                                    opponent_agents_num=opponent_agents_num,
-                                                    sample_batch=sample_batch)
-
-            # all other agent obs as state
-            if global_state_flag:  # include self obs and global state
-                sample_batch[STATE] = sample_batch[SampleBatch.OBS][:, action_mask_dim:]
-            else:
-                sample_batch[STATE] = np.stack(
-                    [sample_batch[SampleBatch.OBS][:, action_mask_dim:action_mask_dim + obs_dim]] + [
-                        opponent_batch[i][SampleBatch.OBS][:, action_mask_dim:action_mask_dim + obs_dim] for i in
-                        range(opponent_agents_num)], 1)
+        # one critic pass for all agents of the episode sharing this policy
+        vf_preds, state, _ = batched_central_vf(
+            policy, sample_batch, other_agent_batches, episode,
+            lambda batch, others: get_critic_inputs(custom_config, n_agents, batch, others),
+            opp_action_in_cc)
+        sample_batch = set_critic_state(custom_config, sample_batch, other_agent_batches, state, STATE)
     else:
         # Policy hasn't been initialized yet, use zeros.
         o = sample_batch[SampleBatch.CUR_OBS]
         if global_state_flag:
-            sample_batch[STATE] = np.zeros((o.shape[0], get_dim(custom_config["space_obs"]["state"].shape) + get_dim(
-                custom_config["space_obs"]["obs"].shape)),
-                                           dtype=sample_batch[SampleBatch.CUR_OBS].dtype)
+            sample_batch = set_critic_state(custom_config, sample_batch, None, np.zeros(
+                (o.shape[0], get_dim(get_state_space(custom_config).shape) + get_dim(
+                    custom_config["space_obs"]["obs"].shape)),
+                dtype=sample_batch[SampleBatch.CUR_OBS].dtype), STATE)
         else:
             sample_batch[STATE] = np.zeros((o.shape[0], n_agents, obs_dim),
                                            dtype=sample_batch[SampleBatch.CUR_OBS].dtype)
 
-    sample_batch = add_other_agent_mul_info(
-        sample_batch=sample_batch,
-        other_agent_info=other_agent_batches,
-        agent_num=n_agents,
-    )
+    sample_batch[get_global_name(SampleBatch.ACTIONS)] = collect_opponent_actions(
+        sample_batch, other_agent_batches, n_agents)
 
-    sample_batch = add_state_in_for_opponent(
-        sample_batch=sample_batch,
-        other_agent_batches=other_agent_batches,
-        agent_num=n_agents,
-    )
+    sample_batch = add_opponent_column_refs(sample_batch, other_agent_batches)
 
     if opponent_info_exists:
-        sample_batch = get_vf_pred(policy, algorithm, sample_batch, opp_action_in_cc)
+        sample_batch = get_vf_pred(algorithm, sample_batch, vf_preds)
     else:
         sample_batch[SampleBatch.VF_PREDS] = np.zeros_like(
             sample_batch[SampleBatch.REWARDS], dtype=np.float32)
 
     return sample_batch
+
+
+if __name__ == '__main__':
+    import functools
+    from ray.rllib.policy.rnn_sequencing import pad_batch_to_sequences_of_same_size
+    from ray.rllib.policy.view_requirement import ViewRequirement
+    from ray.rllib.utils.torch_ops import convert_to_torch_tensor
+
+    # the opponent columns of a rnn train batch, through the rnn padding and the lazy torch conversion
+    T = 5
+    agent_batches = {
+        f'agent_{agent_index}': SampleBatch({
+            SampleBatch.OBS: np.random.rand(T, 3).astype(np.float32),
+            SampleBatch.ACTIONS: np.arange(T) + 10 * (1 - agent_index),
+            SampleBatch.ACTION_LOGP: np.zeros(T, dtype=np.float32),
+            SampleBatch.ACTION_DIST_INPUTS: np.zeros((T, 2), dtype=np.float32),
+            SampleBatch.EPS_ID: np.zeros(T, dtype=np.int64),
+            SampleBatch.UNROLL_ID: np.zeros(T, dtype=np.int64),
+            SampleBatch.AGENT_INDEX: np.full(T, agent_index),
+            state_name(0): np.zeros((T, 4), dtype=np.float32),
+        }) for agent_index in range(2)
+    }
+    train_batch = add_opponent_column_refs(agent_batches['agent_1'], {'agent_0': (None, agent_batches['agent_0'])})
+
+    pad_batch_to_sequences_of_same_size(
+        train_batch, max_seq_len=2, view_requirements={state_name(0): ViewRequirement('state_out_0', shift=-1)})
+    assert list(train_batch[SampleBatch.SEQ_LENS]) == [2, 2, 1]
+    assert isinstance(train_batch[GLOBAL_COLUMNS], np.ndarray) and train_batch[GLOBAL_COLUMNS][-1] is None
+
+    train_batch.set_get_interceptor(functools.partial(convert_to_torch_tensor, device=torch.device('cpu')))
+    actions = get_global_column(train_batch, SampleBatch.ACTIONS, 0)
+    assert actions.tolist() == [10, 11, 12, 13, 14, 0], actions
+    assert not get_global_column(train_batch, SampleBatch.ACTIONS, 1).any()
+
+    print('test done!')
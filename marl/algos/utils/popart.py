@@ -1,75 +1,42 @@
-
 import numpy as np
 
 import torch
 import torch.nn as nn
 
+from marl.algos.utils.valuenorm import ValueNorm
 
-class PopArt(nn.Module):
-    """ Normalize a vector of observations - across the first norm_axes dimensions"""
-
-    def __init__(self, input_shape, norm_axes=1, beta=0.99999, per_element_update=False, epsilon=1e-5, device=torch.device("cpu")):
-        super(PopArt, self).__init__()
-
-        self.input_shape = input_shape
-        self.norm_axes = norm_axes
-        self.epsilon = epsilon
-        self.beta = beta
-        self.per_element_update = per_element_update
-        self.tpdv = dict(dtype=torch.float32, device=device)
-
-        self.running_mean = nn.Parameter(torch.zeros(input_shape), requires_grad=False).to(**self.tpdv)
-        self.running_mean_sq = nn.Parameter(torch.zeros(input_shape), requires_grad=False).to(**self.tpdv)
-        self.debiasing_term = nn.Parameter(torch.tensor(0.0), requires_grad=False).to(**self.tpdv)
 
-    def reset_parameters(self):
-        self.running_mean.zero_()
-        self.running_mean_sq.zero_()
-        self.debiasing_term.zero_()
+class PopArt(ValueNorm):
+    """ Normalize a vector of observations - across the first norm_axes dimensions
 
-    def running_mean_var(self):
-        debiased_mean = self.running_mean / self.debiasing_term.clamp(min=self.epsilon)
-        debiased_mean_sq = self.running_mean_sq / self.debiasing_term.clamp(min=self.epsilon)
-        debiased_var = (debiased_mean_sq - debiased_mean ** 2).clamp(min=1e-2)
-        return debiased_mean, debiased_var
+    ValueNorm that also rescales value_layer, the nn.Linear producing the normalized values,
+    on every update so its denormalized outputs are preserved (Pop-Art), all on the layer's device.
+    """
 
-    def forward(self, input_vector, train=True):
-        # Make sure input is float32
-        if type(input_vector) == np.ndarray:
-            input_vector = torch.from_numpy(input_vector)
-        input_vector = input_vector.to(**self.tpdv)
+    def __init__(self, input_shape, norm_axes=1, beta=0.99999, per_element_update=False, epsilon=1e-5,
+                 device=torch.device("cpu"), value_layer=None):
+        super(PopArt, self).__init__(input_shape, norm_axes, beta, per_element_update, epsilon, device)
 
-        if train:
-            # Detach input before adding it to running means to avoid backpropping through it on
-            # subsequent batches.
-            detached_input = input_vector.detach()
-            batch_mean = detached_input.mean(dim=tuple(range(self.norm_axes)))
-            batch_sq_mean = (detached_input ** 2).mean(dim=tuple(range(self.norm_axes)))
+        # a plain attribute, the layer belongs to the model
+        self.__dict__["value_layer"] = value_layer
 
-            if self.per_element_update:
-                batch_size = np.prod(detached_input.size()[:self.norm_axes])
-                weight = self.beta ** batch_size
-            else:
-                weight = self.beta
+    @torch.no_grad()
+    def update(self, input_vector):
+        old_mean, old_var = self.running_mean_var()
+        old_std = torch.sqrt(old_var)
 
-            self.running_mean.mul_(weight).add_(batch_mean * (1.0 - weight))
-            self.running_mean_sq.mul_(weight).add_(batch_sq_mean * (1.0 - weight))
-            self.debiasing_term.mul_(weight).add_(1.0 * (1.0 - weight))
+        super(PopArt, self).update(input_vector)
 
-        mean, var = self.running_mean_var()
-        out = (input_vector - mean[(None,) * self.norm_axes]) / torch.sqrt(var)[(None,) * self.norm_axes]
-        
-        return out
+        if self.value_layer is not None:
+            new_mean, new_var = self.running_mean_var()
+            new_std = torch.sqrt(new_var)
+            device = self.value_layer.weight.device
+            scale = (old_std / new_std).to(device)
+            self.value_layer.weight.mul_(scale.reshape(-1, 1))
+            self.value_layer.bias.mul_(scale).add_(((old_mean - new_mean) / new_std).to(device))
 
-    def denormalize(self, input_vector):
-        """ Transform normalized data back into original distribution """
-        if type(input_vector) == np.ndarray:
-            input_vector = torch.from_numpy(input_vector)
-        input_vector = input_vector.to(**self.tpdv)
+    def forward(self, input_vector, train=True):
+        if train:
+            self.update(input_vector)
 
-        mean, var = self.running_mean_var()
-        out = input_vector * torch.sqrt(var)[(None,) * self.norm_axes] + mean[(None,) * self.norm_axes]
-        
-        out = out.cpu().numpy()
-        
-        return out
+        return self.normalize(input_vector)
@@ -8,10 +8,14 @@ from ray.rllib.policy.policy import Policy
 from ray.rllib.policy.sample_batch import SampleBatch
 from ray.rllib.utils.numpy import convert_to_numpy
 import numpy as np
-import copy
+import scipy.signal
 
 torch, nn = try_import_torch()
 
+# columns of trpo_post_process and compute_multi_agent_gae
+Postprocessing.DELTAS = 'DELTA'
+Postprocessing.RETURNS = 'RETURNS'
+
 
 def get_dim(a):
     dim = 1
@@ -27,6 +31,241 @@ class CentralizedValueMixin:
         self.compute_central_vf = self.model.central_value_function
 
 
+# name of the SampleBatch attribute holding central critic values computed ahead of that agent's
+# postprocessing, set by batched_central_vf
+CENTRAL_VF_PREDS = "_central_vf_preds"
+
+
+# share_global_state on the centralized critic path: the env puts the global state of a step in the
+# info of the state carrier only (envs.base_env.columnar.StateInInfos), and the agent batches keep
+# their own obs part of the critic state plus a reference to the [T, state_dim] states of the episode
+# (SHARED_STATE) and the row of their timestep in it (SHARED_STATE_ROWS)
+SHARED_STATE = "shared_state"
+SHARED_STATE_ROWS = "shared_state_rows"
+# name of the SampleBatch attribute of the state carrier holding the stacked states of its episode
+EPISODE_STATE = "_episode_state"
+
+
+def get_state_space(custom_config):
+    # with share_global_state the state is not part of the obs space, run_cc passes it as space_state
+    if custom_config.get("share_global_state", False):
+        return custom_config["space_state"]
+    return custom_config["space_obs"]["state"]
+
+
+def episode_shared_state(sample_batch, other_agent_batches):
+    """The [T, state_dim] global states of the episode of sample_batch and the rows of its timesteps.
+
+    The states are stacked once out of the infos of the state carrier, and the infos then hold
+    views into the stacked array. None, None when no batch of the episode carries the state.
+    """
+    batches = [sample_batch] + [batch for _, batch in (other_agent_batches or {}).values()]
+    for batch in batches:
+        if SampleBatch.INFOS not in batch or not len(batch[SampleBatch.INFOS]):
+            continue
+        infos = batch[SampleBatch.INFOS]
+        if not isinstance(infos[0], dict) or "state" not in infos[0]:
+            continue
+        state = getattr(batch, EPISODE_STATE, None)
+        if state is None or len(state) != len(infos):
+            state = np.stack([info["state"] for info in infos])
+            for t, info in enumerate(infos):
+                info["state"] = state[t]
+            setattr(batch, EPISODE_STATE, state)
+        rows = np.arange(len(sample_batch))
+        if SampleBatch.T in sample_batch and SampleBatch.T in batch:
+            rows = np.asarray(sample_batch[SampleBatch.T]) - batch[SampleBatch.T][0]
+        return state, np.clip(rows, 0, len(state) - 1)
+    return None, None
+
+
+def critic_state_from_obs(custom_config, sample_batch, other_agent_batches):
+    # the agent's own obs and the global state, the centralized critic input with global_state_flag
+    action_mask_dim = custom_config["space_act"].n if custom_config["mask_flag"] else 0
+    own = sample_batch['obs'][:, action_mask_dim:]
+    if not custom_config.get("share_global_state", False):
+        return own
+    state, rows = episode_shared_state(sample_batch, other_agent_batches)
+    if state is None:
+        raise ValueError("share_global_state: no agent of the episode carries the state in its infos")
+    return np.concatenate([own, state[rows].astype(own.dtype)], 1)
+
+
+def set_critic_state(custom_config, sample_batch, other_agent_batches, state, key="state"):
+    """sample_batch[key] = state, the centralized critic input of the agent batch.
+
+    With share_global_state only the own obs part goes into the column, the global state stays
+    once per timestep in the episode states referenced by SHARED_STATE / SHARED_STATE_ROWS,
+    and central_critic_state puts the two back together in the loss.
+    """
+    if not custom_config.get("share_global_state", False):
+        sample_batch[key] = state
+        return sample_batch
+
+    state_dim = get_dim(custom_config["space_state"].shape)
+    episode_state, rows = episode_shared_state(sample_batch, other_agent_batches)
+    if episode_state is None:
+        # the dummy batch of the loss initialization, it references its own zeros
+        episode_state, rows = state[:, -state_dim:], np.arange(len(state))
+    sample_batch[key] = state[:, :-state_dim].copy()
+    refs = np.empty(len(sample_batch), dtype=object)
+    refs.fill(episode_state)
+    sample_batch[SHARED_STATE] = refs
+    sample_batch[SHARED_STATE_ROWS] = rows
+    return sample_batch
+
+
+def central_critic_state(train_batch, key="state"):
+    """The centralized critic input of a (torch) train batch, see set_critic_state.
+
+    rnn padding rows have no episode states and get a zero global state.
+    """
+    state = train_batch[key]
+    if SHARED_STATE not in train_batch:
+        return state
+
+    refs = train_batch[SHARED_STATE]
+    cached = getattr(train_batch, "_shared_state", None)
+    if cached is not None and cached[0] is refs and cached[1] is state:
+        return cached[2]
+
+    rows = train_batch[SHARED_STATE_ROWS]
+    rows = rows.cpu().numpy() if torch.is_tensor(rows) else np.asarray(rows)
+    groups = {}
+    for row, episode_state in enumerate(refs):
+        if episode_state is not None:
+            groups.setdefault(id(episode_state), (episode_state, []))[1].append(row)
+
+    state_dim = next(iter(groups.values()))[0].shape[1]
+    shared = torch.zeros(tuple(state.shape[:-1]) + (state_dim,), dtype=state.dtype, device=state.device)
+    for episode_state, indices in groups.values():
+        indices = np.array(indices)
+        shared[torch.as_tensor(indices, device=state.device)] = torch.as_tensor(
+            episode_state[rows[indices]], dtype=state.dtype, device=state.device)
+    full_state = torch.cat([state, shared], -1)
+    try:
+        train_batch._shared_state = (refs, state, full_state)
+    except AttributeError:
+        pass
+
+    return full_state
+
+
+def episode_agent_batches(policy, sample_batch, other_agent_batches, episode):
+    """The (policy, batch) of every agent of the episode, keyed by agent id.
+
+    rllib postprocesses the agents one by one and passes each the batches of the other agents
+    in agent index order, so every agent sees its opponents in the order of the returned dict.
+    None when the agents can not be recovered from the episode.
+    """
+    agent_to_index = getattr(episode, "_agent_to_index", None)
+    if not agent_to_index or not other_agent_batches or SampleBatch.AGENT_INDEX not in sample_batch:
+        return None
+    index_to_agent = {index: agent_id for agent_id, index in agent_to_index.items()}
+    agent_id = index_to_agent.get(sample_batch[SampleBatch.AGENT_INDEX][0])
+    if agent_id is None or agent_id in other_agent_batches or \
+            any(other_id not in agent_to_index for other_id in other_agent_batches):
+        return None
+
+    agent_batches = dict(other_agent_batches)
+    agent_batches[agent_id] = (policy, sample_batch)
+    agent_ids = sorted(agent_batches, key=agent_to_index.get)
+    if [other_id for other_id in agent_ids if other_id != agent_id] != list(other_agent_batches):
+        return None
+    return {other_id: agent_batches[other_id] for other_id in agent_ids}
+
+
+def batched_central_vf(policy, sample_batch, other_agent_batches, episode, critic_inputs, opp_action_in_cc):
+    """Central critic values of sample_batch, computed in one forward pass with the other agents of the episode.
+
+    critic_inputs(batch, other_agent_batches) returns the (state, opponent_actions) of an agent
+    batch, the opponent actions go into the critic with opp_action_in_cc.
+    The first agent of a policy to be postprocessed evaluates the critic for all agents of the
+    episode sharing that policy and leaves their values on their batches, so the postprocessing
+    of the other agents only builds the inputs again for the train batch.
+
+    Returns:
+        vf_preds, state, opponent_actions of sample_batch
+    """
+    state, opponent_actions = critic_inputs(sample_batch, other_agent_batches)
+    vf_preds = getattr(sample_batch, CENTRAL_VF_PREDS, None)
+    if vf_preds is not None:
+        delattr(sample_batch, CENTRAL_VF_PREDS)
+        if len(vf_preds) == len(sample_batch):
+            return vf_preds, state, opponent_actions
+
+    inputs = [(sample_batch, state, opponent_actions)]
+    agent_batches = episode_agent_batches(policy, sample_batch, other_agent_batches, episode)
+    if agent_batches:
+        for agent_id, (agent_policy, batch) in agent_batches.items():
+            if agent_policy is not policy or batch is sample_batch or hasattr(batch, CENTRAL_VF_PREDS):
+                continue
+            others = {other_id: other for other_id, other in agent_batches.items() if other_id != agent_id}
+            inputs.append((batch,) + tuple(critic_inputs(batch, others)))
+
+    vf_preds = policy.compute_central_vf(
+        convert_to_torch_tensor(
+            np.concatenate([agent_state for _, agent_state, _ in inputs]), policy.device),
+        convert_to_torch_tensor(
+            np.concatenate([agent_actions for _, _, agent_actions in inputs]), policy.device)
+        if opp_action_in_cc else None,
+    ).cpu().detach().numpy()
+
+    vf_preds = np.split(vf_preds, np.cumsum([len(agent_state) for _, agent_state, _ in inputs])[:-1])
+    for (batch, _, _), agent_vf_preds in zip(inputs[1:], vf_preds[1:]):
+        setattr(batch, CENTRAL_VF_PREDS, agent_vf_preds)
+    return vf_preds[0], state, opponent_actions
+
+
+def align_opponent_batches(other_agent_batches, opponent_agents_num, sample_batch):
+    # the first opponent_agents_num opponent batches, cut or padded to the length of sample_batch
+    assert other_agent_batches is not None
+    opponent_batch_list = list(other_agent_batches.values())
+    raw_opponent_batch = [opponent_batch_list[i][1] for i in range(opponent_agents_num)]
+    opponent_batch = []
+    for one_opponent_batch in raw_opponent_batch:
+        if len(one_opponent_batch) == len(sample_batch):
+            pass
+        else:
+            if len(one_opponent_batch) > len(sample_batch):
+                one_opponent_batch = one_opponent_batch.slice(0, len(sample_batch))
+            else:  # len(one_opponent_batch) < len(sample_batch):
+                length_dif = len(sample_batch) - len(one_opponent_batch)
+                one_opponent_batch = one_opponent_batch.concat(
+                    one_opponent_batch.slice(len(one_opponent_batch) - length_dif, len(one_opponent_batch)))
+        opponent_batch.append(one_opponent_batch)
+    return opponent_batch
+
+
+def centralized_critic_inputs(custom_config, sample_batch, other_agent_batches):
+    # (state, opponent_actions) of an agent batch, opponent_actions None without opponent info
+    obs_dim = get_dim(custom_config["space_obs"]["obs"].shape)
+    opp_action_in_cc = custom_config["opp_action_in_cc"]
+    global_state_flag = custom_config["global_state_flag"]
+    action_mask_dim = custom_config["space_act"].n if custom_config["mask_flag"] else 0
+    opponent_agents_num = custom_config["num_agents"] - 1
+
+    if not opp_action_in_cc and global_state_flag:
+        return critic_state_from_obs(custom_config, sample_batch, other_agent_batches), None
+
+    # need opponent info
+    opponent_batch = align_opponent_batches(other_agent_batches, opponent_agents_num, sample_batch)
+
+    # all other agent obs as state
+    if global_state_flag:  # include self obs and global state
+        state = critic_state_from_obs(custom_config, sample_batch, other_agent_batches)
+    else:
+        state = np.stack(
+            [sample_batch['obs'][:, action_mask_dim:action_mask_dim + obs_dim]] + [
+                opponent_batch[i]["obs"][:, action_mask_dim:action_mask_dim + obs_dim] for i in
+                range(opponent_agents_num)], 1)
+
+    opponent_actions = np.stack(
+        [opponent_batch[i]["actions"] for i in range(opponent_agents_num)],
+        1)
+    return state, opponent_actions
+
+
 def centralized_critic_postprocessing(policy,
                                       sample_batch,
                                       other_agent_batches=None,
@@ -37,12 +276,6 @@ def centralized_critic_postprocessing(policy,
     algorithm = custom_config["algorithm"]
     opp_action_in_cc = custom_config["opp_action_in_cc"]
     global_state_flag = custom_config["global_state_flag"]
-    mask_flag = custom_config["mask_flag"]
-
-    if mask_flag:
-        action_mask_dim = custom_config["space_act"].n
-    else:
-        action_mask_dim = 0
 
     n_agents = custom_config["num_agents"]
     opponent_agents_num = n_agents - 1
@@ -50,70 +283,27 @@ def centralized_critic_postprocessing(policy,
     if (pytorch and hasattr(policy, "compute_central_vf")) or \
             (not pytorch and policy.loss_initialized()):
 
-        if not opp_action_in_cc and global_state_flag:
-            sample_batch["state"] = sample_batch['obs'][:, action_mask_dim:]
-            sample_batch[SampleBatch.VF_PREDS] = policy.compute_central_vf(
-                convert_to_torch_tensor(
-                    sample_batch["state"], policy.device),
-            ).cpu().detach().numpy()
-        else:  # need opponent info
-            assert other_agent_batches is not None
-            opponent_batch_list = list(other_agent_batches.values())
-            raw_opponent_batch = [opponent_batch_list[i][1] for i in range(opponent_agents_num)]
-            opponent_batch = []
-            for one_opponent_batch in raw_opponent_batch:
-                if len(one_opponent_batch) == len(sample_batch):
-                    pass
-                else:
-                    if len(one_opponent_batch) > len(sample_batch):
-                        one_opponent_batch = one_opponent_batch.slice(0, len(sample_batch))
-                    else:  # len(one_opponent_batch) < len(sample_batch):
-                        length_dif = len(sample_batch) - len(one_opponent_batch)
-                        one_opponent_batch = one_opponent_batch.concat(
-                            one_opponent_batch.slice(len(one_opponent_batch) - length_dif, len(one_opponent_batch)))
-                opponent_batch.append(one_opponent_batch)
+        sample_batch[SampleBatch.VF_PREDS], state, opponent_actions = batched_central_vf(
+            policy, sample_batch, other_agent_batches, episode,
+            lambda batch, others: centralized_critic_inputs(custom_config, batch, others),
+            opp_action_in_cc)
+        sample_batch = set_critic_state(custom_config, sample_batch, other_agent_batches, state)
+        if opponent_actions is not None:
+            sample_batch["opponent_actions"] = opponent_actions
 
-            # all other agent obs as state
-            # sample_batch["state"] = sample_batch['obs'][:, action_mask_dim:action_mask_dim + obs_dim]
-            if global_state_flag:  # include self obs and global state
-                sample_batch["state"] = sample_batch['obs'][:, action_mask_dim:]
-            else:
-                sample_batch["state"] = np.stack(
-                    [sample_batch['obs'][:, action_mask_dim:action_mask_dim + obs_dim]] + [
-                        opponent_batch[i]["obs"][:, action_mask_dim:action_mask_dim + obs_dim] for i in
-                        range(opponent_agents_num)], 1)
-
-            sample_batch["opponent_actions"] = np.stack(
-                [opponent_batch[i]["actions"] for i in range(opponent_agents_num)],
-                1)
-
-            if algorithm in ["coma"]:
-                sample_batch[SampleBatch.VF_PREDS] = policy.compute_central_vf(
-                    convert_to_torch_tensor(
-                        sample_batch["state"], policy.device),
-                    convert_to_torch_tensor(
-                        sample_batch["opponent_actions"], policy.device) if opp_action_in_cc else None,
-                ) \
-                    .cpu().detach().numpy()
-                sample_batch[SampleBatch.VF_PREDS] = np.take(sample_batch[SampleBatch.VF_PREDS],
-                                                             np.expand_dims(sample_batch["actions"], axis=1)).squeeze(
-                    axis=1)
-            else:
-                sample_batch[SampleBatch.VF_PREDS] = policy.compute_central_vf(
-                    convert_to_torch_tensor(
-                        sample_batch["state"], policy.device),
-                    convert_to_torch_tensor(
-                        sample_batch["opponent_actions"], policy.device) if opp_action_in_cc else None,
-                ) \
-                    .cpu().detach().numpy()
+        if algorithm in ["coma"]:
+            sample_batch[SampleBatch.VF_PREDS] = np.take(sample_batch[SampleBatch.VF_PREDS],
+                                                         np.expand_dims(sample_batch["actions"], axis=1)).squeeze(
+                axis=1)
 
     else:
         # Policy hasn't been initialized yet, use zeros.
         o = sample_batch[SampleBatch.CUR_OBS]
         if global_state_flag:
-            sample_batch["state"] = np.zeros((o.shape[0], get_dim(custom_config["space_obs"]["state"].shape) + get_dim(
-                custom_config["space_obs"]["obs"].shape)),
-                                             dtype=sample_batch[SampleBatch.CUR_OBS].dtype)
+            sample_batch = set_critic_state(custom_config, sample_batch, None, np.zeros(
+                (o.shape[0], get_dim(get_state_space(custom_config).shape) + get_dim(
+                    custom_config["space_obs"]["obs"].shape)),
+                dtype=sample_batch[SampleBatch.CUR_OBS].dtype))
         else:
             sample_batch["state"] = np.zeros((o.shape[0], n_agents, obs_dim),
                                              dtype=sample_batch[SampleBatch.CUR_OBS].dtype)
@@ -244,16 +434,96 @@ def value_mixing_postprocessing(policy,
         last_r,
         policy.config["gamma"],
         policy.config["lambda"],
-        use_gae=policy.config["use_gae"])
+        use_gae=policy.config["use_gae"],
+        fused=use_fused_gae(policy))
     return train_batch
 
 
+def use_fused_gae(policy):
+    # opt in with fused_gae in ray.yaml
+    return policy.config["model"]["custom_model_config"].get("fused_gae", False)
+
+
+def discount_cumsum_joint(x, gamma):
+    # rllib's discount_cumsum along the time axis of [T, ...] arrays
+    return scipy.signal.lfilter([1], [1, float(-gamma)], x[::-1], axis=0)[::-1]
+
+
+def compute_multi_agent_gae(rewards,
+                            vf_preds,
+                            last_r,
+                            gamma: float = 0.9,
+                            lambda_: float = 1.0,
+                            use_gae: bool = True,
+                            use_critic: bool = True):
+    """Advantages, value targets, discounted returns and TD deltas of joint trajectories in one pass.
+
+    Args:
+        rewards: [T, n_agents] (or [T]) rewards
+        vf_preds: value estimates of the same shape
+        last_r: [n_agents] (or scalar) value after the last step, 0 for finished trajectories
+    Returns:
+        dict of Postprocessing.ADVANTAGES, Postprocessing.VALUE_TARGETS, Postprocessing.RETURNS and
+        Postprocessing.DELTAS, each the shape of rewards and the same as rllib's compute_advantages
+        (and trpo_post_process' returns and deltas) per agent column.
+    """
+    rewards = np.asarray(rewards)
+    vf_preds = np.asarray(vf_preds)
+    last_r = np.broadcast_to(np.asarray(last_r, dtype=rewards.dtype), rewards.shape[1:])[np.newaxis]
+
+    returns = discount_cumsum_joint(np.concatenate([rewards, last_r]), gamma)[:-1].astype(np.float32)
+    vpred_t = np.concatenate([vf_preds, last_r])
+    deltas = rewards + gamma * vpred_t[1:] - vpred_t[:-1]
+
+    if use_gae:
+        advantages = discount_cumsum_joint(deltas, gamma * lambda_)
+        value_targets = (advantages + vf_preds).astype(np.float32)
+    elif use_critic:
+        advantages = returns - vf_preds
+        value_targets = returns
+    else:
+        advantages = returns
+        value_targets = np.zeros_like(returns)
+
+    return {
+        Postprocessing.ADVANTAGES: advantages.astype(np.float32),
+        Postprocessing.VALUE_TARGETS: value_targets,
+        Postprocessing.RETURNS: returns,
+        Postprocessing.DELTAS: deltas,
+    }
+
+
+def add_fused_gae(rollout: SampleBatch,
+                  last_r: float,
+                  gamma: float = 0.9,
+                  lambda_: float = 1.0,
+                  use_gae: bool = True,
+                  use_critic: bool = True,
+                  values_key: str = SampleBatch.VF_PREDS,
+                  returns_and_deltas: bool = False):
+    # compute_advantages of one agent through compute_multi_agent_gae, values from values_key
+    columns = compute_multi_agent_gae(
+        rollout[SampleBatch.REWARDS], rollout[values_key], last_r, gamma, lambda_, use_gae, use_critic)
+    rollout[Postprocessing.ADVANTAGES] = columns[Postprocessing.ADVANTAGES]
+    rollout[Postprocessing.VALUE_TARGETS] = columns[Postprocessing.VALUE_TARGETS]
+    if returns_and_deltas:
+        rollout[Postprocessing.RETURNS] = columns[Postprocessing.RETURNS]
+        rollout[Postprocessing.DELTAS] = columns[Postprocessing.DELTAS]
+
+    return rollout
+
+
 def compute_advantages_vf_tot(rollout: SampleBatch,
                               last_r: float,
                               gamma: float = 0.9,
                               lambda_: float = 1.0,
                               use_gae: bool = True,
-                              use_critic: bool = True):
+                              use_critic: bool = True,
+                              fused: bool = False):
+    if fused:
+        # no swap of the vf columns needed
+        return add_fused_gae(rollout, last_r, gamma, lambda_, use_gae, use_critic, values_key="vf_tot")
+
     # save the original vf
     vf_saved = deepcopy(rollout[SampleBatch.VF_PREDS])
     rollout[SampleBatch.VF_PREDS] = rollout["vf_tot"]
@@ -276,6 +546,40 @@ class CentralizedQValueMixin:
         self.compute_central_q = self.model.get_cc_q_values
 
 
+def sequence_start_states(batch, state_key):
+    # the state_key values at the first step of every sequence of batch
+    seq_lens = np.asarray(batch["seq_lens"])
+    return batch[state_key][np.cumsum(seq_lens) - seq_lens]
+
+
+def opponent_forward_groups(opponent_policies, opponent_batch):
+    """Opponent indices whose sequences can be stacked into one forward pass of their networks.
+
+    The rnn models infer the padded sequence length as rows // number of sequences, so
+    opponents are grouped by policy and that length, and any other opponent is its own group.
+    """
+    groups = {}
+    for opp_index, (opp_policy, opp_batch) in enumerate(zip(opponent_policies, opponent_batch)):
+        num_seqs = len(opp_batch["seq_lens"])
+        max_seq_len = len(opp_batch) // num_seqs if num_seqs else 0
+        if num_seqs and max_seq_len * num_seqs == len(opp_batch):
+            key = (id(opp_policy), max_seq_len)
+        else:
+            key = (opp_index,)
+        groups.setdefault(key, []).append(opp_index)
+    return list(groups.values())
+
+
+def stack_opponents(opponent_batch, group, take, device):
+    # take(batch) of the opponents in group, concatenated along the batch axis as a torch tensor
+    return convert_to_torch_tensor(np.concatenate([take(opponent_batch[i]) for i in group]), device)
+
+
+def split_opponents(opponent_batch, group, output):
+    # per opponent rows of a forward pass over the stacked group
+    return np.split(convert_to_numpy(output), np.cumsum([len(opponent_batch[i]) for i in group])[:-1])
+
+
 def centralized_critic_q(policy: Policy,
                          sample_batch: SampleBatch,
                          other_agent_batches=None,
@@ -344,28 +648,22 @@ def centralized_critic_q(policy: Policy,
                 [opponent_batch[i]["prev_actions"] for i in range(opponent_agents_num)],
                 1)
 
-            # grab the opponent next action manually
-            all_opponent_batch_next_action_ls = []
-            for opp_index in range(opponent_agents_num):
-                opp_policy = opponent_batch_list[opp_index][0]
-                opp_batch = copy.deepcopy(opponent_batch[opp_index])
+            # grab the opponent next action manually, one forward pass per opponent policy
+            opponent_policies = [opponent_batch_list[i][0] for i in range(opponent_agents_num)]
+            all_opponent_batch_next_action_ls = [None] * opponent_agents_num
+            for group in opponent_forward_groups(opponent_policies, opponent_batch):
+                opp_policy = opponent_policies[group[0]]
                 input_dict = {}
                 input_dict["obs"] = {}
-                input_dict["obs"]["obs"] = opp_batch["new_obs"][:,
-                                           action_mask_dim: action_mask_dim + obs_dim]
-                seq_lens = opp_batch["seq_lens"]
-                state_ls = []
-                start_point = 0
-                for seq_len in seq_lens:
-                    state = convert_to_torch_tensor(opp_batch["state_out_0"][start_point], policy.device)
-                    start_point += seq_len
-                    state_ls.append(state)
-                state = [torch.stack(state_ls, 0)]
-                input_dict = convert_to_torch_tensor(input_dict, policy.device)
-                seq_lens = convert_to_torch_tensor(seq_lens, policy.device)
+                input_dict["obs"]["obs"] = stack_opponents(
+                    opponent_batch, group, lambda b: b["new_obs"][:, action_mask_dim: action_mask_dim + obs_dim],
+                    policy.device)
+                state = [stack_opponents(opponent_batch, group, lambda b: sequence_start_states(b, "state_out_0"),
+                                         policy.device)]
+                seq_lens = stack_opponents(opponent_batch, group, lambda b: b["seq_lens"], policy.device)
                 opp_next_action, _ = opp_policy.model.policy_model(input_dict, state, seq_lens)
-                opp_next_action = convert_to_numpy(opp_next_action)
-                all_opponent_batch_next_action_ls.append(opp_next_action)
+                for opp_index, opp_next_action in zip(group, split_opponents(opponent_batch, group, opp_next_action)):
+                    all_opponent_batch_next_action_ls[opp_index] = opp_next_action
             sample_batch["next_opponent_actions"] = np.stack(
                 all_opponent_batch_next_action_ls, 1)
 
@@ -484,66 +782,45 @@ def q_value_mixing(policy: Policy,
                         opponent_batch[i]["new_obs"][:, action_mask_dim:action_mask_dim + obs_dim] for i in
                         range(opponent_agents_num)], 1)
 
-            # grab the opponent Q
-            all_opponent_batch_q_ls = []
-            for opp_index in range(opponent_agents_num):
-                opp_policy = opponent_batch_list[opp_index][0]
-                opp_batch = copy.deepcopy(opponent_batch[opp_index])
+            # grab the opponent Q, and the opponent next action & next Q from the target net,
+            # with one forward pass per network of every opponent policy
+            opponent_policies = [opponent_batch_list[i][0] for i in range(opponent_agents_num)]
+            all_opponent_batch_q_ls = [None] * opponent_agents_num
+            all_opponent_batch_next_q_ls = [None] * opponent_agents_num
+            for group in opponent_forward_groups(opponent_policies, opponent_batch):
+                opp_policy = opponent_policies[group[0]]
+                seq_lens = stack_opponents(opponent_batch, group, lambda b: b["seq_lens"], policy.device)
+
                 input_dict = {}
                 input_dict["obs"] = {}
-                input_dict["obs"]["obs"] = opp_batch["obs"][:,
-                                           action_mask_dim: action_mask_dim + obs_dim]
-                input_dict["actions"] = opp_batch["actions"]
-                seq_lens = opp_batch["seq_lens"]
-                state_ls = []
-                for i, seq_len in enumerate(seq_lens):
-                    state = convert_to_torch_tensor(opp_batch["state_in_1"][i], policy.device)
-                    state_ls.append(state)
-                state = [torch.stack(state_ls, 0)]
-                input_dict = convert_to_torch_tensor(input_dict, policy.device)
-                seq_lens = convert_to_torch_tensor(seq_lens, policy.device)
+                input_dict["obs"]["obs"] = stack_opponents(
+                    opponent_batch, group, lambda b: b["obs"][:, action_mask_dim: action_mask_dim + obs_dim],
+                    policy.device)
+                input_dict["actions"] = stack_opponents(opponent_batch, group, lambda b: b["actions"], policy.device)
+                state = [stack_opponents(opponent_batch, group, lambda b: b["state_in_1"][:len(b["seq_lens"])],
+                                         policy.device)]
                 opp_q, _ = opp_policy.model.q_model(input_dict, state, seq_lens)
-                opp_q = convert_to_numpy(opp_q.squeeze(1))
-                all_opponent_batch_q_ls.append(opp_q)
-            sample_batch["opponent_q"] = np.stack(
-                all_opponent_batch_q_ls, 1)
+                for opp_index, opp_q in zip(group, split_opponents(opponent_batch, group, opp_q.squeeze(1))):
+                    all_opponent_batch_q_ls[opp_index] = opp_q
 
-            # grab the opponent next action & compute next Q use target net
-            all_opponent_batch_next_q_ls = []
-            for opp_index in range(opponent_agents_num):
-                opp_policy = opponent_batch_list[opp_index][0]
-                opp_batch = copy.deepcopy(opponent_batch[opp_index])
                 input_dict = {}
                 input_dict["obs"] = {}
-                input_dict["obs"]["obs"] = opp_batch["new_obs"][:,
-                                           action_mask_dim: action_mask_dim + obs_dim]
-                seq_lens_array = opp_batch["seq_lens"]
-                seq_lens = convert_to_torch_tensor(seq_lens_array, policy.device)
-
-                state_ls = []
-                start_point = 0
-                for seq_len in seq_lens_array:
-                    state = convert_to_torch_tensor(opp_batch["state_out_0"][start_point], policy.device)
-                    start_point += seq_len
-                    state_ls.append(state)
-                state = [torch.stack(state_ls, 0)]
-
-                input_dict = convert_to_torch_tensor(input_dict, policy.device)
+                input_dict["obs"]["obs"] = stack_opponents(
+                    opponent_batch, group, lambda b: b["new_obs"][:, action_mask_dim: action_mask_dim + obs_dim],
+                    policy.device)
+                state = [stack_opponents(opponent_batch, group, lambda b: sequence_start_states(b, "state_out_0"),
+                                         policy.device)]
                 opp_next_action, _ = opp_policy.target_model.policy_model(input_dict, state, seq_lens)
 
-                state_ls = []
-                start_point = 0
-                for seq_len in seq_lens_array:
-                    state = convert_to_torch_tensor(opp_batch["state_out_1"][start_point], policy.device)
-                    start_point += seq_len
-                    state_ls.append(state)
-                state = [torch.stack(state_ls, 0)]
-
                 input_dict["actions"] = opp_next_action
+                state = [stack_opponents(opponent_batch, group, lambda b: sequence_start_states(b, "state_out_1"),
+                                         policy.device)]
                 next_opp_q, _ = opp_policy.target_model.q_model(input_dict, state, seq_lens)
+                for opp_index, next_opp_q in zip(group, split_opponents(opponent_batch, group, next_opp_q.squeeze(1))):
+                    all_opponent_batch_next_q_ls[opp_index] = next_opp_q
+            sample_batch["opponent_q"] = np.stack(
+                all_opponent_batch_q_ls, 1)
 
-                next_opp_q = convert_to_numpy(next_opp_q.squeeze(1))
-                all_opponent_batch_next_q_ls.append(next_opp_q)
             sample_batch["next_opponent_q"] = np.stack(
                 all_opponent_batch_next_q_ls, 1)
 
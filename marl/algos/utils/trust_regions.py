@@ -6,6 +6,7 @@ from ray.rllib.utils.torch_ops import explained_variance, sequence_mask
 from torch.nn.utils import parameters_to_vector, vector_to_parameters
 from marl.algos.utils.get_hetero_info import (
     get_global_name,
+    get_global_column,
     contain_global_obs,
     state_name,
     global_state_name,
@@ -67,19 +68,15 @@ class HATRPOUpdator:
         # current_model = ObjHandler.retrieve(model_id)
         # print('recovery model success!')
 
-        current_action_logits = train_batch[
-            get_global_name(SampleBatch.ACTION_DIST_INPUTS, agent_id)
-        ]
+        current_action_logits = get_global_column(train_batch, SampleBatch.ACTION_DIST_INPUTS, agent_id)
 
         current_action_dist = self.dist_class(current_action_logits, None)
 
-        old_action_log_dist = train_batch[
-            get_global_name(SampleBatch.ACTION_LOGP, agent_id)
-        ]
+        old_action_log_dist = get_global_column(train_batch, SampleBatch.ACTION_LOGP, agent_id)
 
-        actions = train_batch[get_global_name(SampleBatch.ACTIONS, agent_id)]
+        actions = get_global_column(train_batch, SampleBatch.ACTIONS, agent_id)
 
-        obs = train_batch[get_global_name(SampleBatch.OBS, agent_id)]
+        # obs = get_global_column(train_batch, SampleBatch.OBS, agent_id)
 
         # train_batch_for_trpo_update = SampleBatch(
         #     obs=obs,
@@ -5,7 +5,12 @@ import torch.nn as nn
 
 
 class ValueNorm(nn.Module):
-    """ Normalize a vector of observations - across the first norm_axes dimensions"""
+    """ Normalize a vector of observations - across the first norm_axes dimensions
+
+    The running statistics are buffers, so a normalizer registered on a policy's model is
+    checkpointed and synced to the rollout workers with the model weights.
+    normalize/denormalize keep torch inputs on their device, and numpy inputs in numpy.
+    """
 
     def __init__(self, input_shape, norm_axes=1, beta=0.99999, per_element_update=False, epsilon=1e-5,
                  device=torch.device("cpu")):
@@ -18,30 +23,46 @@ class ValueNorm(nn.Module):
         self.per_element_update = per_element_update
         self.tpdv = dict(dtype=torch.float32, device=device)
 
-        self.running_mean = nn.Parameter(torch.zeros(input_shape), requires_grad=False).to(**self.tpdv)
-        self.running_mean_sq = nn.Parameter(torch.zeros(input_shape), requires_grad=False).to(**self.tpdv)
-        self.debiasing_term = nn.Parameter(torch.tensor(0.0), requires_grad=False).to(**self.tpdv)
+        self.register_buffer("running_mean", torch.zeros(input_shape, **self.tpdv))
+        self.register_buffer("running_mean_sq", torch.zeros(input_shape, **self.tpdv))
+        self.register_buffer("debiasing_term", torch.tensor(0.0, **self.tpdv))
 
         self.reset_parameters()
 
-        self.updated = False
+    @property
+    def updated(self):
+        return bool(self.debiasing_term > 0)
 
     def reset_parameters(self):
         self.running_mean.zero_()
         self.running_mean_sq.zero_()
         self.debiasing_term.zero_()
 
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict,
+                              missing_keys, unexpected_keys, error_msgs):
+        # model weights saved before the normalizer was part of the model have no statistics,
+        # those keep the ones of the fresh normalizer instead of failing the strict load
+        for name, buffer in self._buffers.items():
+            state_dict.setdefault(prefix + name, buffer)
+        super(ValueNorm, self)._load_from_state_dict(state_dict, prefix, local_metadata, strict,
+                                                     missing_keys, unexpected_keys, error_msgs)
+
     def running_mean_var(self):
         debiased_mean = self.running_mean / self.debiasing_term.clamp(min=self.epsilon)
         debiased_mean_sq = self.running_mean_sq / self.debiasing_term.clamp(min=self.epsilon)
         debiased_var = (debiased_mean_sq - debiased_mean ** 2).clamp(min=1e-2)
         return debiased_mean, debiased_var
 
+    def _mean_std(self, input_vector):
+        # statistics next to the input: numpy for numpy, on the input's device for tensors
+        mean, var = self.running_mean_var()
+        std = torch.sqrt(var)
+        if isinstance(input_vector, np.ndarray):
+            return mean.cpu().numpy(), std.cpu().numpy()
+        return mean.to(input_vector.device), std.to(input_vector.device)
+
     @torch.no_grad()
     def update(self, input_vector):
-
-        self.updated = True
-
         if type(input_vector) == np.ndarray:
             input_vector = torch.from_numpy(input_vector)
         input_vector = input_vector.to(**self.tpdv)
@@ -60,26 +81,37 @@ class ValueNorm(nn.Module):
         self.debiasing_term.mul_(weight).add_(1.0 * (1.0 - weight))
 
     def normalize(self, input_vector):
-        # Make sure input is float32
-        if type(input_vector) == np.ndarray:
-            input_vector = torch.from_numpy(input_vector)
-        input_vector = input_vector.to(**self.tpdv)
-
-        mean, var = self.running_mean_var()
-        out = (input_vector - mean[(None,) * self.norm_axes]) / torch.sqrt(var)[(None,) * self.norm_axes]
+        mean, std = self._mean_std(input_vector)
+        out = (input_vector - mean[(None,) * self.norm_axes]) / std[(None,) * self.norm_axes]
 
-        return out.reshape(shape=input_vector.shape)
+        return out.reshape(input_vector.shape)
 
     def denormalize(self, input_vector):
         """ Transform normalized data back into original distribution """
-        if type(input_vector) == np.ndarray:
-            input_vector = torch.from_numpy(input_vector)
-        input_vector = input_vector.to(**self.tpdv)
+        mean, std = self._mean_std(input_vector)
+        out = input_vector * std[(None,) * self.norm_axes] + mean[(None,) * self.norm_axes]
 
-        mean, var = self.running_mean_var()
-        out = input_vector * torch.sqrt(var)[(None,) * self.norm_axes] + mean[(None,) * self.norm_axes]
+        return out.reshape(input_vector.shape)
 
-        out = out.cpu().numpy()
 
-        # return out
-        return out.reshape(input_vector.shape)
+def setup_value_normalizer(policy, obs_space, action_space, config):
+    """before_loss_init of the policies with a value normalizer, after rllib's ppo mixins.
+
+    Every model tower gets its own normalizer as a submodule (value_normalizer), on the
+    tower's device. algo_args["value_norm"] picks ValueNorm ("valuenorm") or PopArt ("popart"),
+    PopArt rescales the last layer of the tower's central value function.
+    """
+    from ray.rllib.agents.ppo.ppo_torch_policy import setup_mixins
+    from marl.algos.utils.popart import PopArt
+
+    setup_mixins(policy, obs_space, action_space, config)
+
+    value_norm = config["model"]["custom_model_config"].get("algo_args", {}).get("value_norm", "valuenorm")
+    for model in getattr(policy, "model_gpu_towers", None) or [policy.model]:
+        device = next(model.parameters()).device
+        if value_norm == "popart":
+            model.value_normalizer = PopArt(1, value_layer=model.central_vf[-1], device=device)
+        elif value_norm == "valuenorm":
+            model.value_normalizer = ValueNorm(1, device=device)
+        else:
+            raise ValueError("Unknown value_norm {}, valuenorm or popart".format(value_norm))
@@ -2,6 +2,7 @@ import yaml
 import os
 import sys
 import collections
+from tabulate import tabulate
 
 algo_type_dict = {
     "IL": ["a2c", "a3c", "pg", "ddpg", "trpo", "ppo"],
@@ -65,3 +66,26 @@ def recursive_dict_update(d, u):
         else:
             d[k] = v
     return d
+
+
+def get_env_class(env_registry, env_name):
+    if env_name not in env_registry:
+        raise ValueError("environment \"{}\" not registered yet".format(env_name))
+    env_class = env_registry[env_name]
+    if isinstance(env_class, str):  # error
+        raise ValueError(
+            "environment \"{}\" not installed properly, error log: {}\n"
+            "run marl/main.py --check-envs to see the status of all environments".format(env_name, env_class))
+    return env_class
+
+
+def check_env_registry(env_registry):
+    env_reg_ls = []
+    for env_n, status, error_log, module_path in env_registry.check_all():
+        info = [env_n, status, error_log, "envs/base_env/config/{}.yaml".format(env_n),
+                "{}.py".format(module_path.replace(".", "/"))]
+        env_reg_ls.append(info)
+
+    print(tabulate(env_reg_ls,
+                   headers=['Env_Name', 'Check_Status', "Error_Log", "Config_File_Location", "Env_File_Location"],
+                   tablefmt='grid'))
@@ -2,7 +2,7 @@ import yaml
 import os
 import sys
 from copy import deepcopy
-from marl.common import _get_config, recursive_dict_update, check_algo_type
+from marl.common import _get_config, recursive_dict_update, check_algo_type, check_env_registry
 from marl.algos.run_il import run_il
 from marl.algos.run_vd import run_vd
 from marl.algos.run_cc import run_cc
@@ -10,6 +10,14 @@ from marl.algos.run_cc import run_cc
 if __name__ == '__main__':
     params = deepcopy(sys.argv)
 
+    # probe every registered environment and print the status table
+    if "--check-envs" in params:
+        from envs.base_env import ENV_REGISTRY
+        from envs.global_reward_env import COOP_ENV_REGISTRY
+        check_env_registry(ENV_REGISTRY)
+        check_env_registry(COOP_ENV_REGISTRY)
+        sys.exit(0)
+
     with open(os.path.join(os.path.dirname(__file__), "ray.yaml"), "r") as f:
         config_dict = yaml.load(f, Loader=yaml.FullLoader)
         f.close()
@@ -13,6 +13,24 @@ tf1, tf, tfv = try_import_tf()
 torch, nn = try_import_torch()
 
 
+def image_channels(image_shape, channels_first=False):
+    # conv in_channels of a [H, W, C] image, or of a [C, H, W] one with env_args.channels_first
+    return image_shape[0] if channels_first else image_shape[2]
+
+
+def to_conv_layout(x, image_shape, channels_first=False):
+    """[..., *image_shape] -> [N, C, H, W] input of the conv encoders.
+
+    With env_args.channels_first the env writes its images as [C, H, W], and this is a
+    plain reshape of the flat obs, without the permute (and the copy conv2d then makes
+    of the permuted tensor).
+    """
+    x = x.reshape((-1,) + tuple(image_shape))
+    if channels_first:
+        return x
+    return x.permute(0, 3, 1, 2)
+
+
 class Base_RNN(TorchRNN, nn.Module):
 
     def __init__(
@@ -31,11 +49,21 @@ class Base_RNN(TorchRNN, nn.Module):
         # judge the model arch
         self.custom_config = model_config["custom_model_config"]
         self.full_obs_space = getattr(obs_space, "original_space", obs_space)
+        self.channels_first = self.custom_config.get("channels_first", False)
+
+        # team level obs of [team_size, *unit_obs_shape] plus an alive mask (magent team_batch),
+        # every unit goes through the encoder and rnn on its own, the team is one forward pass
+        if "alive" in self.full_obs_space.spaces:
+            self.team_size = self.full_obs_space["alive"].shape[0]
+            unit_obs_shape = self.full_obs_space['obs'].shape[1:]
+        else:
+            self.team_size = None
+            unit_obs_shape = self.full_obs_space['obs'].shape
 
         # encoder
         layers = []
         if "fc_layer" in self.custom_config["model_arch_args"]:
-            self.obs_size = self.full_obs_space['obs'].shape[0]
+            self.obs_size = unit_obs_shape[0]
             input_dim = self.obs_size
             for i in range(self.custom_config["model_arch_args"]["fc_layer"]):
                 out_dim = self.custom_config["model_arch_args"]["out_dim_fc_{}".format(i)]
@@ -43,8 +71,8 @@ class Base_RNN(TorchRNN, nn.Module):
                 layers.append(fc_layer)
                 input_dim = out_dim
         elif "conv_layer" in self.custom_config["model_arch_args"]:
-            self.obs_size = self.full_obs_space['obs'].shape
-            input_dim = self.obs_size[2]
+            self.obs_size = unit_obs_shape
+            input_dim = image_channels(self.obs_size, self.channels_first)
             for i in range(self.custom_config["model_arch_args"]["conv_layer"]):
                 conv_f = nn.Conv2d(
                     in_channels=input_dim,
@@ -86,7 +114,8 @@ class Base_RNN(TorchRNN, nn.Module):
             raise ValueError()
 
         # action branch and value branch
-        self.action_branch = nn.Linear(self.hidden_state_size, num_outputs)
+        # in team mode num_outputs holds the logits of all units
+        self.action_branch = nn.Linear(self.hidden_state_size, num_outputs // (self.team_size or 1))
         self.value_branch = nn.Linear(self.input_dim, 1)
 
         # Holds the current "base" output (before logits layer).
@@ -102,14 +131,16 @@ class Base_RNN(TorchRNN, nn.Module):
     @override(ModelV2)
     def get_initial_state(self):
         # Place hidden states on same device as model.
+        # in team mode the hidden states of all units are concatenated
+        state_size = self.hidden_state_size * (self.team_size or 1)
         if self.custom_config["model_arch_args"]["core_arch"] == "gru":
             h = [
-                self.value_branch.weight.new(1, self.hidden_state_size).zero_().squeeze(0),
+                self.value_branch.weight.new(1, state_size).zero_().squeeze(0),
             ]
         else:  # lstm
             h = [
-                self.value_branch.weight.new(1, self.hidden_state_size).zero_().squeeze(0),
-                self.value_branch.weight.new(1, self.hidden_state_size).zero_().squeeze(0)
+                self.value_branch.weight.new(1, state_size).zero_().squeeze(0),
+                self.value_branch.weight.new(1, state_size).zero_().squeeze(0)
             ]
         return h
 
@@ -120,14 +151,18 @@ class Base_RNN(TorchRNN, nn.Module):
         L = self._features.shape[1]
         # Compute the unmasked logits.
         if "conv_layer" in self.custom_config["model_arch_args"]:
-            x = self.inputs.reshape(-1, self.inputs.shape[2], self.inputs.shape[3], self.inputs.shape[4]).permute(0, 3,
-                                                                                                                  1, 2)
+            x = to_conv_layout(self.inputs, self.obs_size, self.channels_first)
             x = self.vf_encoder(x)
             x = torch.mean(x, (2, 3))
-            x = x.reshape(self.inputs.shape[0], self.inputs.shape[1], -1)
+            x = x.reshape(tuple(self.inputs.shape[:-3]) + (-1,))
         else:
             x = self.vf_encoder(self.inputs)
 
+        if self.team_size:
+            # team value from the mean feature of the alive units
+            alive = self.alive.unsqueeze(-1)
+            x = (x * alive).sum(-2) / alive.sum(-2).clamp(min=1.0)
+
         if self.q_flag:
             return torch.reshape(self.value_branch(x), [B * L, -1])
         else:
@@ -144,7 +179,7 @@ class Base_RNN(TorchRNN, nn.Module):
             flat_inputs = input_dict["obs"]["obs"].float()
             # Convert action_mask into a [0.0 || -inf]-type mask.
             if self.custom_config["mask_flag"]:
-                action_mask = input_dict["obs"]["action_mask"]
+                action_mask = input_dict["obs"]["action_mask"].float()
                 inf_mask = torch.clamp(torch.log(action_mask), min=FLOAT_MIN)
         else:
             flat_inputs = input_dict["obs"]["obs"].float()
@@ -160,12 +195,29 @@ class Base_RNN(TorchRNN, nn.Module):
             framework="torch",
             time_major=self.time_major,
         )
+        if self.team_size:
+            self.alive = add_time_dimension(
+                input_dict["obs"]["alive"].float(),
+                max_seq_len=max_seq_len,
+                framework="torch",
+                time_major=self.time_major,
+            )
         output, new_state = self.forward_rnn(inputs, state, seq_lens)
         output = torch.reshape(output, [-1, self.num_outputs])
 
         if self.custom_config["mask_flag"]:
             output = output + inf_mask
 
+        if self.team_size:
+            # dead units and padding slots always take action 0, so that their actions add
+            # nothing to the logp ratio and the entropy of the team
+            n_actions = self.num_outputs // self.team_size
+            output = output.reshape(-1, self.team_size, n_actions)
+            fixed_action = torch.full_like(output, -1e10)
+            fixed_action[..., 0] = 0.0
+            alive = input_dict["obs"]["alive"].float().reshape(-1, self.team_size, 1)
+            output = torch.where(alive > 0, output, fixed_action).reshape(-1, self.num_outputs)
+
         return output, new_state
 
     @override(TorchRNN)
@@ -174,30 +226,42 @@ class Base_RNN(TorchRNN, nn.Module):
 
         # Compute the unmasked logits.
         if "conv_layer" in self.custom_config["model_arch_args"]:
-            x = inputs.reshape(-1, inputs.shape[2], inputs.shape[3], inputs.shape[4]).permute(0, 3, 1, 2)
+            x = to_conv_layout(inputs, self.obs_size, self.channels_first)
             x = self.encoder(x)
             x = torch.mean(x, (2, 3))
-            x = x.reshape(inputs.shape[0], inputs.shape[1], -1)
+            x = x.reshape(tuple(inputs.shape[:-3]) + (-1,))
         else:
             x = self.encoder(inputs)
 
         x = nn.functional.relu(x)
 
+        if self.team_size:
+            # [B, T, N, F] -> [B * N, T, F], one rnn sequence per unit
+            B, T, N = x.shape[:3]
+            x = x.transpose(1, 2).reshape(B * N, T, -1)
+            state = [s.reshape(B * N, self.hidden_state_size) for s in state]
+
         if self.custom_config["model_arch_args"]["core_arch"] == "gru":
             self._features, h = self.rnn(x, torch.unsqueeze(state[0], 0))
             logits = self.action_branch(self._features)
-            return logits, [torch.squeeze(h, 0)]
+            new_state = [torch.squeeze(h, 0)]
 
         elif self.custom_config["model_arch_args"]["core_arch"] == "lstm":
             self._features, [h, c] = self.rnn(
                 x, [torch.unsqueeze(state[0], 0),
                     torch.unsqueeze(state[1], 0)])
             logits = self.action_branch(self._features)
-            return logits, [torch.squeeze(h, 0), torch.squeeze(c, 0)]
+            new_state = [torch.squeeze(h, 0), torch.squeeze(c, 0)]
 
         else:
             raise ValueError("rnn core_arch wrong: {}".format(self.custom_config["model_arch_args"]["core_arch"]))
 
+        if self.team_size:
+            # MultiDiscrete logits of the team, [B, T, N * n_actions]
+            logits = logits.reshape(B, N, T, -1).transpose(1, 2).reshape(B, T, -1)
+            new_state = [s.reshape(B, N * self.hidden_state_size) for s in new_state]
+        return logits, new_state
+
     def actor_parameters(self):
         # return [list(m.parameters()) for m in [self.fc1, self.gru, self.action_branch]]
         return reduce(lambda x, y: x + y, map(lambda p: list(p.parameters()), self.actors))
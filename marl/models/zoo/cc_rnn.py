@@ -1,6 +1,6 @@
 from gym.spaces import Box
 from ray.rllib.utils.framework import try_import_tf, try_import_torch
-from marl.models.base.base_rnn import Base_RNN
+from marl.models.base.base_rnn import Base_RNN, image_channels, to_conv_layout
 import copy
 from ray.rllib.utils.annotations import override
 from functools import reduce
@@ -25,15 +25,25 @@ class CC_RNN(Base_RNN):
 
         # extra encoder for centralized VF
         input_dim = self.input_dim
-        if "state" not in self.full_obs_space.spaces:
+        # with share_global_state the state is out of the obs space and run_cc passes its space
+        state_space = self.full_obs_space.spaces.get("state")
+        if state_space is None and self.custom_config.get("share_global_state", False):
+            state_space = self.custom_config["space_state"]
+        if state_space is None:
             self.state_dim = self.full_obs_space["obs"].shape
             self.cc_encoder = copy.deepcopy(self.encoder)
             cc_input_dim = input_dim * self.custom_config["num_agents"]
         else:
-            self.state_dim = self.full_obs_space["state"].shape
+            self.state_dim = state_space.shape
             if len(self.state_dim) > 1:  # env return a 3D global state
                 cc_layers = []
-                self.state_dim_last = self.full_obs_space["state"].shape[2] + self.full_obs_space["obs"].shape[2]
+                # obs and state channels stacked, the flat state of the postprocessing
+                self.state_dim_last = image_channels(state_space.shape, self.channels_first) + \
+                                      image_channels(self.full_obs_space["obs"].shape, self.channels_first)
+                if self.channels_first:
+                    self.cc_image_shape = (self.state_dim_last,) + tuple(self.state_dim[1:])
+                else:
+                    self.cc_image_shape = tuple(self.state_dim[:2]) + (self.state_dim_last,)
                 cc_input_dim = self.state_dim_last
                 for i in range(self.custom_config["model_arch_args"]["conv_layer"]):
                     cc_conv_f = nn.Conv2d(
@@ -55,7 +65,7 @@ class CC_RNN(Base_RNN):
 
             else:
                 cc_layers = []
-                cc_input_dim = self.full_obs_space["state"].shape[0] + self.full_obs_space["obs"].shape[0]
+                cc_input_dim = state_space.shape[0] + self.full_obs_space["obs"].shape[0]
                 for i in range(self.custom_config["model_arch_args"]["fc_layer"]):
                     cc_out_dim = self.custom_config["model_arch_args"]["out_dim_fc_{}".format(i)]
                     cc_fc_layer = nn.Linear(cc_input_dim, cc_out_dim)
@@ -88,10 +98,12 @@ class CC_RNN(Base_RNN):
             )
 
     def central_value_function(self, state, opponent_actions=None):
+        # uint8/float16 states of compact observation envs
+        state = state.float()
         B = state.shape[0]
 
         if "conv_layer" in self.custom_config["model_arch_args"]:
-            x = state.reshape(-1, self.state_dim[0], self.state_dim[1], self.state_dim_last).permute(0, 3, 1, 2)
+            x = to_conv_layout(state, self.cc_image_shape, self.channels_first)
             x = self.cc_encoder(x)
             x = torch.mean(x, (2, 3))
         else:
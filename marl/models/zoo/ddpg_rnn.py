@@ -7,6 +7,7 @@ from ray.rllib.utils.annotations import override
 from ray.rllib.utils.framework import try_import_tf, try_import_torch, \
     TensorType
 from ray.rllib.policy.rnn_sequencing import add_time_dimension
+from marl.models.base.base_rnn import image_channels, to_conv_layout
 from marl.models.zoo.mixers import QMixer, VDNMixer
 
 tf1, tf, tfv = try_import_tf()
@@ -47,7 +48,7 @@ class DDPG_RNN(TorchRNN, nn.Module):
                 input_dim = out_dim
         elif "conv_layer" in self.custom_config["model_arch_args"]:
             self.obs_size = self.full_obs_space['obs'].shape
-            input_dim = self.obs_size[2]
+            input_dim = image_channels(self.obs_size, self.custom_config.get("channels_first", False))
             for i in range(self.custom_config["model_arch_args"]["conv_layer"]):
                 conv_f = nn.Conv2d(
                     in_channels=input_dim,
@@ -147,7 +148,7 @@ class DDPG_RNN(TorchRNN, nn.Module):
 
         # Convert action_mask into a [0.0 || -inf]-type mask.
         if self.custom_config["mask_flag"]:
-            action_mask = input_dict["obs"]["action_mask"]
+            action_mask = input_dict["obs"]["action_mask"].float()
             inf_mask = torch.clamp(torch.log(action_mask), min=FLOAT_MIN)
 
         if isinstance(seq_lens, np.ndarray):
@@ -235,9 +236,7 @@ class DDPG_RNN(TorchRNN, nn.Module):
 
         else:
             if "conv_layer" in self.custom_config["model_arch_args"]:
-                x = obs_inputs.reshape(-1, obs_inputs.shape[2], obs_inputs.shape[3], obs_inputs.shape[4]).permute(0, 3,
-                                                                                                                  1,
-                                                                                                                  2)
+                x = to_conv_layout(obs_inputs, self.obs_size, self.custom_config.get("channels_first", False))
                 x = self.encoder(x)
                 x = torch.mean(x, (2, 3))
                 x = x.reshape(obs_inputs.shape[0], obs_inputs.shape[1], -1)
@@ -3,6 +3,7 @@ from ray.rllib.models.torch.torch_modelv2 import TorchModelV2
 from ray.rllib.utils.annotations import override
 from ray.rllib.utils.framework import try_import_torch
 from ray.rllib.models.preprocessors import get_preprocessor
+from marl.models.base.base_rnn import image_channels, to_conv_layout
 
 torch, nn = try_import_torch()
 
@@ -33,7 +34,7 @@ class JointQ_RNN(TorchModelV2, nn.Module):
                 layers.append(fc_layer)
                 input_dim = out_dim
         elif "conv_layer" in custom_config["model_arch_args"]:
-            input_dim = obs_space.shape[2]
+            input_dim = image_channels(obs_space.shape, custom_config.get("channels_first", False))
             for i in range(custom_config["model_arch_args"]["conv_layer"]):
                 conv_f = nn.Conv2d(
                     in_channels=input_dim,
@@ -86,7 +87,7 @@ class JointQ_RNN(TorchModelV2, nn.Module):
         # x = nn.functional.relu(self.encoder(input_dict["obs_flat"].float()))
         # Compute the unmasked logits.
         if "conv_layer" in self.custom_config["model_arch_args"]:
-            x = inputs.reshape(-1, self.raw_state_dim[0], self.raw_state_dim[1], self.raw_state_dim[2]).permute(0, 3, 1, 2)
+            x = to_conv_layout(inputs, self.raw_state_dim, self.custom_config.get("channels_first", False))
             x = self.encoder(x)
             x = torch.mean(x, (2, 3))
             x = x.reshape(inputs.shape[0], -1)
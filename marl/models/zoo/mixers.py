@@ -1,4 +1,5 @@
 from ray.rllib.utils.framework import try_import_torch
+from marl.models.base.base_rnn import image_channels, to_conv_layout
 
 torch, nn = try_import_torch()
 
@@ -21,7 +22,7 @@ class QMixer(nn.Module):
         self.embed_dim = custom_config["model_arch_args"]["mixer_embedding"]
         if len(state_dim) > 2:  # conv the state
             layers = []
-            input_dim = state_dim[2]
+            input_dim = image_channels(state_dim, custom_config.get("channels_first", False))
             for i in range(custom_config["model_arch_args"]["conv_layer"]):
                 conv_f = nn.Conv2d(
                     in_channels=input_dim,
@@ -69,23 +70,23 @@ class QMixer(nn.Module):
         """Forward pass for the mixer.
         """
         bs = agent_qs.size(0)
+        states = states.float()
 
         if self.extra_encoder:
             if self.custom_config["global_state_flag"]:
-                x = states.reshape(-1, self.raw_state_dim[0], self.raw_state_dim[1],
-                                   self.raw_state_dim[2]).permute(0, 3, 1, 2)
+                x = to_conv_layout(states, self.raw_state_dim, self.custom_config.get("channels_first", False))
                 x = self.extra_encoder(x)
                 x = torch.mean(x, (2, 3))
                 states = x.reshape(-1, self.state_dim)
             else:
                 # for offpolicy the state size is 4
                 if len(states.shape) == 4:
-                    x = states.permute(2, 0, 1, 3).reshape(-1, self.raw_state_dim[0], self.raw_state_dim[1],
-                                                           self.raw_state_dim[2]).permute(0, 3, 1, 2)
+                    x = to_conv_layout(states.permute(2, 0, 1, 3), self.raw_state_dim,
+                                       self.custom_config.get("channels_first", False))
                 elif len(states.shape) == 3:
                     # for onpolicy the state size is 3
-                    x = states.permute(1, 0, 2).reshape(-1, self.raw_state_dim[0], self.raw_state_dim[1],
-                                                        self.raw_state_dim[2]).permute(0, 3, 1, 2)
+                    x = to_conv_layout(states.permute(1, 0, 2), self.raw_state_dim,
+                                       self.custom_config.get("channels_first", False))
 
                 else:
                     raise ValueError("wrong state shape")
@@ -165,6 +165,9 @@ class HanabiEnv(Environment):
 
         self.game = pyhanabi.HanabiGame(config)
         self.obs_instead_of_state = env_config["use_obs_instead_of_state"]
+        # reset/step only return the vectorized encodings and the legal move mask, build them
+        # straight from the backend instead of going through the full per player dicts
+        self.vector_obs_only = env_config.get("vector_obs_only", True)
 
         self.observation_encoder = pyhanabi.ObservationEncoder(
             self.game, pyhanabi.ObservationEncoderType.CANONICAL)
@@ -291,6 +294,9 @@ class HanabiEnv(Environment):
             while self.state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
                 self.state.deal_random_card()
 
+            if self.vector_obs_only:
+                return self._make_vectorized_observation()
+
             observation = self._make_observation_all_players()
             current_player = self.state.cur_player()
             observation["current_player"] = current_player
@@ -478,23 +484,26 @@ class HanabiEnv(Environment):
         while self.state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
             self.state.deal_random_card()
 
-        observation = self._make_observation_all_players()
-        current_player = self.state.cur_player()
-        player_observations = observation['player_observations']
+        if self.vector_obs_only:
+            obs, share_obs, available_actions = self._make_vectorized_observation()
+        else:
+            observation = self._make_observation_all_players()
+            current_player = self.state.cur_player()
+            player_observations = observation['player_observations']
 
-        available_actions = np.zeros(self.num_moves())
-        available_actions[player_observations[current_player]['legal_moves_as_int']] = 1.0
+            available_actions = np.zeros(self.num_moves())
+            available_actions[player_observations[current_player]['legal_moves_as_int']] = 1.0
 
-        agent_turn = np.zeros(self.players, dtype=np.int).tolist()
-        agent_turn[current_player] = 1
+            agent_turn = np.zeros(self.players, dtype=np.int).tolist()
+            agent_turn[current_player] = 1
 
-        obs = player_observations[current_player]['vectorized'] + agent_turn
-        if self.obs_instead_of_state:
-            share_obs = [player_observations[i]['vectorized'] for i in range(self.players)]
-            concat_obs = np.concatenate(share_obs, axis=0)
-            share_obs = np.concatenate((concat_obs, agent_turn), axis=0)
-        else:
-            share_obs = player_observations[current_player]['vectorized_ownhand'] + player_observations[current_player]['vectorized'] + agent_turn
+            obs = player_observations[current_player]['vectorized'] + agent_turn
+            if self.obs_instead_of_state:
+                share_obs = [player_observations[i]['vectorized'] for i in range(self.players)]
+                concat_obs = np.concatenate(share_obs, axis=0)
+                share_obs = np.concatenate((concat_obs, agent_turn), axis=0)
+            else:
+                share_obs = player_observations[current_player]['vectorized_ownhand'] + player_observations[current_player]['vectorized'] + agent_turn
 
         done = self.state.is_terminal()
         # Reward is score differential. May be large and negative at game end.
@@ -504,6 +513,36 @@ class HanabiEnv(Environment):
 
         return obs, share_obs, rewards, done, infos, available_actions
 
+    def _make_vectorized_observation(self):
+        """Make obs, share_obs and legal move mask of the current player.
+
+        Same values as building them from _make_observation_all_players, but only the
+        observations that are needed are encoded, and no legal_moves, observed_hands,
+        discard_pile or card_knowledge dicts are built.
+
+        Returns:
+          obs, share_obs, available_actions: 1-D arrays.
+        """
+        current_player = self.state.cur_player()
+        agent_turn = np.zeros(self.players, dtype=np.float32)
+        agent_turn[current_player] = 1
+
+        observation = self.state.observation(current_player)
+        available_actions = np.zeros(self.num_moves())
+        available_actions[observation.legal_move_uids()] = 1.0
+
+        vectorized = self.observation_encoder.encode_array(observation)
+        obs = np.concatenate((vectorized, agent_turn))
+        if self.obs_instead_of_state:
+            share_obs = [vectorized if player_id == current_player else
+                         self.observation_encoder.encode_array(self.state.observation(player_id))
+                         for player_id in range(self.players)]
+            share_obs = np.concatenate(share_obs + [agent_turn])
+        else:
+            share_obs = np.concatenate(
+                (self.observation_encoder.encodeownhand_array(observation), vectorized, agent_turn))
+        return obs, share_obs, available_actions
+
     def _make_observation_all_players(self):
         """Make observation for all players.
 
@@ -0,0 +1,64 @@
+"""Steps/sec of HanabiEnv with and without vector_obs_only, and of num_states games
+stepped together by pyhanabi.HanabiStateBatch.
+
+    python -m patch.hanabi.benchmark --map_name Hanabi-Full --num_agents 2 --steps 20000 --num_states 64
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from patch.hanabi import pyhanabi
+from patch.hanabi.Hanabi_Env import HanabiEnv
+
+
+def steps_per_sec(env_config, steps, seed=0):
+    env = HanabiEnv(env_config, seed)
+    rng = np.random.RandomState(seed)
+    _, _, available_actions = env.reset()
+    start = time.time()
+    for _ in range(steps):
+        action = rng.choice(np.nonzero(available_actions)[0])
+        _, _, _, done, _, available_actions = env.step([action])
+        if done:
+            _, _, available_actions = env.reset()
+    return steps / (time.time() - start)
+
+
+def batch_steps_per_sec(env_config, num_states, steps, seed=0):
+    env = HanabiEnv(env_config, seed)
+    batch = pyhanabi.HanabiStateBatch(env.game, num_states, env.observation_encoder,
+                                      all_players=env.obs_instead_of_state,
+                                      ownhand=not env.obs_instead_of_state)
+    rng = np.random.RandomState(seed)
+    start = time.time()
+    for _ in range(steps // num_states):
+        _, _, legal_moves, _ = batch.encode()
+        # a random legal move per game
+        _, dones = batch.apply_moves(np.argmax((rng.rand(*legal_moves.shape) + 1) * legal_moves, axis=1))
+        if dones.any():
+            batch.reset(dones)
+    return steps // num_states * num_states / (time.time() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--map_name", type=str, default="Hanabi-Full")
+    parser.add_argument("--num_agents", type=int, default=2)
+    parser.add_argument("--use_obs_instead_of_state", action="store_true")
+    parser.add_argument("--steps", type=int, default=20000)
+    parser.add_argument("--num_states", type=int, default=64)
+    args = parser.parse_args()
+
+    for vector_obs_only in [False, True]:
+        env_config = {
+            "map_name": args.map_name,
+            "num_agents": args.num_agents,
+            "use_obs_instead_of_state": args.use_obs_instead_of_state,
+            "vector_obs_only": vector_obs_only,
+        }
+        print("vector_obs_only={}: {:.0f} steps/sec".format(
+            vector_obs_only, steps_per_sec(env_config, args.steps)))
+    print("HanabiStateBatch num_states={}: {:.0f} steps/sec".format(
+        args.num_states, batch_steps_per_sec(env_config, args.num_states, args.steps)))
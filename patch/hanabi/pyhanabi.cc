@@ -14,6 +14,7 @@
 
 #include "pyhanabi.h"
 
+#include <algorithm>
 #include <cstdlib>
 #include <cstring>
 #include <iostream>
@@ -894,4 +895,139 @@ char* EncodeOwnHandObservation(pyhanabi_observation_encoder_t* encoder,
   return strdup(obs_str.c_str());
 }
 
+/* Wrapper definitions for a batch of HanabiStates of the same game. */
+namespace {
+
+void DealChanceCards(hanabi_learning_env::HanabiState* state) {
+  while (state->CurPlayer() == hanabi_learning_env::kChancePlayerId) {
+    state->ApplyRandomChance();
+  }
+}
+
+void CopyEncoding(const std::vector<int>& encoding, float* out) {
+  for (int i = 0; i < encoding.size(); i++) {
+    out[i] = static_cast<float>(encoding[i]);
+  }
+}
+
+}  // namespace
+
+void NewStateBatch(pyhanabi_game_t* game, int num_states,
+                   pyhanabi_state_batch_t* batch) {
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  REQUIRE(batch != nullptr);
+  REQUIRE(num_states > 0);
+  auto hanabi_game =
+      reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game);
+  auto states = new std::vector<hanabi_learning_env::HanabiState>();
+  states->reserve(num_states);
+  for (int i = 0; i < num_states; i++) {
+    states->emplace_back(hanabi_game);
+    DealChanceCards(&states->back());
+  }
+  batch->states = states;
+  batch->num_states = num_states;
+}
+
+void DeleteStateBatch(pyhanabi_state_batch_t* batch) {
+  REQUIRE(batch != nullptr);
+  REQUIRE(batch->states != nullptr);
+  delete reinterpret_cast<std::vector<hanabi_learning_env::HanabiState>*>(
+      batch->states);
+  batch->states = nullptr;
+  batch->num_states = 0;
+}
+
+void StateBatchReset(pyhanabi_state_batch_t* batch, const int* reset_mask) {
+  REQUIRE(batch != nullptr);
+  REQUIRE(batch->states != nullptr);
+  auto& states =
+      *reinterpret_cast<std::vector<hanabi_learning_env::HanabiState>*>(
+          batch->states);
+  for (int i = 0; i < batch->num_states; i++) {
+    if (reset_mask != nullptr && !reset_mask[i]) {
+      continue;
+    }
+    states[i] = hanabi_learning_env::HanabiState(states[i].ParentGame());
+    DealChanceCards(&states[i]);
+  }
+}
+
+void StateBatchApplyMoves(pyhanabi_state_batch_t* batch, const int* move_uids,
+                          int* rewards, int* dones) {
+  REQUIRE(batch != nullptr);
+  REQUIRE(batch->states != nullptr);
+  REQUIRE(move_uids != nullptr);
+  auto& states =
+      *reinterpret_cast<std::vector<hanabi_learning_env::HanabiState>*>(
+          batch->states);
+  for (int i = 0; i < batch->num_states; i++) {
+    auto& state = states[i];
+    // A negative uid leaves the state as it is, e.g. for finished games.
+    if (move_uids[i] >= 0) {
+      int last_score = state.Score();
+      state.ApplyMove(state.ParentGame()->GetMove(move_uids[i]));
+      DealChanceCards(&state);
+      rewards[i] = state.Score() - last_score;
+    } else {
+      rewards[i] = 0;
+    }
+    dones[i] = state.IsTerminal();
+  }
+}
+
+void StateBatchEncode(pyhanabi_state_batch_t* batch,
+                      pyhanabi_observation_encoder_t* encoder, int all_players,
+                      int* cur_players, float* obs, float* ownhand_obs,
+                      float* legal_moves) {
+  REQUIRE(batch != nullptr);
+  REQUIRE(batch->states != nullptr);
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  auto& states =
+      *reinterpret_cast<std::vector<hanabi_learning_env::HanabiState>*>(
+          batch->states);
+  auto obs_enc = reinterpret_cast<hanabi_learning_env::ObservationEncoder*>(
+      encoder->encoder);
+  auto game = states[0].ParentGame();
+  int num_players = game->NumPlayers();
+  int max_moves = game->MaxMoves();
+  int obs_size = obs_enc->Shape()[0];
+  int ownhand_size = obs_enc->OwnHandShape()[0];
+  for (int i = 0; i < batch->num_states; i++) {
+    const auto& state = states[i];
+    int cur_player = state.CurPlayer();
+    cur_players[i] = cur_player;
+
+    // obs of every player (num_players * obs_size per state) or of the
+    // current player only.
+    hanabi_learning_env::HanabiObservation cur_observation(state, cur_player);
+    if (all_players) {
+      for (int pid = 0; pid < num_players; pid++) {
+        float* out = obs + (i * num_players + pid) * obs_size;
+        if (pid == cur_player) {
+          CopyEncoding(obs_enc->Encode(cur_observation), out);
+        } else {
+          CopyEncoding(
+              obs_enc->Encode(hanabi_learning_env::HanabiObservation(state, pid)),
+              out);
+        }
+      }
+    } else {
+      CopyEncoding(obs_enc->Encode(cur_observation), obs + i * obs_size);
+    }
+    if (ownhand_obs != nullptr) {
+      CopyEncoding(obs_enc->EncodeOwnHand(cur_observation),
+                   ownhand_obs + i * ownhand_size);
+    }
+
+    float* mask = legal_moves + i * max_moves;
+    std::fill(mask, mask + max_moves, 0.0f);
+    for (const auto& move : cur_observation.LegalMoves()) {
+      mask[game->GetMoveUid(move)] = 1.0f;
+    }
+  }
+}
+
 } /* extern "C" */
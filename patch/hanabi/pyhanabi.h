@@ -63,6 +63,12 @@ typedef struct PyHanabiObservationEncoder {
   void* encoder;
 } pyhanabi_observation_encoder_t;
 
+typedef struct PyHanabiStateBatch {
+  /* Points to a std::vector<hanabi_learning_env::HanabiState>. */
+  void* states;
+  int num_states;
+} pyhanabi_state_batch_t;
+
 /* Utility Functions. */
 void DeleteString(char* str);
 
@@ -192,6 +198,19 @@ char* EncodeObservation(pyhanabi_observation_encoder_t* encoder,
 char* EncodeOwnHandObservation(pyhanabi_observation_encoder_t* encoder,
                         pyhanabi_observation_t* observation);
 
+/* StateBatch functions, one call covers all states of the batch.
+ * Arrays are row major with num_states rows, see pyhanabi.HanabiStateBatch. */
+void NewStateBatch(pyhanabi_game_t* game, int num_states,
+                   pyhanabi_state_batch_t* batch);
+void DeleteStateBatch(pyhanabi_state_batch_t* batch);
+void StateBatchReset(pyhanabi_state_batch_t* batch, const int* reset_mask);
+void StateBatchApplyMoves(pyhanabi_state_batch_t* batch, const int* move_uids,
+                          int* rewards, int* dones);
+void StateBatchEncode(pyhanabi_state_batch_t* batch,
+                      pyhanabi_observation_encoder_t* encoder, int all_players,
+                      int* cur_players, float* obs, float* ownhand_obs,
+                      float* legal_moves);
+
 } /* extern "C" */
 
 #endif
@@ -18,6 +18,7 @@ import re
 import cffi
 import enum
 import sys
+import numpy as np
 
 DEFAULT_CDEF_PREFIXES = (None, ".", os.path.dirname(__file__), "/include")
 DEFAULT_LIB_PREFIXES = (None, ".", os.path.dirname(__file__), "/lib")
@@ -917,6 +918,16 @@ class HanabiObservation(object):
       moves.append(HanabiMove(move))
     return moves
 
+  def legal_move_uids(self):
+    """Returns the move uids of legal_moves(), without a HanabiMove per move."""
+    uids = []
+    move = ffi.new("pyhanabi_move_t*")
+    for i in range(lib.ObsNumLegalMoves(self._observation)):
+      lib.ObsGetLegalMove(self._observation, i, move)
+      uids.append(lib.GetMoveUid(self._game, move))
+      lib.DeleteMove(move)
+    return uids
+
   def card_playable_on_fireworks(self, color, rank):
     """Returns true if and only if card can be successfully played.
 
@@ -989,6 +1000,114 @@ class ObservationEncoder(object):
     encoding = [int(x) for x in encoding_string.split(",")]
     return encoding
 
+  def encode_array(self, observation, dtype=np.float32):
+    """Same as encode, parsed by numpy into a 1-D array of dtype."""
+    c_encoding_str = lib.EncodeObservation(self._encoder,
+                                           observation.observation())
+    encoding = np.fromstring(ffi.string(c_encoding_str), dtype=dtype, sep=",")
+    lib.DeleteString(c_encoding_str)
+    return encoding
+
+  def encodeownhand_array(self, observation, dtype=np.float32):
+    """Same as encodeownhand, parsed by numpy into a 1-D array of dtype."""
+    c_encoding_str = lib.EncodeOwnHandObservation(self._encoder,
+                                                  observation.observation())
+    encoding = np.fromstring(ffi.string(c_encoding_str), dtype=dtype, sep=",")
+    lib.DeleteString(c_encoding_str)
+    return encoding
+
+
+class HanabiStateBatch(object):
+  """num_states games of the same HanabiGame, stepped and encoded together.
+
+  Each of reset, apply_moves and encode is a single call into the C++ library
+  that covers every game, and writes into numpy buffers allocated once here.
+  Moves are given as move uids, one per game.
+
+  Python wrapper of a C++ std::vector<HanabiState>.
+  """
+
+  def __init__(self, game, num_states, encoder, all_players=False,
+               ownhand=False):
+    """Creates num_states new games, with the initial cards already dealt.
+
+    Args:
+      game: HanabiGame shared by all states.
+      num_states: int, number of games M.
+      encoder: ObservationEncoder used by encode.
+      all_players: bool, encode the observation of every player
+        ([M, num_players, obs_size]) instead of the current player only
+        ([M, obs_size]).
+      ownhand: bool, also encode the current player's own hand.
+    """
+    self._game = game
+    self._encoder = encoder
+    self.num_states = num_states
+    self.all_players = all_players
+    self._batch = ffi.new("pyhanabi_state_batch_t*")
+    lib.NewStateBatch(game.c_game, num_states, self._batch)
+
+    obs_size = encoder.shape()[0]
+    if all_players:
+      self.obs = np.zeros((num_states, game.num_players(), obs_size),
+                          dtype=np.float32)
+    else:
+      self.obs = np.zeros((num_states, obs_size), dtype=np.float32)
+    self.ownhand_obs = np.zeros((num_states, encoder.ownhandshape()[0]),
+                                dtype=np.float32) if ownhand else None
+    self.legal_moves = np.zeros((num_states, game.max_moves()),
+                                dtype=np.float32)
+    self.cur_players = np.zeros(num_states, dtype=np.int32)
+    self.rewards = np.zeros(num_states, dtype=np.int32)
+    self.dones = np.zeros(num_states, dtype=np.int32)
+    self._move_uids = np.zeros(num_states, dtype=np.int32)
+
+  def __del__(self):
+    if self._batch is not None:
+      lib.DeleteStateBatch(self._batch)
+      self._batch = None
+    del self
+
+  def reset(self, mask=None):
+    """Starts new games, for all states or for those where mask is true."""
+    if mask is None:
+      lib.StateBatchReset(self._batch, ffi.NULL)
+    else:
+      mask = np.ascontiguousarray(mask, dtype=np.int32)
+      lib.StateBatchReset(self._batch, ffi.from_buffer("int[]", mask))
+
+  def apply_moves(self, move_uids):
+    """Applies one move uid per game, a negative uid skips that game.
+
+    Returns:
+      rewards: [M] int32, score differential of the move.
+      dones: [M] int32, whether the game is finished.
+      Both are views into buffers that are overwritten by the next call.
+    """
+    self._move_uids[:] = move_uids
+    lib.StateBatchApplyMoves(self._batch,
+                             ffi.from_buffer("int[]", self._move_uids),
+                             ffi.from_buffer("int[]", self.rewards),
+                             ffi.from_buffer("int[]", self.dones))
+    return self.rewards, self.dones
+
+  def encode(self):
+    """Encodes the games into obs, ownhand_obs, legal_moves and cur_players.
+
+    Returns:
+      obs, ownhand_obs (None unless ownhand), legal_moves, cur_players, as
+      views into buffers that are overwritten by the next call.
+    """
+    ownhand_obs = ffi.NULL if self.ownhand_obs is None else ffi.from_buffer(
+        "float[]", self.ownhand_obs)
+    lib.StateBatchEncode(self._batch, self._encoder._encoder,
+                         int(self.all_players),
+                         ffi.from_buffer("int[]", self.cur_players),
+                         ffi.from_buffer("float[]", self.obs),
+                         ownhand_obs,
+                         ffi.from_buffer("float[]", self.legal_moves))
+    return self.obs, self.ownhand_obs, self.legal_moves, self.cur_players
+
 
 try_cdef()
 if cdef_loaded():
@@ -7,6 +7,17 @@ from . import constants
 from . import characters
 from . import utility
 
+# Item and action values used in the per square, flame and bomb loops below,
+# resolved once instead of going through the Enum on every iteration.
+PASSAGE = constants.Item.Passage.value
+RIGID = constants.Item.Rigid.value
+WOOD = constants.Item.Wood.value
+BOMB = constants.Item.Bomb.value
+FLAMES = constants.Item.Flames.value
+FOG = constants.Item.Fog.value
+STOP = constants.Action.Stop.value
+LAY_BOMB = constants.Action.Bomb.value
+
 
 class ForwardModel(object):
     """Class for helping with the [forward] modeling of the game state."""
@@ -142,7 +153,7 @@ class ForwardModel(object):
                 if item_value:
                     del curr_items[position]
                 else:
-                    item_value = constants.Item.Passage.value
+                    item_value = PASSAGE
                 curr_board[position] = item_value
             else:
                 flame.tick()
@@ -154,7 +165,7 @@ class ForwardModel(object):
         # a flame until all flames are dead to avoid issues with bomb
         # movements and explosions.
         for flame in curr_flames:
-            curr_board[flame.position] = constants.Item.Flames.value
+            curr_board[flame.position] = FLAMES
 
         # Step the living agents and moving bombs.
         # If two agents try to go to the same spot, they should bounce back to
@@ -174,12 +185,12 @@ class ForwardModel(object):
             position = agent.position
             # We change the curr_board here as a safeguard. We will later
             # update the agent's new position.
-            curr_board[position] = constants.Item.Passage.value
+            curr_board[position] = PASSAGE
             action = actions[agent.agent_id]
 
-            if action == constants.Action.Stop.value:
+            if action == STOP:
                 pass
-            elif action == constants.Action.Bomb.value:
+            elif action == LAY_BOMB:
                 position = agent.position
                 if not utility.position_is_bomb(curr_bombs, position):
                     bomb = agent.maybe_lay_bomb()
@@ -193,7 +204,7 @@ class ForwardModel(object):
         desired_bomb_positions = [bomb.position for bomb in curr_bombs]
 
         for num_bomb, bomb in enumerate(curr_bombs):
-            curr_board[bomb.position] = constants.Item.Passage.value
+            curr_board[bomb.position] = PASSAGE
             if bomb.is_moving():
                 desired_position = utility.get_next_position(
                     bomb.position, bomb.moving_direction)
@@ -434,7 +445,7 @@ class ForwardModel(object):
             bomb.tick()
             if bomb.exploded():
                 has_new_explosions = True
-            elif curr_board[bomb.position] == constants.Item.Flames.value:
+            elif curr_board[bomb.position] == FLAMES:
                 bomb.fire()
                 has_new_explosions = True
 
@@ -450,13 +461,13 @@ class ForwardModel(object):
                 bomb.bomber.incr_ammo()
                 for _, indices in bomb.explode().items():
                     for r, c in indices:
-                        if not all(
-                            [r >= 0, c >= 0, r < board_size, c < board_size]):
+                        if not (0 <= r < board_size and 0 <= c < board_size):
                             break
-                        if curr_board[r][c] == constants.Item.Rigid.value:
+                        value = curr_board[r, c]
+                        if value == RIGID:
                             break
-                        exploded_map[r][c] = 1
-                        if curr_board[r][c] == constants.Item.Wood.value:
+                        exploded_map[r, c] = 1
+                        if value == WOOD:
                             break
 
             curr_bombs = next_bombs
@@ -467,18 +478,18 @@ class ForwardModel(object):
 
         # Update the board's bombs.
         for bomb in curr_bombs:
-            curr_board[bomb.position] = constants.Item.Bomb.value
+            curr_board[bomb.position] = BOMB
 
         # Update the board's flames.
         flame_positions = np.where(exploded_map == 1)
         for row, col in zip(flame_positions[0], flame_positions[1]):
             curr_flames.append(characters.Flame((row, col)))
         for flame in curr_flames:
-            curr_board[flame.position] = constants.Item.Flames.value
+            curr_board[flame.position] = FLAMES
 
         # Kill agents on flames. Otherwise, update position on curr_board.
         for agent in alive_agents:
-            if curr_board[agent.position] == constants.Item.Flames.value:
+            if curr_board[agent.position] == FLAMES:
                 agent.die()
             else:
                 curr_board[agent.position] = utility.agent_value(agent.agent_id)
@@ -495,43 +506,37 @@ class ForwardModel(object):
         """
         board_size = len(curr_board)
 
-        def make_bomb_maps(position):
-            ''' Makes an array of an agents bombs and the bombs attributes '''
-            blast_strengths = np.zeros((board_size, board_size))
-            life = np.zeros((board_size, board_size))
-            moving_direction = np.zeros((board_size, board_size))
-
-            for bomb in bombs:
-                x, y = bomb.position
-                if not is_partially_observable \
-                   or in_view_range(position, x, y):
-                    blast_strengths[(x, y)] = bomb.blast_strength
-                    life[(x, y)] = bomb.life
-                    if bomb.moving_direction is not None:
-                        moving_direction[(x, y)] = bomb.moving_direction.value
-            return blast_strengths, life, moving_direction
-
-        def make_flame_map(position):
-            ''' Makes an array of an agents flame life'''
-            life = np.zeros((board_size, board_size))
-
-            for flame in flames:
-                x, y = flame.position
-                if not is_partially_observable \
-                   or in_view_range(position, x, y):
-                    # +1 needed because flame removal check is done
-                    # before flame is ticked down, i.e. flame life
-                    # in environment is 2 -> 1 -> 0 -> dead
-                    life[(x, y)] = flame.life + 1
-            return life
-
-        def in_view_range(position, v_row, v_col):
-            '''Checks to see if a tile is in an agents viewing area'''
+        # The bomb and flame maps of the whole board are built once per step,
+        # every agent then gets a copy restricted to its view window.
+        blast_strengths = np.zeros((board_size, board_size))
+        bomb_life = np.zeros((board_size, board_size))
+        moving_direction = np.zeros((board_size, board_size))
+        for bomb in bombs:
+            blast_strengths[bomb.position] = bomb.blast_strength
+            bomb_life[bomb.position] = bomb.life
+            if bomb.moving_direction is not None:
+                moving_direction[bomb.position] = bomb.moving_direction.value
+
+        flame_life = np.zeros((board_size, board_size))
+        for flame in flames:
+            # +1 needed because flame removal check is done
+            # before flame is ticked down, i.e. flame life
+            # in environment is 2 -> 1 -> 0 -> dead
+            flame_life[flame.position] = flame.life + 1
+
+        def view_window(position):
+            '''Slices of the squares in an agents viewing area'''
             row, col = position
-            return all([
-                row >= v_row - agent_view_size, row <= v_row + agent_view_size,
-                col >= v_col - agent_view_size, col <= v_col + agent_view_size
-            ])
+            return (slice(max(row - agent_view_size, 0), row + agent_view_size + 1),
+                    slice(max(col - agent_view_size, 0), col + agent_view_size + 1))
+
+        def in_view(full_map, window, fill_value=0):
+            '''Copy of the map with everything outside the window set to fill_value'''
+            if not is_partially_observable:
+                return full_map.copy()
+            view = np.full_like(full_map, fill_value)
+            view[window] = full_map[window]
+            return view
 
         attrs = [
             'position', 'blast_strength', 'can_kick', 'teammate', 'ammo',
@@ -546,19 +551,12 @@ class ForwardModel(object):
         observations = []
         for agent in agents:
             agent_obs = {'alive': alive_agents}
-            board = curr_board.copy()
-            if is_partially_observable:
-                for row in range(board_size):
-                    for col in range(board_size):
-                        if not in_view_range(agent.position, row, col):
-                            board[row, col] = constants.Item.Fog.value
-            agent_obs['board'] = board
-            bomb_blast_strengths, bomb_life, bomb_moving_direction = make_bomb_maps(agent.position)
-            agent_obs['bomb_blast_strength'] = bomb_blast_strengths
-            agent_obs['bomb_life'] = bomb_life
-            agent_obs['bomb_moving_direction'] = bomb_moving_direction
-            flame_life = make_flame_map(agent.position)
-            agent_obs['flame_life'] = flame_life
+            window = view_window(agent.position) if is_partially_observable else None
+            agent_obs['board'] = in_view(curr_board, window, FOG)
+            agent_obs['bomb_blast_strength'] = in_view(blast_strengths, window)
+            agent_obs['bomb_life'] = in_view(bomb_life, window)
+            agent_obs['bomb_moving_direction'] = in_view(moving_direction, window)
+            agent_obs['flame_life'] = in_view(flame_life, window)
             agent_obs['game_type'] = game_type.value
             agent_obs['game_env'] = game_env
 
@@ -50,6 +50,7 @@ class Pomme(gym.Env):
         self._viewer = None
         self._is_partially_observable = is_partially_observable
         self._env = env
+        self._reset_pool = None
 
         self.training_agent = []
         self.model = forward_model.ForwardModel()
@@ -131,6 +132,17 @@ class Pomme(gym.Env):
     def make_items(self):
         self._items = utility.make_items(self._board, self._num_items)
 
+    def make_initial_state(self):
+        """(board, items) of a new game, as made by make_board and make_items in reset."""
+        board = utility.make_board(self._board_size, self._num_rigid,
+                                   self._num_wood, len(self._agents))
+        return board, utility.make_items(board, self._num_items)
+
+    def set_reset_pool(self, reset_pool):
+        """Take the (board, items) of new games from reset_pool.get() instead
+        of making them in reset."""
+        self._reset_pool = reset_pool
+
     def act(self, obs):
         agents = [agent for agent in self._agents \
                   if agent.agent_id not in self.training_agent]
@@ -164,8 +176,11 @@ class Pomme(gym.Env):
             self.set_json_info()
         else:
             self._step_count = 0
-            self.make_board()
-            self.make_items()
+            if self._reset_pool is not None:
+                self._board, self._items = self._reset_pool.get()
+            else:
+                self.make_board()
+                self.make_items()
             self._bombs = []
             self._flames = []
             self._powerups = []
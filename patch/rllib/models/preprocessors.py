@@ -16,6 +16,11 @@ ATARI_RAM_OBS_SHAPE = (9999, ) # modified
 # Preprocessor.
 OBS_VALIDATION_INTERVAL = 100
 
+# modified: Box observations of these dtypes are kept as they are by the flattening
+# preprocessors, instead of being converted to float32. The models convert them to
+# float on the learner.
+COMPACT_DTYPES = (np.dtype(np.uint8), np.dtype(np.float16))
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,6 +43,7 @@ class Preprocessor:
             self._options = options
         self.shape = self._init_shape(obs_space, self._options)
         self._size = int(np.product(self.shape))
+        self.dtype = self._init_dtype()
         self._i = 0
 
     @PublicAPI
@@ -45,6 +51,10 @@ class Preprocessor:
         """Returns the shape after preprocessing."""
         raise NotImplementedError
 
+    def _init_dtype(self) -> np.dtype:
+        """Returns the dtype after preprocessing."""
+        return np.dtype(np.float32)
+
     @PublicAPI
     def transform(self, observation: TensorType) -> np.ndarray:
         """Returns the preprocessed observation."""
@@ -87,7 +97,10 @@ class Preprocessor:
     @property
     @PublicAPI
     def observation_space(self) -> gym.Space:
-        obs_space = gym.spaces.Box(-1., 1., self.shape, dtype=np.float32)
+        if self.dtype == np.float32:
+            obs_space = gym.spaces.Box(-1., 1., self.shape, dtype=np.float32)
+        else:
+            obs_space = compact_box(self.shape, self.dtype)
         # Stash the unwrapped space so that we can unwrap dict and tuple spaces
         # automatically in modelv2.py
         classes = (DictFlatteningPreprocessor, OneHotPreprocessor,
@@ -189,6 +202,14 @@ class NoPreprocessor(Preprocessor):
     def _init_shape(self, obs_space: gym.Space, options: dict) -> List[int]:
         return self._obs_space.shape
 
+    @override(Preprocessor)
+    def _init_dtype(self) -> np.dtype:
+        # modified
+        if isinstance(self._obs_space, gym.spaces.Box) and \
+                self._obs_space.dtype in COMPACT_DTYPES:
+            return self._obs_space.dtype
+        return np.dtype(np.float32)
+
     @override(Preprocessor)
     def transform(self, observation: TensorType) -> np.ndarray:
         self.check_shape(observation)
@@ -197,8 +218,11 @@ class NoPreprocessor(Preprocessor):
     @override(Preprocessor)
     def write(self, observation: TensorType, array: np.ndarray,
               offset: int) -> None:
-        array[offset:offset + self._size] = np.array(
-            observation, copy=False).ravel()
+        # modified: copy straight into the output slot, a strided view (e.g. a channel
+        # slice of an image) no longer goes through an extra ravel() copy
+        observation = np.asarray(observation)
+        array[offset:offset + self._size].reshape(observation.shape)[...] = \
+            observation
 
     @property
     @override(Preprocessor)
@@ -230,10 +254,14 @@ class TupleFlatteningPreprocessor(Preprocessor):
             self.preprocessors.append(preprocessor)
         return (size, )
 
+    @override(Preprocessor)
+    def _init_dtype(self) -> np.dtype:
+        return common_dtype(self.preprocessors)
+
     @override(Preprocessor)
     def transform(self, observation: TensorType) -> np.ndarray:
         self.check_shape(observation)
-        array = np.zeros(self.shape, dtype=np.float32)
+        array = np.zeros(self.shape, dtype=self.dtype)
         self.write(observation, array, 0)
         return array
 
@@ -257,6 +285,7 @@ class DictFlatteningPreprocessor(Preprocessor):
         assert isinstance(self._obs_space, gym.spaces.Dict)
         size = 0
         self.preprocessors = []
+        self._keys = list(self._obs_space.spaces.keys())
         for space in self._obs_space.spaces.values():
             logger.debug("Creating sub-preprocessor for {}".format(space))
             preprocessor_class = get_preprocessor(space)
@@ -267,24 +296,35 @@ class DictFlatteningPreprocessor(Preprocessor):
                 preprocessor = None
                 size += int(np.product(space.shape))
             self.preprocessors.append(preprocessor)
+        # modified: every slot is overwritten by write(), no need to zero it first
+        self._dense = all(
+            type(p) in (NoPreprocessor, OneHotPreprocessor)
+            for p in self.preprocessors)
         return (size, )
 
+    @override(Preprocessor)
+    def _init_dtype(self) -> np.dtype:
+        return common_dtype(self.preprocessors)
+
     @override(Preprocessor)
     def transform(self, observation: TensorType) -> np.ndarray:
         self.check_shape(observation)
-        array = np.zeros(self.shape, dtype=np.float32)
+        if self._dense:
+            array = np.empty(self.shape, dtype=self.dtype)
+        else:
+            array = np.zeros(self.shape, dtype=self.dtype)
         self.write(observation, array, 0)
         return array
 
     @override(Preprocessor)
     def write(self, observation: TensorType, array: np.ndarray,
               offset: int) -> None:
-        if not isinstance(observation, OrderedDict):
-            observation = OrderedDict(sorted(observation.items()))
+        # modified: values are looked up by the (sorted) keys of the space,
+        # instead of building a sorted OrderedDict of every observation
         assert len(observation) == len(self.preprocessors), \
             (len(observation), len(self.preprocessors))
-        for o, p in zip(observation.values(), self.preprocessors):
-            p.write(o, array, offset)
+        for key, p in zip(self._keys, self.preprocessors):
+            p.write(observation[key], array, offset)
             offset += p.size
 
 
@@ -353,6 +393,25 @@ def get_preprocessor(space: gym.Space) -> type:
     return preprocessor
 
 
+def common_dtype(preprocessors: List[Preprocessor]) -> np.dtype:
+    """Compact dtype shared by all the children of a flattening preprocessor,
+    float32 if there is none (modified)."""
+    dtypes = set(
+        np.dtype(np.float32) if p is None else p.dtype for p in preprocessors)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    return np.dtype(np.float32)
+
+
+def compact_box(shape: List[int], dtype: np.dtype) -> gym.spaces.Box:
+    """Flat observation space of a preprocessor that keeps a compact dtype
+    (modified)."""
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return gym.spaces.Box(info.min, info.max, shape, dtype=dtype)
+    return gym.spaces.Box(-1., 1., shape, dtype=dtype)
+
+
 def legacy_patch_shapes(space: gym.Space) -> List[int]:
     """Assigns shapes to spaces that don't have shapes.
 
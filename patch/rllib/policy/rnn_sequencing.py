@@ -112,6 +112,8 @@ def pad_batch_to_sequences_of_same_size(
                 k not in ["infos", SampleBatch.SEQ_LENS] and \
                 isinstance(v, np.ndarray):
             feature_keys_.append(k)
+    object_keys = {k for k in feature_keys_
+                   if isinstance(batch[k], np.ndarray) and batch[k].dtype == object}
 
 
     feature_sequences, initial_states, seq_lens = \
@@ -128,7 +130,12 @@ def pad_batch_to_sequences_of_same_size(
             shuffle=shuffle)
 
     for i, k in enumerate(feature_keys_):
-        batch[k] = feature_sequences[i]
+        if k in object_keys:
+            # chop_into_sequences pads object columns into lists, the torch tensor
+            # interceptor only passes object ndarrays through as they are
+            batch[k] = _object_array(feature_sequences[i])
+        else:
+            batch[k] = feature_sequences[i]
     for i, k in enumerate(state_keys):
         batch[k] = initial_states[i]
     batch[SampleBatch.SEQ_LENS] = np.array(seq_lens)
@@ -247,22 +254,16 @@ def chop_into_sequences(*,
     """
 
     if seq_lens is None or len(seq_lens) == 0:
-        prev_id = None
-        seq_lens = []
-        seq_len = 0
         unique_ids = np.add(
             np.add(episode_ids, agent_indices),
             np.array(unroll_ids, dtype=np.int64) << 32)
-        for uid in unique_ids:
-            if (prev_id is not None and uid != prev_id) or \
-                    seq_len >= max_seq_len:
-                seq_lens.append(seq_len)
-                seq_len = 0
-            seq_len += 1
-            prev_id = uid
-        if seq_len:
-            seq_lens.append(seq_len)
-        seq_lens = np.array(seq_lens, dtype=np.int32)
+        # Run-length encode the ids, then cut every run into max_seq_len chunks.
+        run_starts = np.flatnonzero(np.diff(unique_ids)) + 1
+        run_lens = np.diff(np.concatenate([[0], run_starts, [len(unique_ids)]]))
+        run_lens = run_lens[run_lens > 0]
+        num_chunks = -(-run_lens // max_seq_len)
+        seq_lens = np.full(np.sum(num_chunks), max_seq_len, dtype=np.int32)
+        seq_lens[np.cumsum(num_chunks) - 1] = run_lens - (num_chunks - 1) * max_seq_len
 
     assert sum(seq_lens) == len(feature_columns[0])
 
@@ -270,25 +271,33 @@ def chop_into_sequences(*,
     if dynamic_max:
         max_seq_len = max(seq_lens) + _extra_padding
 
+    # Sequence and time index of every step, for a single scatter per column.
+    total = int(np.sum(seq_lens))
+    seq_starts = np.cumsum(seq_lens) - seq_lens
+    seq_index = np.repeat(np.arange(len(seq_lens)), seq_lens)
+    seq_offset = np.arange(total) - np.repeat(seq_starts, seq_lens)
+
     feature_sequences = []
-    for i, f in enumerate(feature_columns):
+    for f in feature_columns:
         # Save unnecessary copy.
         if not isinstance(f, np.ndarray):
             f = np.array(f)
         length = len(seq_lens) * max_seq_len
+        assert total == len(f), f
         if f.dtype == np.object or f.dtype.type is np.str_:
-            f_pad = [None] * length
+            f_pad = np.full(length, None, dtype=object)
+            positions = seq_index * max_seq_len + seq_offset
+            if f.ndim == 1:
+                f_pad[positions] = f[:total]
+            else:
+                for position, row in zip(positions, f[:total]):
+                    f_pad[position] = row
+            f_pad = f_pad.tolist()
         else:
             # Make sure type doesn't change.
-            f_pad = np.zeros((length, ) + np.shape(f)[1:], dtype=f.dtype)
-        seq_base = 0
-        i = 0
-        for len_ in seq_lens:
-            for seq_offset in range(len_):
-                f_pad[seq_base + seq_offset] = f[i]
-                i += 1
-            seq_base += max_seq_len
-        assert i == len(f), f
+            f_pad = np.zeros((len(seq_lens), max_seq_len) + np.shape(f)[1:], dtype=f.dtype)
+            f_pad[seq_index, seq_offset] = f[:total]
+            f_pad = np.reshape(f_pad, (length, ) + np.shape(f)[1:])
         feature_sequences.append(f_pad)
 
     if states_already_reduced_to_init:
@@ -299,12 +308,7 @@ def chop_into_sequences(*,
             # Skip unnecessary copy.
             if not isinstance(s, np.ndarray):
                 s = np.array(s)
-            s_init = []
-            i = 0
-            for len_ in seq_lens:
-                s_init.append(s[i])
-                i += len_
-            initial_states.append(np.array(s_init))
+            initial_states.append(s[seq_starts])
 
     if shuffle:
         permutation = np.random.permutation(len(seq_lens))
@@ -322,6 +326,14 @@ def chop_into_sequences(*,
     return feature_sequences, initial_states, seq_lens
 
 
+def _object_array(values):
+    # element by element, so that rows which are sequences themselves stay objects
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
 def timeslice_along_seq_lens_with_overlap(
         sample_batch,
         seq_lens=None,